@@ -1,11 +1,28 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-from .models import (Cart, CartItem, ClientProfile, Order, OrderItem, Review,
-                     Service, User)
+from .counts import EstimatedCountPaginator
+from .models import (RATING_AGGREGATE_FIELDS, Cart, CartItem, ClientProfile,
+                     Order, OrderItem, Review, Service, User)
+from .orders import transition_orders
+
+
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """Changelist that avoids COUNT(*) over very large tables."""
+
+    paginator = EstimatedCountPaginator
+    # The unfiltered total would be a second full count
+    show_full_result_count = False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, "context_data", {}).get("cl")
+        if changelist is not None and changelist.paginator.estimated:
+            messages.info(request, "Result counts on this page are estimates.")
+        return response
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(EstimatedCountAdmin):
     list_display = ("username", "email", "role")
     list_filter = ("role",)
 
@@ -18,8 +35,9 @@ class ClientProfileAdmin(admin.ModelAdmin):
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
-    list_display = ("name", "price", "average_rating")
+    list_display = ("name", "price", "average_rating", "rating_count")
     search_fields = ("name", "description")
+    readonly_fields = RATING_AGGREGATE_FIELDS
 
 
 @admin.register(Cart)
@@ -34,21 +52,51 @@ class CartItemAdmin(admin.ModelAdmin):
     search_fields = ("cart__user__username", "service__name")
 
 
+def transition_action(status, label):
+    """Admin action moving the selected orders to ``status``."""
+
+    @admin.action(description=f"Mark selected orders as {label.lower()}")
+    def action(modeladmin, request, queryset):
+        # Counted first: the selection may be filtered by the old status
+        selected = queryset.count()
+        updated = transition_orders(queryset, status)
+        modeladmin.message_user(
+            request, f"{updated} order(s) marked as {label.lower()}.", messages.SUCCESS
+        )
+        skipped = selected - updated
+        if skipped:
+            modeladmin.message_user(
+                request,
+                f"{skipped} order(s) could not move to {label.lower()} and were "
+                "left unchanged.",
+                messages.WARNING,
+            )
+
+    action.__name__ = f"mark_{status.lower()}"
+    return action
+
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ("user", "created_at", "status")
+class OrderAdmin(EstimatedCountAdmin):
+    list_display = ("user", "created_at", "status", "item_count", "total_price")
+    readonly_fields = ("item_count", "total_price")
     list_filter = ("status", "created_at")
     search_fields = ("user__username",)
+    actions = [
+        transition_action(status, label)
+        for status, label in Order.STATUS_CHOICES
+        if Order.status_sources(status)
+    ]
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ("order", "service", "quantity")
+    list_display = ("order", "service", "quantity", "unit_price")
     search_fields = ("order__user__username", "service__name")
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(EstimatedCountAdmin):
     list_display = ("user", "service", "rating", "created_at")
     list_filter = ("rating", "created_at")
     search_fields = ("user__username", "service__name")
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class HomeSerConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "HomeSer"
+
+    def ready(self):
+        # Register model signal handlers (cache invalidation)
+        from . import signals  # noqa: F401
@@ -0,0 +1,232 @@
+import hashlib
+import math
+import random
+import time
+
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+TAG_VERSION_PREFIX = "tagver:"
+REBUILD_LOCK_PREFIX = "rebuild:"
+
+# Stampede protection: a single caller rebuilds a missing or expiring entry
+# while holding a lock for at most REBUILD_LOCK_TIMEOUT seconds. Callers that
+# have nothing valid to serve poll for up to REBUILD_WAIT seconds and then
+# rebuild themselves. Entries outlive their TTL by STALE_GRACE seconds so the
+# previous value can be served while the rebuild runs.
+REBUILD_LOCK_TIMEOUT = 30
+REBUILD_WAIT = 2.0
+REBUILD_POLL_INTERVAL = 0.05
+STALE_GRACE = 60
+# XFetch: larger values refresh earlier ahead of expiry
+XFETCH_BETA = 1.0
+
+CATALOG_TAG = "catalog"
+# Rating totals shown with services. Kept apart from CATALOG_TAG so review
+# writes leave carts and orders, which show no ratings, cached.
+RATINGS_TAG = "ratings"
+
+
+def service_tag(service_id):
+    """Tag for everything derived from a single service."""
+    return f"service:{service_id}"
+
+
+def user_tag(user_id, scope):
+    """Tag for a per-user collection, e.g. ``user:7:cart``."""
+    return f"user:{user_id}:{scope}"
+
+
+def _version_key(tag):
+    return f"{TAG_VERSION_PREFIX}{tag}"
+
+
+def _new_version():
+    # Seed from the clock so a version key that was evicted or invalidated
+    # never comes back with a value an old entry was stored under. In
+    # microseconds, to stay below 2**53: django-redis increments through a
+    # Lua script, whose numbers are doubles (see bump_tag).
+    return time.time_ns() // 1000
+
+
+def _current_versions(tags, found):
+    """Resolve the generation of each tag, creating missing ones."""
+    versions = {}
+    for tag in tags:
+        version_key = _version_key(tag)
+        version = found.get(version_key)
+        if version is None:
+            version = _new_version()
+            if not cache.add(version_key, version, None):
+                version = cache.get(version_key, version)
+        versions[tag] = version
+    return versions
+
+
+def tag_version(tag):
+    """Return the current generation of ``tag``."""
+    version_key = _version_key(tag)
+    return _current_versions([tag], {version_key: cache.get(version_key)})[tag]
+
+
+def tag_versions(tags):
+    """Return ``{tag: generation}`` for ``tags`` in a single multi-get."""
+    found = cache.get_many([_version_key(tag) for tag in tags])
+    return _current_versions(tags, found)
+
+
+def _lock_key(key):
+    return f"{REBUILD_LOCK_PREFIX}{key}"
+
+
+def acquire_rebuild_lock(key):
+    return cache.add(_lock_key(key), 1, REBUILD_LOCK_TIMEOUT)
+
+
+def release_rebuild_lock(key):
+    """Let other callers rebuild ``key`` after a rebuild that stored nothing."""
+    cache.delete(_lock_key(key))
+
+
+def pack_entry(value, delta, timeout):
+    """Wrap ``value`` with its rebuild time and logical expiry.
+
+    Returns ``(entry, physical_timeout)``: the entry is kept STALE_GRACE
+    seconds past its expiry so it can still be served during a rebuild.
+    """
+    if timeout is None:
+        return (value, delta, None), None
+    return (value, delta, time.time() + timeout), timeout + STALE_GRACE
+
+
+def _refresh_due(delta, expires_at):
+    """XFetch: refresh probabilistically earlier the costlier the rebuild."""
+    if expires_at is None:
+        return False
+    jitter = -delta * XFETCH_BETA * math.log(1.0 - random.random())
+    return time.time() + jitter >= expires_at
+
+
+def read_through(key, entry, wait_for):
+    """Decide what a reader gets for ``key`` given its current ``entry``.
+
+    Returns the value to serve, or ``None`` when the caller should rebuild
+    the entry. A fresh entry is served as is. An entry that is expired or
+    due for early refresh is rebuilt by the one caller that wins the lock,
+    while everybody else keeps serving it. Without a usable entry, losers
+    wait for the winner via ``wait_for()``, which returns ``None`` on
+    timeout.
+    """
+    if entry is not None:
+        value, delta, expires_at = entry
+        if not _refresh_due(delta, expires_at) or not acquire_rebuild_lock(key):
+            return value
+        return None
+    if acquire_rebuild_lock(key):
+        return None
+    return wait_for()
+
+
+def poll_for(fetch):
+    """Call ``fetch()`` until it returns a value or REBUILD_WAIT elapses."""
+    deadline = time.monotonic() + REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        value = fetch()
+        if value is not None:
+            return value
+    return None
+
+
+def cache_get_tagged(key, tags):
+    """Fetch ``key`` unless one of ``tags`` changed since it was stored.
+
+    The entry and the generation counters of all its tags are fetched in a
+    single multi-get. Returns ``(value, versions)``; ``value`` is ``None``
+    when the caller should rebuild the entry (see :func:`read_through`) and
+    ``versions`` must be passed back to :func:`cache_set_tagged` so a write
+    that lands while rebuilding still invalidates the new entry.
+    """
+    tags = sorted(set(tags))
+    found = cache.get_many([key, *(_version_key(tag) for tag in tags)])
+    versions = _current_versions(tags, found)
+
+    def current(stored):
+        if stored is not None and stored[0] == versions:
+            return stored[1]
+        return None
+
+    def wait_for():
+        entry = poll_for(lambda: current(cache.get(key)))
+        return entry[0] if entry is not None else None
+
+    return read_through(key, current(found.get(key)), wait_for), versions
+
+
+def cache_set_tagged(key, value, versions, timeout, delta=0.0):
+    """Store ``value`` under the tag generations read by a previous get.
+
+    ``delta`` is how long the value took to build, in seconds.
+    """
+    entry, timeout = pack_entry(value, delta, timeout)
+    cache.set(key, (versions, entry), timeout)
+    release_rebuild_lock(key)
+
+
+def cache_rebuild_tagged(key, versions, compute, timeout):
+    """Build a missing entry with ``compute()`` and store it."""
+    started = time.monotonic()
+    try:
+        value = compute()
+    except Exception:
+        release_rebuild_lock(key)
+        raise
+    cache_set_tagged(key, value, versions, timeout, time.monotonic() - started)
+    return value
+
+
+def cache_get_or_set(key, tags, compute, timeout):
+    """Return the cached value for ``key``, calling ``compute()`` on a miss."""
+    value, versions = cache_get_tagged(key, tags)
+    if value is None:
+        value = cache_rebuild_tagged(key, versions, compute, timeout)
+    return value
+
+
+def versions_etag(key, versions):
+    """Strong ETag for the content stored under ``key`` at ``versions``."""
+    raw = f"{key}|{sorted(versions.items())}"
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def versions_last_modified(versions):
+    """Unix timestamp no earlier than the last write to any of the tags.
+
+    Generations are created from the clock on the first read after a write,
+    so the newest one is an upper bound on the modification time.
+    """
+    return max(versions.values()) // 1_000_000
+
+
+def bump_tag(tag):
+    """Move ``tag`` to its next generation atomically and return it.
+
+    Invalidates like :func:`invalidate_tags`, but the caller learns the new
+    generation and that ``generation - 1`` is the one it replaced. Returns
+    ``None`` without a current generation, when there is nothing to
+    invalidate.
+    """
+    try:
+        return cache.incr(_version_key(tag))
+    except ValueError:
+        return None
+
+
+def invalidate_tags(*tags):
+    """Invalidate every entry stored under any of ``tags``.
+
+    Dropping the generation counters is a single round trip; the next read
+    re-creates them with a fresh value that no existing entry matches.
+    """
+    if tags:
+        cache.delete_many([_version_key(tag) for tag in set(tags)])
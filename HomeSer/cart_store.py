@@ -0,0 +1,425 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F, Subquery
+from django.db.models.deletion import Collector
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from .cache_utils import invalidate_tags, user_tag
+from .catalog import catalog_cache
+from .models import Cart, CartItem, Service
+
+# Marks a cart hash that holds the database copy of the cart; service ids
+# are numeric so it never collides with an item
+LOADED_FIELD = "loaded"
+
+
+def known_service_id(service_id):
+    """Return ``service_id`` as an int, or raise Http404 if no such service.
+
+    Existing ids are remembered in the catalog cache, which every Service
+    write invalidates, so repeated adds of a service make no query.
+    """
+    try:
+        service_id = int(service_id)
+    except (TypeError, ValueError):
+        raise Http404("No Service matches the given query.")
+    key = f"service_exists:{service_id}"
+    exists, versions = catalog_cache.get(key)
+    if exists is None:
+        # Unknown ids are not cached, so made-up ones cannot fill the cache
+        if not Service.objects.filter(pk=service_id).exists():
+            catalog_cache.release(key, versions)
+            raise Http404("No Service matches the given query.")
+        catalog_cache.set(key, True, versions)
+    return service_id
+
+
+def apply_cart_operations(quantities, operations):
+    """Return ``quantities`` ({service_id: quantity}) after ``operations``.
+
+    Operations are applied in order. Services that end up with no units
+    map to 0 so callers can tell which items to delete.
+    """
+    quantities = dict(quantities)
+    for operation in operations:
+        service_id = operation["service_id"]
+        if operation["op"] == "set":
+            quantities[service_id] = operation["quantity"]
+        elif operation["op"] == "increment":
+            quantities[service_id] = max(
+                quantities.get(service_id, 0) + operation["quantity"], 0
+            )
+        else:
+            quantities[service_id] = 0
+    return quantities
+
+
+def delete_items(items):
+    """Delete loaded CartItem instances in one query.
+
+    The delete signals read each item's cart to invalidate its owner's
+    cache, so ``items`` should come with their carts loaded. Unlike
+    ``QuerySet.delete()``, which reloads the rows without them, this
+    sends the signals for the given instances.
+    """
+    if items:
+        collector = Collector(using=CartItem.objects.db)
+        collector.collect(items)
+        collector.delete()
+
+
+def write_carts(carts):
+    """Make the database hold exactly ``carts``.
+
+    ``carts`` maps user ids to ``{service_id: quantity}``. Missing carts are
+    created and items are created, updated or deleted in bulk, so the cost
+    is a handful of queries however many carts are written. Items of
+    services that no longer exist are dropped.
+    """
+    service_ids = {service_id for items in carts.values() for service_id in items}
+    existing_services = set(
+        Service.objects.filter(id__in=service_ids).values_list("id", flat=True)
+    )
+
+    with transaction.atomic():
+        Cart.objects.bulk_create(
+            [Cart(user_id=user_id) for user_id in carts], ignore_conflicts=True
+        )
+        cart_ids = dict(
+            Cart.objects.filter(user_id__in=carts).values_list("user_id", "id")
+        )
+
+        stored = {}
+        stale = []
+        for item in (
+            CartItem.objects.filter(cart_id__in=cart_ids.values())
+            .select_related("cart")
+            .order_by("id")
+        ):
+            if (item.cart_id, item.service_id) in stored:
+                stale.append(item)
+            else:
+                stored[item.cart_id, item.service_id] = item
+
+        created = []
+        updated = []
+        for user_id, items in carts.items():
+            cart_id = cart_ids[user_id]
+            for service_id, quantity in items.items():
+                if service_id not in existing_services:
+                    continue
+                item = stored.pop((cart_id, service_id), None)
+                if item is None:
+                    created.append(
+                        CartItem(
+                            cart_id=cart_id, service_id=service_id, quantity=quantity
+                        )
+                    )
+                elif item.quantity != quantity:
+                    item.quantity = quantity
+                    updated.append(item)
+        stale.extend(stored.values())
+
+        CartItem.objects.bulk_create(created)
+        CartItem.objects.bulk_update(updated, ["quantity"])
+        delete_items(stale)
+
+        # Bulk writes bypass the CartItem signals
+        transaction.on_commit(
+            partial(invalidate_tags, *(user_tag(user_id, "cart") for user_id in carts))
+        )
+
+
+class DatabaseCartStore:
+    """Write every cart change straight to Cart and CartItem."""
+
+    def add(self, user_id, service_id):
+        """Add one unit of a service to the user's cart.
+
+        Adding a service that is already in the cart is a single
+        ``UPDATE ... SET quantity = quantity + 1``. Otherwise the cart and an
+        empty item are inserted first, ignoring conflicts with concurrent
+        inserts, and then incremented, so no add is ever lost.
+        """
+        service_id = known_service_id(service_id)
+        cart_id = Subquery(Cart.objects.filter(user_id=user_id).values("id"))
+        items = CartItem.objects.filter(cart_id=cart_id, service_id=service_id)
+        try:
+            with transaction.atomic():
+                if not items.update(quantity=F("quantity") + 1):
+                    Cart.objects.bulk_create(
+                        [Cart(user_id=user_id)], ignore_conflicts=True
+                    )
+                    CartItem.objects.bulk_create(
+                        [CartItem(cart_id=cart_id, service_id=service_id, quantity=0)],
+                        ignore_conflicts=True,
+                    )
+                    items.update(quantity=F("quantity") + 1)
+                # The bulk writes bypass the CartItem signals
+                transaction.on_commit(
+                    partial(invalidate_tags, user_tag(user_id, "cart"))
+                )
+        except IntegrityError:
+            # The service was deleted after the catalog cache was read
+            raise Http404("No Service matches the given query.")
+
+    def remove(self, user_id, service_id):
+        """Remove a service from the user's cart; False if it was not there."""
+        service = get_object_or_404(Service, id=service_id)
+        cart = get_object_or_404(Cart, user_id=user_id)
+        deleted, _ = CartItem.objects.filter(cart=cart, service=service).delete()
+        return bool(deleted)
+
+    def apply(self, user_id, operations):
+        """Apply validated set/increment/remove operations in one transaction.
+
+        The cart row is locked while its items are read, so concurrent
+        increments are not lost, then kept items are written with a single
+        upsert and removed ones with a single delete, whatever the size of
+        the batch.
+        """
+        service_ids = {operation["service_id"] for operation in operations}
+        with transaction.atomic():
+            cart, created = Cart.objects.select_for_update().get_or_create(
+                user_id=user_id
+            )
+            # Read through the cart so that the items come with it
+            current = {
+                item.service_id: item
+                for item in cart.cartitem_set.filter(service_id__in=service_ids)
+            }
+            quantities = apply_cart_operations(
+                {service_id: item.quantity for service_id, item in current.items()},
+                operations,
+            )
+
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(cart=cart, service_id=service_id, quantity=quantity)
+                    for service_id, quantity in quantities.items()
+                    if quantity > 0
+                ],
+                update_conflicts=True,
+                unique_fields=["cart", "service"],
+                update_fields=["quantity"],
+            )
+            delete_items(
+                [
+                    item
+                    for service_id, item in current.items()
+                    if quantities[service_id] == 0
+                ]
+            )
+
+            # The upsert bypasses the CartItem signals
+            transaction.on_commit(partial(invalidate_tags, user_tag(user_id, "cart")))
+
+    def reconcile(self, user_id):
+        """Write the user's pending changes to the database."""
+
+    def invalidate(self, user_id):
+        """Forget any copy of the cart held outside the database."""
+
+    def flush(self, batch_size=None):
+        """Write all pending changes to the database; returns the carts written."""
+        return 0
+
+
+class RedisCartStore:
+    """Keep carts in Redis hashes and write them to the database in batches.
+
+    Each cart is a hash of service id -> quantity, so adding or removing a
+    service is one round trip and no query. Changed carts are listed in a
+    set and written back by :meth:`flush`, which Celery beat runs every
+    CART_FLUSH_INTERVAL (as does the ``flush_carts`` command), or for a
+    single user by :meth:`reconcile`, which views call before reading or
+    checking out a cart. While a cart is held here the hash is
+    authoritative.
+
+    A hash is seeded from the database the first time the cart is changed.
+    Pending changes are lost if a hash expires before it is written back, so
+    flush well within ``CART_REDIS_TTL``.
+    """
+
+    key_prefix = "homeser:cart:"
+    dirty_key = "homeser:cart:dirty"
+
+    def __init__(self, client, ttl=None):
+        self.client = client
+        self.ttl = ttl or settings.CART_REDIS_TTL
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}{user_id}"
+
+    def _change(self, user_id, command):
+        """Run ``command`` on the cart hash and mark the cart as changed.
+
+        Returns whether the hash had been seeded and the command's result.
+        """
+        key = self._key(user_id)
+        with self.client.pipeline() as pipe:
+            pipe.hexists(key, LOADED_FIELD)
+            command(pipe, key)
+            pipe.sadd(self.dirty_key, user_id)
+            pipe.expire(key, self.ttl)
+            loaded, result, *_ = pipe.execute()
+        return loaded, result
+
+    def _seed(self, user_id):
+        """Merge the database copy of the cart into its hash, exactly once."""
+        from redis.exceptions import WatchError
+
+        key = self._key(user_id)
+        items = list(
+            CartItem.objects.filter(cart__user_id=user_id).values_list(
+                "service_id", "quantity"
+            )
+        )
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    if pipe.hexists(key, LOADED_FIELD):
+                        return
+                    pipe.multi()
+                    for service_id, quantity in items:
+                        pipe.hincrby(key, service_id, quantity)
+                    pipe.hset(key, LOADED_FIELD, 1)
+                    pipe.expire(key, self.ttl)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    # The cart changed while seeding; retry on the new state
+                    continue
+
+    def _read(self, user_ids):
+        """Return ``{user_id: {service_id: quantity}}`` from the cart hashes."""
+        with self.client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hgetall(self._key(user_id))
+            hashes = dict(zip(user_ids, pipe.execute()))
+
+        carts = {}
+        for user_id, fields in hashes.items():
+            if LOADED_FIELD not in fields and LOADED_FIELD.encode() not in fields:
+                # Expired, or changed but never seeded
+                self._seed(user_id)
+                fields = self.client.hgetall(self._key(user_id))
+            carts[user_id] = {
+                int(field): int(quantity)
+                for field, quantity in fields.items()
+                if field.isdigit()
+            }
+        return carts
+
+    def _write_back(self, user_ids):
+        try:
+            write_carts(self._read(user_ids))
+        except Exception:
+            self.client.sadd(self.dirty_key, *user_ids)
+            raise
+
+    def add(self, user_id, service_id):
+        """Add one unit of a service to the user's cart."""
+        service_id = known_service_id(service_id)
+        loaded, _ = self._change(
+            user_id, lambda pipe, key: pipe.hincrby(key, service_id, 1)
+        )
+        if not loaded:
+            self._seed(user_id)
+
+    def remove(self, user_id, service_id):
+        """Remove a service from the user's cart; False if it was not there."""
+        service_id = known_service_id(service_id)
+        loaded, removed = self._change(
+            user_id, lambda pipe, key: pipe.hdel(key, service_id)
+        )
+        if not loaded:
+            self._seed(user_id)
+            removed = self.client.hdel(self._key(user_id), service_id)
+        return bool(removed)
+
+    def apply(self, user_id, operations):
+        """Apply validated set/increment/remove operations atomically."""
+        from redis.exceptions import WatchError
+
+        key = self._key(user_id)
+        service_ids = sorted({operation["service_id"] for operation in operations})
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    loaded, *stored = pipe.hmget(key, LOADED_FIELD, *service_ids)
+                    if loaded is None:
+                        pipe.unwatch()
+                        self._seed(user_id)
+                        continue
+                    current = {
+                        service_id: int(quantity)
+                        for service_id, quantity in zip(service_ids, stored)
+                        if quantity is not None
+                    }
+                    quantities = apply_cart_operations(current, operations)
+
+                    pipe.multi()
+                    kept = {
+                        service_id: quantity
+                        for service_id, quantity in quantities.items()
+                        if quantity > 0
+                    }
+                    if kept:
+                        pipe.hset(key, mapping=kept)
+                    removed = [
+                        service_id
+                        for service_id, quantity in quantities.items()
+                        if quantity == 0
+                    ]
+                    if removed:
+                        pipe.hdel(key, *removed)
+                    pipe.sadd(self.dirty_key, user_id)
+                    pipe.expire(key, self.ttl)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    def reconcile(self, user_id):
+        """Write the user's pending changes to the database."""
+        if self.client.srem(self.dirty_key, user_id):
+            self._write_back([user_id])
+
+    def invalidate(self, user_id):
+        """Forget the cached cart, e.g. after the database copy was emptied."""
+        with self.client.pipeline() as pipe:
+            pipe.delete(self._key(user_id))
+            pipe.srem(self.dirty_key, user_id)
+            pipe.execute()
+
+    def flush(self, batch_size=None):
+        """Write all pending changes to the database; returns the carts written."""
+        batch_size = batch_size or settings.CART_FLUSH_BATCH_SIZE
+        flushed = 0
+        while True:
+            user_ids = self.client.spop(self.dirty_key, batch_size)
+            if not user_ids:
+                return flushed
+            self._write_back([int(user_id) for user_id in user_ids])
+            flushed += len(user_ids)
+
+
+def get_cart_store():
+    """Return the cart store selected by ``settings.CART_BACKEND``."""
+    if settings.CART_BACKEND == "redis":
+        from django_redis import get_redis_connection
+
+        return RedisCartStore(get_redis_connection("default"))
+    if settings.CART_BACKEND == "database":
+        return DatabaseCartStore()
+    raise ImproperlyConfigured(
+        f"Unknown CART_BACKEND {settings.CART_BACKEND!r}; "
+        "use 'database' or 'redis'."
+    )
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_utils import (CATALOG_TAG, RATINGS_TAG, pack_entry, poll_for,
+                          read_through, release_rebuild_lock, tag_versions)
+
+_VERSION_KEY = "__version__"
+CATALOG_CACHE_TAGS = (CATALOG_TAG, RATINGS_TAG)
+
+
+class LocalLRUCache:
+    """Thread-safe, size-capped LRU with a per-entry TTL, local to a worker."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CatalogCache:
+    """Two-tier cache for data that depends only on the service catalog.
+
+    Entries are shared by all users. Each worker keeps recently used entries
+    in a :class:`LocalLRUCache` (L1) in front of the configured Django cache
+    (L2). Keys embed the generations of the ``catalog`` tag, which every
+    Service write bumps, and of the ``ratings`` tag, which review ratings
+    bump, so a write invalidates both tiers at once. Workers re-read the
+    generations from L2 at most once per L1 TTL; in between, an L1 hit makes
+    no network round trip.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self._local = LocalLRUCache(
+            max_entries or settings.CATALOG_CACHE_L1_MAX_ENTRIES,
+            ttl or settings.CATALOG_CACHE_L1_TTL,
+        )
+
+    def versions(self):
+        versions = self._local.get(_VERSION_KEY)
+        if versions is None:
+            versions = tag_versions(CATALOG_CACHE_TAGS)
+            self._local.set(_VERSION_KEY, versions)
+        return versions
+
+    def _key(self, key, versions):
+        generations = ":".join(str(versions[tag]) for tag in CATALOG_CACHE_TAGS)
+        return f"catalog:{generations}:{key}"
+
+    def get(self, key):
+        """Return ``(value, versions)``; ``value`` is ``None`` on a miss.
+
+        ``versions`` has the same shape as for tagged cache entries, so
+        callers can derive validators from either kind of entry.
+        """
+        versions = self.versions()
+        versioned_key = self._key(key, versions)
+        value = self._local.get(versioned_key)
+        if value is None:
+            value = read_through(
+                versioned_key,
+                cache.get(versioned_key),
+                lambda: self._wait_for(versioned_key),
+            )
+            if value is not None:
+                self._local.set(versioned_key, value)
+        return value, dict(versions)
+
+    def _wait_for(self, versioned_key):
+        entry = poll_for(lambda: cache.get(versioned_key))
+        return entry[0] if entry is not None else None
+
+    def set(self, key, value, versions, delta=0.0):
+        """Store ``value`` under the catalog versions returned by :meth:`get`.
+
+        ``delta`` is how long the value took to build, in seconds.
+        """
+        versioned_key = self._key(key, versions)
+        entry, timeout = pack_entry(value, delta, settings.CACHE_TTL)
+        cache.set(versioned_key, entry, timeout)
+        release_rebuild_lock(versioned_key)
+        self._local.set(versioned_key, value)
+
+    def release(self, key, versions):
+        """Give up rebuilding ``key`` without storing anything."""
+        release_rebuild_lock(self._key(key, versions))
+
+    def get_or_set(self, key, compute):
+        value, versions = self.get(key)
+        if value is None:
+            started = time.monotonic()
+            try:
+                value = compute()
+            except Exception:
+                self.release(key, versions)
+                raise
+            self.set(key, value, versions, time.monotonic() - started)
+        return value
+
+    def clear_local(self):
+        """Drop this worker's L1 copy after a local catalog write."""
+        self._local.clear()
+
+
+catalog_cache = CatalogCache()
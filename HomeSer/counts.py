@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+
+def table_row_estimate(model, using):
+    """PostgreSQL planner's estimate of the rows in ``model``'s table.
+
+    Read from pg_class.reltuples. Returns ``None`` on other databases or when
+    the table has no statistics yet.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+
+    # reltuples is -1 until the table is first vacuumed or analyzed
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def estimate_count(queryset):
+    """Planner's estimate of ``queryset.count()``, or ``None``.
+
+    Only querysets over a whole table are estimated, from its row estimate.
+    Filtered ones, such as a user's own rows or a search, return ``None``:
+    their estimates can be off by orders of magnitude, and they are
+    usually small enough to count.
+    """
+    query = queryset.query
+    if (
+        query.where
+        or query.distinct
+        or query.group_by is not None
+        or query.combinator
+        or query.is_sliced
+    ):
+        return None
+    return table_row_estimate(queryset.model, queryset.db)
+
+
+class EstimatedCountPage(Page):
+    """Page that knows whether another follows without trusting ``count``."""
+
+    # None while the count is exact
+    next_exists = None
+
+    def has_next(self):
+        if self.next_exists is None:
+            return super().has_next()
+        return self.next_exists
+
+    def end_index(self):
+        if self.next_exists is None:
+            return super().end_index()
+        return (self.number - 1) * self.paginator.per_page + len(self)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the planner's row estimate for large tables.
+
+    Unfiltered results estimated at ESTIMATED_COUNT_THRESHOLD rows or more
+    are not counted exactly; ``estimated`` tells whether ``count`` is
+    approximate. Page numbers are then not checked against the estimate:
+    each page reads one row more than it shows to tell whether another
+    follows, a page past the last row is empty, and the last page makes
+    ``count`` exact.
+    """
+
+    @cached_property
+    def estimate(self):
+        """The estimate ``count`` reports, or ``None`` if it is exact."""
+        if isinstance(self.object_list, QuerySet):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= settings.ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return None
+
+    @property
+    def estimated(self):
+        return self.estimate is not None
+
+    @cached_property
+    def count(self):
+        if self.estimated:
+            return self.estimate
+        return super().count
+
+    def validate_number(self, number):
+        if not self.estimated:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        if not self.estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages["no_results"])
+        page = self._get_page(rows[: self.per_page], number, self)
+        page.next_exists = len(rows) > self.per_page
+        if page.next_exists:
+            # Never report fewer rows than have been seen
+            self.count = max(self.estimate, bottom + len(rows))
+        else:
+            # The last page: the count is known now
+            self.estimate = None
+            self.count = bottom + len(rows)
+        self.__dict__.pop("num_pages", None)
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedCountPage(*args, **kwargs)
@@ -0,0 +1,120 @@
+import csv
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+
+from .renderers import FastJSONRenderer
+
+# Output column -> values() lookup, one row per order item. Orders without
+# items produce a single row with empty item columns.
+ORDER_EXPORT_COLUMNS = {
+    "order_id": "id",
+    "user_id": "user_id",
+    "username": "user__username",
+    "created_at": "created_at",
+    "status": "status",
+    "item_id": "orderitem__id",
+    "service_id": "orderitem__service_id",
+    "service_name": "orderitem__service__name",
+    "unit_price": "orderitem__unit_price",
+    "quantity": "orderitem__quantity",
+}
+ORDER_EXPORT_HEADER = [*ORDER_EXPORT_COLUMNS, "line_total"]
+
+# Export format -> content type
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Streamed responses are written in blocks of about this many bytes
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+def parse_export_bound(value):
+    """Parse a date or ISO 8601 datetime into an aware datetime.
+
+    Dates stand for midnight and naive values are taken in the current time
+    zone. Raises ValueError for anything else.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def order_export_rows(queryset, chunk_size):
+    """Yield the export rows of the orders in ``queryset``.
+
+    Rows are read through a server-side cursor ``chunk_size`` at a time and
+    formatted like the API: timestamps in ISO 8601 and money as strings.
+    """
+    created_at = serializers.DateTimeField()
+    rows = (
+        queryset.order_by("id", "orderitem__id")
+        .values(*ORDER_EXPORT_COLUMNS.values())
+        .iterator(chunk_size=chunk_size)
+    )
+    for values in rows:
+        row = {
+            column: values[lookup] for column, lookup in ORDER_EXPORT_COLUMNS.items()
+        }
+        row["created_at"] = created_at.to_representation(row["created_at"])
+        if row["unit_price"] is None:
+            # No item, or a price not backfilled yet
+            row["line_total"] = None
+        else:
+            row["line_total"] = str(row["unit_price"] * row["quantity"])
+            row["unit_price"] = str(row["unit_price"])
+        yield row
+
+
+def _buffered(chunks):
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def stream_ndjson(rows):
+    """Encode ``rows`` as newline-delimited JSON, one object per line."""
+    renderer = FastJSONRenderer()
+    return _buffered(renderer.render(row) + b"\n" for row in rows)
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, header):
+    """Encode ``rows`` as CSV with a ``header`` line; None is left empty."""
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(header).encode()
+        for row in rows:
+            yield writer.writerow([row[column] for column in header]).encode()
+
+    return _buffered(lines())
+
+
+def export_orders(queryset, export_format, chunk_size):
+    """Return the chunks of an order export in ``export_format``."""
+    rows = order_export_rows(queryset, chunk_size)
+    if export_format == "csv":
+        return stream_csv(rows, ORDER_EXPORT_HEADER)
+    return stream_ndjson(rows)
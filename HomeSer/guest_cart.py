@@ -0,0 +1,117 @@
+from django.conf import settings
+
+from .cart_store import get_cart_store, known_service_id
+from .models import CartItem, Service
+
+GUEST_CART_COOKIE = "guest_cart"
+GUEST_CART_SALT = "HomeSer.guest_cart"
+# Keeps the cookie well under the 4 KB browsers accept
+GUEST_CART_MAX_ITEMS = 50
+
+
+def read_guest_cart(request):
+    """Return the anonymous visitor's cart as ``{service_id: quantity}``.
+
+    The cart is stored client side, signed, as ``id:qty|id:qty``. A missing,
+    expired, tampered or malformed cookie reads as an empty cart.
+    """
+    value = request.get_signed_cookie(
+        GUEST_CART_COOKIE,
+        default="",
+        salt=GUEST_CART_SALT,
+        max_age=settings.GUEST_CART_COOKIE_AGE,
+    )
+    items = {}
+    for entry in value.split("|") if value else ():
+        try:
+            service_id, quantity = map(int, entry.split(":"))
+        except ValueError:
+            return {}
+        if quantity > 0:
+            items[service_id] = quantity
+    return items
+
+
+def write_guest_cart(response, items):
+    """Store ``items`` in the guest cart cookie, or drop it when empty."""
+    if not items:
+        response.delete_cookie(GUEST_CART_COOKIE)
+        return response
+    value = "|".join(
+        f"{service_id}:{quantity}" for service_id, quantity in items.items()
+    )
+    response.set_signed_cookie(
+        GUEST_CART_COOKIE,
+        value,
+        salt=GUEST_CART_SALT,
+        max_age=settings.GUEST_CART_COOKIE_AGE,
+        httponly=True,
+        secure=settings.SESSION_COOKIE_SECURE,
+        samesite="Lax",
+    )
+    return response
+
+
+def add_to_guest_cart(items, service_id):
+    """Add one unit of a service; returns False if the cart is full."""
+    service_id = known_service_id(service_id)
+    if service_id not in items and len(items) >= GUEST_CART_MAX_ITEMS:
+        return False
+    items[service_id] = items.get(service_id, 0) + 1
+    return True
+
+
+def remove_from_guest_cart(items, service_id):
+    """Remove a service; returns False if it was not in the cart."""
+    return items.pop(known_service_id(service_id), None) is not None
+
+
+class GuestCart:
+    """Read-only stand-in for a Cart whose items live in the guest cookie.
+
+    Templates read ``cart.cartitem_set.all`` as they do for a saved cart.
+    """
+
+    def __init__(self, items):
+        services = Service.objects.in_bulk(list(items))
+        self.items = [
+            CartItem(service=services[service_id], quantity=quantity)
+            for service_id, quantity in items.items()
+            if service_id in services
+        ]
+
+    @property
+    def cartitem_set(self):
+        return self
+
+    def all(self):
+        return self.items
+
+    def exists(self):
+        return bool(self.items)
+
+    def count(self):
+        return len(self.items)
+
+
+def merge_guest_cart(request, response, user):
+    """Move the guest cart into ``user``'s cart after they log in.
+
+    Quantities are added to what the user's cart already holds, in one
+    :meth:`apply` of the cart store (a single bulk upsert for the database
+    store), and the cookie is dropped.
+    """
+    items = read_guest_cart(request)
+    if not items:
+        return response
+    services = set(
+        Service.objects.filter(id__in=items).values_list("id", flat=True)
+    )
+    operations = [
+        {"op": "increment", "service_id": service_id, "quantity": quantity}
+        for service_id, quantity in items.items()
+        if service_id in services
+    ]
+    if operations:
+        get_cart_store().apply(user.id, operations)
+    return write_guest_cart(response, {})
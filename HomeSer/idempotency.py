@@ -0,0 +1,192 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import RawPostDataException
+from django.http import HttpResponseRedirect
+from django.shortcuts import redirect
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+from .cache_utils import poll_for
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_FORM_FIELD = "idempotency_key"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_PREFIX = "idempotency:"
+
+# How long the claim of the first request with a key lasts before it has
+# a result. It expires on its own if that request dies without one.
+IN_PROGRESS_TIMEOUT = 60
+
+
+class IdempotencyKeyReused(Exception):
+    """A key was sent again with a different request."""
+
+
+def new_idempotency_key():
+    """A fresh key, e.g. for the hidden field of a form."""
+    return uuid.uuid4().hex
+
+
+def request_fingerprint(request):
+    """Digest of a request's body, to tell a retry from a reused key."""
+    try:
+        body = request.body
+    except RawPostDataException:
+        # A multipart body already read as it streamed in
+        body = repr(sorted(request.POST.lists())).encode()
+    return hashlib.sha256(body).hexdigest()
+
+
+def _cache_key(scope, user_id, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"{IDEMPOTENCY_PREFIX}{scope}:{user_id}:{digest}"
+
+
+def _stored_result(cache_key):
+    entry = cache.get(cache_key)
+    return None if entry is None else entry.get("result")
+
+
+def begin(scope, user_id, key, fingerprint=""):
+    """Claim ``key`` for a request; returns ``(claimed, result)``.
+
+    The first caller claims the key and gets ``(True, None)``. Later callers
+    get the result recorded by :func:`finish`, waiting briefly if the first
+    request is still running; ``result`` is ``None`` if it did not finish
+    in time. A later caller whose ``fingerprint`` differs from the first
+    one's gets :exc:`IdempotencyKeyReused`. Keys are scoped per user, so
+    clients only need to make them unique among their own requests.
+    """
+    cache_key = _cache_key(scope, user_id, key)
+    if cache.add(cache_key, {"fingerprint": fingerprint}, IN_PROGRESS_TIMEOUT):
+        return True, None
+    entry = cache.get(cache_key)
+    if entry is not None and entry["fingerprint"] != fingerprint:
+        raise IdempotencyKeyReused(key)
+    result = None if entry is None else entry.get("result")
+    if result is None:
+        result = poll_for(lambda: _stored_result(cache_key))
+    return False, result
+
+
+def finish(scope, user_id, key, result, fingerprint=""):
+    """Record the result of a claimed request for IDEMPOTENCY_KEY_TTL."""
+    cache.set(
+        _cache_key(scope, user_id, key),
+        {"fingerprint": fingerprint, "result": result},
+        settings.IDEMPOTENCY_KEY_TTL,
+    )
+
+
+def abandon(scope, user_id, key):
+    """Release a claimed key without a result so the client can retry."""
+    cache.delete(_cache_key(scope, user_id, key))
+
+
+def idempotent_action(scope):
+    """Make a viewset action replay its response for a repeated Idempotency-Key.
+
+    Without the header the action runs as usual. Responses below 500 are
+    stored and returned, with an ``Idempotent-Replayed`` header, for any
+    later request from the same user with the same key, without running
+    the action again. A request that arrives while the first one is still
+    running past the wait gets 409, and one with a different body than the
+    first gets 422.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapped(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            if not key:
+                return method(self, request, *args, **kwargs)
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                raise serializers.ValidationError(
+                    {
+                        IDEMPOTENCY_KEY_HEADER: "Ensure this value has at most "
+                        f"{IDEMPOTENCY_KEY_MAX_LENGTH} characters."
+                    }
+                )
+
+            fingerprint = request_fingerprint(request)
+            try:
+                claimed, result = begin(scope, request.user.id, key, fingerprint)
+            except IdempotencyKeyReused:
+                return Response(
+                    {"status": "key was already used for a different request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if not claimed:
+                if result is None:
+                    return Response(
+                        {"status": "request with this key is in progress"},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                response = Response(result["data"], status=result["status"])
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            try:
+                response = method(self, request, *args, **kwargs)
+            except Exception:
+                abandon(scope, request.user.id, key)
+                raise
+            if response.status_code >= 500:
+                abandon(scope, request.user.id, key)
+            else:
+                finish(
+                    scope,
+                    request.user.id,
+                    key,
+                    {"status": response.status_code, "data": response.data},
+                    fingerprint,
+                )
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+def idempotent_form_view(scope, in_progress_url):
+    """Make a form view answer a resubmitted form with the first redirect.
+
+    The form carries a hidden ``idempotency_key`` field (see
+    :func:`new_idempotency_key`). A POST repeating a key that already
+    produced a redirect is sent to the same place without running the view
+    again; one that arrives while the first is still running is sent to
+    ``in_progress_url`` (anything :func:`~django.shortcuts.redirect` takes).
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key = request.POST.get(IDEMPOTENCY_FORM_FIELD)
+            if request.method != "POST" or not key:
+                return view(request, *args, **kwargs)
+            key = key[:IDEMPOTENCY_KEY_MAX_LENGTH]
+
+            claimed, result = begin(scope, request.user.id, key)
+            if not claimed:
+                if result is None:
+                    return redirect(in_progress_url)
+                return HttpResponseRedirect(result["location"])
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                abandon(scope, request.user.id, key)
+                raise
+            if isinstance(response, HttpResponseRedirect):
+                finish(scope, request.user.id, key, {"location": response.url})
+            else:
+                abandon(scope, request.user.id, key)
+            return response
+
+        return wrapped
+
+    return decorator
@@ -1,5 +1,3 @@
-from datetime import timedelta
-
 from django.conf import settings
 from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -23,8 +21,7 @@ def set_jwt_cookies(response, access_token, refresh_token=None):
         httponly=True,
         secure=not settings.DEBUG,
         samesite="Lax",
-        expires=timezone.now()
-        + timedelta(minutes=settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].minutes),
+        expires=timezone.now() + settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"],
     )
 
     # Set refresh token cookie if provided
@@ -35,8 +32,7 @@ def set_jwt_cookies(response, access_token, refresh_token=None):
             httponly=True,
             secure=not settings.DEBUG,
             samesite="Lax",
-            expires=timezone.now()
-            + timedelta(days=settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"].days),
+            expires=timezone.now() + settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"],
         )
 
     return response
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from HomeSer.cache_utils import CATALOG_TAG, invalidate_tags
+from HomeSer.orders import backfill_order_totals
+
+
+class Command(BaseCommand):
+    help = "Fill in missing order item prices and recompute every order's totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of orders updated per batch",
+        )
+
+    def handle(self, *args, **options):
+        processed = backfill_order_totals(options["batch_size"])
+        # Every cached order listing depends on the catalog tag
+        invalidate_tags("orders", CATALOG_TAG)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled totals for {processed} orders")
+        )
@@ -0,0 +1,212 @@
+import io
+import statistics
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import override_settings
+from rest_framework.pagination import Cursor
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from HomeSer import renderers
+from HomeSer.catalog import catalog_cache
+from HomeSer.guest_cart import GUEST_CART_COOKIE, write_guest_cart
+from HomeSer.models import Order, OrderItem, Review, Service, User
+from HomeSer.pagination import NewestFirstCursorPagination
+from HomeSer.serializers import OrderSerializer, ServiceSerializer
+from HomeSer.values_serializers import (OrderValuesSerializer,
+                                        ReviewValuesSerializer)
+from HomeSer.views import OrderViewSet
+
+BENCHMARKS = ("json", "pagination", "values", "guest-cart")
+
+# Nothing is cached between runs, so every request does the full work
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the API's read paths on generated data. The data is written to "
+        "the configured database and rolled back when done."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "benchmarks",
+            nargs="*",
+            metavar="benchmark",
+            help=f"Benchmarks to run, out of {', '.join(BENCHMARKS)} (default: all)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of timed runs; the median is reported",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["benchmarks"]) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        self.repeat = options["repeat"]
+
+        with override_settings(
+            CACHES=NO_CACHE, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+        ):
+            for name in options["benchmarks"] or BENCHMARKS:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                catalog_cache.clear_local()
+                with transaction.atomic():
+                    getattr(self, f"benchmark_{name.replace('-', '_')}")()
+                    transaction.set_rollback(True)
+
+    def timed(self, call):
+        """Median milliseconds per call, after a warm-up call."""
+        call()
+        times = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            call()
+            times.append(time.perf_counter() - started)
+        return statistics.median(times) * 1000
+
+    def report(self, label, before, after):
+        self.stdout.write(f"  {label}: {before:.1f} ms -> {after:.1f} ms")
+
+    def create_services(self, count):
+        return Service.objects.bulk_create(
+            Service(
+                name=f"Service {number}",
+                description=f"Household service number {number}",
+                price=f"{number % 100}.{number % 97:02d}",
+            )
+            for number in range(count)
+        )
+
+    def create_orders(self, user, count, services, items_per_order=0):
+        orders = Order.objects.bulk_create(
+            Order(user=user, item_count=items_per_order) for _ in range(count)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                service=services[(order.pk + number) % len(services)],
+                quantity=number + 1,
+                unit_price=services[(order.pk + number) % len(services)].price,
+            )
+            for order in orders
+            for number in range(items_per_order)
+        )
+        return orders
+
+    def benchmark_json(self):
+        """Stdlib json against FastJSONRenderer and FastJSONParser."""
+        if renderers.orjson is None:
+            self.stdout.write("  orjson is not installed, both paths are the same")
+
+        services = self.create_services(1000)
+        user = User.objects.create_user("benchmark")
+        self.create_orders(user, 500, services, items_per_order=3)
+        payloads = {
+            "1000 services": ServiceSerializer(
+                Service.objects.order_by("id"), many=True
+            ).data,
+            "500 orders with items": OrderSerializer(
+                Order.objects.prefetch_related("orderitem_set__service"), many=True
+            ).data,
+        }
+
+        for label, data in payloads.items():
+            body = JSONRenderer().render(data)
+            self.report(
+                f"render {label}",
+                self.timed(lambda: JSONRenderer().render(data)),
+                self.timed(lambda: renderers.FastJSONRenderer().render(data)),
+            )
+            self.report(
+                f"parse {label}",
+                self.timed(lambda: JSONParser().parse(io.BytesIO(body))),
+                self.timed(
+                    lambda: renderers.FastJSONParser().parse(io.BytesIO(body))
+                ),
+            )
+
+    def benchmark_pagination(self):
+        """Page 1000 of the admin order listing, page number against cursor."""
+        admin = User.objects.create_user(
+            "benchmark", role="admin", is_active=True, is_staff=True
+        )
+        services = self.create_services(10)
+        self.create_orders(admin, 20_000, services)
+
+        # The cursor a client reaches after paging through 999 pages
+        page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+        position = Order.objects.order_by("-created_at", "-id").values_list(
+            "created_at", flat=True
+        )[999 * page_size - 1]
+        paginator = NewestFirstCursorPagination()
+        paginator.base_url = "http://testserver/api/orders/"
+        url = paginator.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+        cursor = parse_qs(urlsplit(url).query)["cursor"][0]
+
+        view = OrderViewSet.as_view({"get": "list"})
+
+        def get(query):
+            request = APIRequestFactory().get("/api/orders/", query)
+            force_authenticate(request, user=admin)
+            response = view(request)
+            response.render()
+            assert len(response.data["results"]) == page_size, response.data
+
+        self.report(
+            "20000 orders, page 1000",
+            self.timed(lambda: get({"page": 1000})),
+            self.timed(lambda: get({"cursor": cursor})),
+        )
+
+    def benchmark_values(self):
+        """Model serializers against their values() counterparts."""
+        services = self.create_services(20)
+        # Reviews are unique per user and service
+        users = [User.objects.create_user(f"benchmark{number}") for number in range(10)]
+        self.create_orders(users[0], 200, services, items_per_order=3)
+        Review.objects.bulk_create(
+            Review(user=user, service=service, rating=4, text="Good work")
+            for service in services
+            for user in users
+        )
+
+        cases = {
+            "200 orders with items": (
+                OrderValuesSerializer,
+                Order.objects.prefetch_related("orderitem_set__service"),
+            ),
+            "200 reviews": (
+                ReviewValuesSerializer,
+                Review.objects.select_related("user", "service"),
+            ),
+        }
+        for label, (values_serializer_class, queryset) in cases.items():
+            serializer_class = values_serializer_class.serializer_class
+            values = values_serializer_class()
+            self.report(
+                label,
+                self.timed(lambda: serializer_class(queryset.all(), many=True).data),
+                self.timed(lambda: values.serialize(values.get_rows(queryset.all()))),
+            )
+
+    def benchmark_guest_cart(self):
+        """Size of a full guest cart cookie."""
+        services = self.create_services(50)
+        response = write_guest_cart(
+            HttpResponse(), {service.pk: 1 for service in services}
+        )
+        value = response.cookies[GUEST_CART_COOKIE].value
+        self.stdout.write(f"  50 services: {len(value)} bytes")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from HomeSer.cart_store import get_cart_store
+
+
+class Command(BaseCommand):
+    help = "Write carts changed in the cart store back to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Number of carts written per transaction "
+            "(default: CART_FLUSH_BATCH_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        flushed = get_cart_store().flush(options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote back {flushed} carts"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from HomeSer.cache_utils import RATINGS_TAG, invalidate_tags
+from HomeSer.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute every service's rating totals, average and histogram"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of services updated per query",
+        )
+
+    def handle(self, *args, **options):
+        processed = rebuild_rating_aggregates(options["batch_size"])
+        invalidate_tags(RATINGS_TAG)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt rating aggregates for {processed} services")
+        )
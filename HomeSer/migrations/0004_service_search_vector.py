@@ -0,0 +1,44 @@
+# Generated by Django 5.1.5 on 2026-10-17 02:59
+
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+SEARCH_INDEX = GinIndex(fields=["search_vector"], name="service_search_vector_gin")
+
+
+def add_search_index(apps, schema_editor):
+    # GIN indexes and tsvector expressions only exist on PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Service = apps.get_model("HomeSer", "Service")
+    schema_editor.add_index(Service, SEARCH_INDEX)
+    Service.objects.update(
+        search_vector=SearchVector("name", weight="A", config="english")
+        + SearchVector("description", weight="B", config="english")
+    )
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Service = apps.get_model("HomeSer", "Service")
+    schema_editor.remove_index(Service, SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("HomeSer", "0003_alter_user_is_active"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="service",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
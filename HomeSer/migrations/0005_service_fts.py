@@ -0,0 +1,70 @@
+# Generated by Django 5.1.5 on 2026-10-17 03:05
+
+from django.db import migrations
+
+# A copy of HomeSer.search's index as of this migration, so that later
+# changes there do not alter what this migration does. That module
+# recreates the index after every migrate.
+FTS_TABLE = "HomeSer_service_fts"
+FTS_TRIGGERS = {
+    "HomeSer_service_fts_ai": """
+        CREATE TRIGGER IF NOT EXISTS "HomeSer_service_fts_ai"
+        AFTER INSERT ON "HomeSer_service" BEGIN
+            INSERT INTO "HomeSer_service_fts" (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+    "HomeSer_service_fts_ad": """
+        CREATE TRIGGER IF NOT EXISTS "HomeSer_service_fts_ad"
+        AFTER DELETE ON "HomeSer_service" BEGIN
+            INSERT INTO "HomeSer_service_fts"
+                ("HomeSer_service_fts", rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+    """,
+    "HomeSer_service_fts_au": """
+        CREATE TRIGGER IF NOT EXISTS "HomeSer_service_fts_au"
+        AFTER UPDATE OF name, description ON "HomeSer_service" BEGIN
+            INSERT INTO "HomeSer_service_fts"
+                ("HomeSer_service_fts", rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO "HomeSer_service_fts" (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+}
+
+
+def create_fts_index(apps, schema_editor):
+    # Full-text search on PostgreSQL uses Service.search_vector instead
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5('
+            "name, description, content='HomeSer_service', content_rowid='id')"
+        )
+        for statement in FTS_TRIGGERS.values():
+            cursor.execute(statement)
+        cursor.execute(
+            f'INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}") ' "VALUES ('rebuild')"
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for trigger in FTS_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS "{trigger}"')
+        cursor.execute(f'DROP TABLE IF EXISTS "{FTS_TABLE}"')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("HomeSer", "0004_service_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-17 04:12
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Service = apps.get_model("HomeSer", "Service")
+    Review = apps.get_model("HomeSer", "Review")
+    reviews = Review.objects.filter(service=OuterRef("pk")).values("service")
+    Service.objects.update(
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(total=Sum("rating")).values("total")), 0
+        ),
+        rating_count=Coalesce(
+            Subquery(reviews.annotate(count=Count("id")).values("count")), 0
+        ),
+    )
+    Service.objects.filter(rating_count=0).update(average_rating=0.0)
+    Service.objects.filter(rating_count__gt=0).update(
+        average_rating=Cast("rating_sum", FloatField()) / F("rating_count")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("HomeSer", "0005_service_fts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="service",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
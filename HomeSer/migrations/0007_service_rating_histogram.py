@@ -0,0 +1,55 @@
+# Generated by Django 5.1.5 on 2026-10-17 04:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_histogram(apps, schema_editor):
+    Service = apps.get_model("HomeSer", "Service")
+    Review = apps.get_model("HomeSer", "Review")
+    counts = {}
+    for rating in range(1, 6):
+        reviews = (
+            Review.objects.filter(service=OuterRef("pk"), rating=rating)
+            .values("service")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        counts[f"rating_{rating}_count"] = Coalesce(Subquery(reviews), 0)
+    Service.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("HomeSer", "0006_service_rating_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="service",
+            name="rating_1_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="rating_2_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="rating_3_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="rating_4_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="rating_5_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.5 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("HomeSer", "0007_service_rating_histogram"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["created_at", "id"], name="HomeSer_ord_created_086ba8_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="HomeSer_ord_user_id_f6aa90_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["created_at", "id"], name="HomeSer_rev_created_7b4906_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="HomeSer_rev_user_id_447132_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-17 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("HomeSer", "0008_order_review_keyset_indexes"),
+    ]
+
+    # Existing rows are filled in by 0011_backfill_order_totals
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.5 on 2026-10-17 04:02
+
+from django.db import migrations
+
+# Service.search_vector is computed by the database on every write that
+# touches its sources, so bulk writes and queryset.update() are covered and
+# saves need no second UPDATE. Name ranks above description.
+SEARCH_VECTOR_FUNCTION = "HomeSer_service_search_vector"
+SEARCH_VECTOR_TRIGGER = "HomeSer_service_search_vector_bu"
+
+
+def create_search_trigger(apps, schema_editor):
+    # SQLite searches the FTS5 index kept by 0005's triggers instead
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE OR REPLACE FUNCTION "{SEARCH_VECTOR_FUNCTION}"() '
+            "RETURNS trigger AS $$ BEGIN "
+            "NEW.search_vector := "
+            "setweight(to_tsvector('english', COALESCE(NEW.name, '')), 'A') || "
+            "setweight(to_tsvector('english', COALESCE(NEW.description, '')), 'B'); "
+            "RETURN NEW; END $$ LANGUAGE plpgsql"
+        )
+        cursor.execute(
+            f'DROP TRIGGER IF EXISTS "{SEARCH_VECTOR_TRIGGER}" ON "HomeSer_service"'
+        )
+        # Listing search_vector too keeps writes from storing a stale value
+        cursor.execute(
+            f'CREATE TRIGGER "{SEARCH_VECTOR_TRIGGER}" '
+            "BEFORE INSERT OR UPDATE OF name, description, search_vector "
+            'ON "HomeSer_service" FOR EACH ROW '
+            f'EXECUTE FUNCTION "{SEARCH_VECTOR_FUNCTION}"()'
+        )
+        # Fires the trigger for every existing row
+        cursor.execute('UPDATE "HomeSer_service" SET search_vector = NULL')
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'DROP TRIGGER IF EXISTS "{SEARCH_VECTOR_TRIGGER}" ON "HomeSer_service"'
+        )
+        cursor.execute(f'DROP FUNCTION IF EXISTS "{SEARCH_VECTOR_FUNCTION}"()')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("HomeSer", "0009_order_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
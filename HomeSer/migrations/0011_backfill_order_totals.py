@@ -0,0 +1,58 @@
+# Generated by Django 5.1.5 on 2026-10-17 04:20
+
+from django.db import migrations
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    # Items placed before prices were recorded get their service's current
+    # price, the closest value still known. The backfill_order_totals
+    # command re-runs this, e.g. after restoring items saved without prices.
+    Order = apps.get_model("HomeSer", "Order")
+    OrderItem = apps.get_model("HomeSer", "OrderItem")
+    Service = apps.get_model("HomeSer", "Service")
+    last_pk = 0
+    while True:
+        order_ids = list(
+            Order.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:1000]
+        )
+        if not order_ids:
+            return
+
+        OrderItem.objects.filter(order_id__in=order_ids, unit_price=None).update(
+            unit_price=Subquery(
+                Service.objects.filter(pk=OuterRef("service_id")).values("price")
+            )
+        )
+        totals = {
+            row.pop("order_id"): row
+            for row in OrderItem.objects.filter(order_id__in=order_ids)
+            .values("order_id")
+            .annotate(
+                total_price=Sum(
+                    F("unit_price") * F("quantity"),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+                item_count=Sum("quantity"),
+            )
+        }
+        Order.objects.bulk_update(
+            [
+                Order(pk=pk, **totals.get(pk, {"total_price": 0, "item_count": 0}))
+                for pk in order_ids
+            ],
+            ["total_price", "item_count"],
+        )
+        last_pk = order_ids[-1]
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("HomeSer", "0010_service_search_vector_trigger"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
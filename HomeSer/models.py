@@ -1,7 +1,24 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+RATING_VALUES = range(1, 6)
+
+
+def rating_count_field(rating):
+    """Name of the Service field counting reviews with ``rating`` stars."""
+    return f"rating_{rating}_count"
+
+
+# Service fields moved by F() updates as reviews are written (see ratings.py)
+RATING_AGGREGATE_FIELDS = (
+    "average_rating",
+    "rating_sum",
+    "rating_count",
+    *(rating_count_field(rating) for rating in RATING_VALUES),
+)
+
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -41,10 +58,46 @@ class Service(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     average_rating = models.FloatField(default=0.0)
+    # Running totals over reviews, maintained by the Review signals;
+    # average_rating is rating_sum / rating_count
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Number of reviews per star rating
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    # Weighted tsvector of name and description, kept current on save
+    # (PostgreSQL only; the GIN index is created by migration 0004)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # An instance's rating aggregates are stale as soon as a review is
+        # written, so updates leave them out unless update_fields names them
+        if (
+            not self._state.adding
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in RATING_AGGREGATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def rating_histogram(self):
+        """Review counts keyed by star rating, highest first."""
+        return {
+            rating: getattr(self, rating_count_field(rating))
+            for rating in reversed(RATING_VALUES)
+        }
+
     class Meta:
         indexes = [
             models.Index(fields=["name"]),
@@ -89,21 +142,43 @@ class Order(models.Model):
         ("COMPLETED", "Completed"),
         ("CANCELLED", "Cancelled"),
     ]
+    # The statuses each status may move to; COMPLETED and CANCELLED are final
+    STATUS_TRANSITIONS = {
+        "PENDING_PAYMENT": ("PROCESSING", "CANCELLED"),
+        "PROCESSING": ("COMPLETED", "CANCELLED"),
+        "COMPLETED": (),
+        "CANCELLED": (),
+    }
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     services = models.ManyToManyField(Service, through="OrderItem")
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         max_length=50, choices=STATUS_CHOICES, default="PENDING_PAYMENT"
     )
+    # Written with the items at checkout
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Order {self.id} for {self.user.username}"
 
+    @classmethod
+    def status_sources(cls, status):
+        """The statuses from which an order may move to ``status``."""
+        return [
+            source
+            for source, targets in cls.STATUS_TRANSITIONS.items()
+            if status in targets
+        ]
+
     class Meta:
         indexes = [
             models.Index(fields=["user"]),
             models.Index(fields=["created_at"]),
             models.Index(fields=["status"]),
+            # Keyset pagination, for everyone and per user
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["user", "created_at", "id"]),
         ]
 
 
@@ -111,6 +186,9 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # The service's price when the order was placed; null for items from
+    # before prices were recorded until backfill_order_totals runs
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
 
     def __str__(self):
         return f"{self.quantity} x {self.service.name} in order {self.order.id}"
@@ -125,7 +203,7 @@ class OrderItem(models.Model):
 class Review(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
-    rating = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
+    rating = models.IntegerField(choices=[(i, i) for i in RATING_VALUES])
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -139,4 +217,7 @@ class Review(models.Model):
             models.Index(fields=["service"]),
             models.Index(fields=["rating"]),
             models.Index(fields=["created_at"]),
+            # Keyset pagination, for everyone and per user
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["user", "created_at", "id"]),
         ]
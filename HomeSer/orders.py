@@ -0,0 +1,290 @@
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import connections, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.shortcuts import get_object_or_404
+
+from .cache_utils import invalidate_tags, user_tag
+from .cart_store import get_cart_store
+from .models import Cart, CartItem, Order, OrderItem, Service
+
+
+def _order_totals_sql(connection, items):
+    """UPDATE ... RETURNING setting an order's totals from ``items``.
+
+    ``items`` is the FROM clause of the order's copied items.
+    """
+    qn = connection.ops.quote_name
+    order = Order._meta
+    return (
+        f"UPDATE {qn(order.db_table)} SET "
+        f"{qn('total_price')} = COALESCE(("
+        f"SELECT SUM({qn('unit_price')} * {qn('quantity')}) FROM {items}), 0), "
+        f"{qn('item_count')} = COALESCE(("
+        f"SELECT SUM({qn('quantity')}) FROM {items}), 0) "
+        f"WHERE {qn(order.pk.column)} = %s "
+        f"RETURNING {qn('total_price')}, {qn('item_count')}"
+    )
+
+
+def _move_cart_items_sql(connection):
+    """One statement moving a cart's items, with current prices, to an order.
+
+    The items are deleted with RETURNING, so exactly the rows removed, at
+    the quantities they were removed with, are copied; the order's totals
+    are summed from the copies. Takes the cart id and the order id twice.
+    """
+    qn = connection.ops.quote_name
+    order_item = OrderItem._meta
+    cart_item = CartItem._meta
+    service = Service._meta
+    return (
+        f"WITH moved AS ("
+        f"DELETE FROM {qn(cart_item.db_table)} WHERE {qn('cart_id')} = %s "
+        f"RETURNING {qn(cart_item.pk.column)}, {qn('service_id')}, "
+        f"{qn('quantity')}"
+        f"), copied AS ("
+        f"INSERT INTO {qn(order_item.db_table)} "
+        f"({qn('order_id')}, {qn('service_id')}, {qn('quantity')}, "
+        f"{qn('unit_price')}) "
+        f"SELECT %s, moved.{qn('service_id')}, moved.{qn('quantity')}, "
+        f"service.{qn('price')} "
+        f"FROM moved "
+        f"INNER JOIN {qn(service.db_table)} service "
+        f"ON service.{qn(service.pk.column)} = moved.{qn('service_id')} "
+        f"ORDER BY moved.{qn(cart_item.pk.column)} "
+        f"RETURNING {qn('unit_price')}, {qn('quantity')}"
+        f") " + _order_totals_sql(connection, "copied")
+    )
+
+
+def _move_cart_items(connection, cart_id, order_id):
+    """Move a cart's items into an order; return its total price and item count.
+
+    PostgreSQL does it in one statement. Other databases cannot modify data
+    in a WITH clause: there the items are deleted with RETURNING first and
+    the returned rows copied, which is as safe against concurrent adds but
+    takes three statements.
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                _move_cart_items_sql(connection), [cart_id, order_id, order_id]
+            )
+            return cursor.fetchone()
+
+        cursor.execute(
+            f"DELETE FROM {qn(CartItem._meta.db_table)} "
+            f"WHERE {qn('cart_id')} = %s "
+            f"RETURNING {qn(CartItem._meta.pk.column)}, {qn('service_id')}, "
+            f"{qn('quantity')}",
+            [cart_id],
+        )
+        moved = sorted(cursor.fetchall())
+        if not moved:
+            return 0, 0
+        cursor.executemany(
+            f"INSERT INTO {qn(OrderItem._meta.db_table)} "
+            f"({qn('order_id')}, {qn('service_id')}, {qn('quantity')}, "
+            f"{qn('unit_price')}) "
+            f"SELECT %s, {qn(Service._meta.pk.column)}, %s, {qn('price')} "
+            f"FROM {qn(Service._meta.db_table)} "
+            f"WHERE {qn(Service._meta.pk.column)} = %s",
+            [(order_id, quantity, service_id) for _, service_id, quantity in moved],
+        )
+        cursor.execute(
+            _order_totals_sql(
+                connection,
+                f"{qn(OrderItem._meta.db_table)} WHERE {qn('order_id')} = %s",
+            ),
+            [order_id, order_id, order_id],
+        )
+        return cursor.fetchone()
+
+
+def place_order(user):
+    """Move ``user``'s cart into a new order and return it.
+
+    Runs in one transaction without loading items: the cart row is locked,
+    the order inserted, and then one statement deletes the cart's items,
+    copies them with their services' current prices and sets the order's
+    total and item count from the copies. Because the copies are made from
+    the deleted rows, an add committed concurrently is either moved with
+    them or left in the cart, never lost. The lock makes concurrent
+    checkouts of the same cart queue up, so only the first one finds
+    items. Returns ``None`` if the cart is empty and raises Http404 if the
+    user has no cart.
+    """
+    with transaction.atomic():
+        cart_id = get_object_or_404(
+            Cart.objects.select_for_update().values_list("pk", flat=True),
+            user=user,
+        )
+        order = Order.objects.create(user=user)
+        connection = connections[Order.objects.db]
+        total_price, item_count = _move_cart_items(connection, cart_id, order.pk)
+        if not item_count:
+            # Empty cart: drop the order again
+            transaction.set_rollback(True)
+            return None
+        # SQLite sums decimals as floats
+        field = Order._meta.get_field("total_price")
+        order.total_price = field.to_python(total_price).quantize(
+            Decimal(10) ** -field.decimal_places
+        )
+        order.item_count = item_count
+
+        # The raw statements send no model signals
+        transaction.on_commit(
+            partial(
+                invalidate_tags,
+                "orders",
+                user_tag(user.id, "orders"),
+                user_tag(user.id, "cart"),
+            )
+        )
+        transaction.on_commit(partial(get_cart_store().invalidate, user.id))
+    return order
+
+
+def backfill_order_totals(batch_size=1000):
+    """Fill in missing unit prices and recompute every order's totals.
+
+    Items placed before prices were recorded get their service's current
+    price, the closest value still known. Orders are processed in
+    primary-key batches: one UPDATE for the batch's items, one grouped
+    query and one bulk UPDATE per batch, as migration 0011 did. Returns the
+    number of orders processed.
+    """
+    processed = 0
+    last_pk = 0
+    while True:
+        order_ids = list(
+            Order.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return processed
+
+        OrderItem.objects.filter(order_id__in=order_ids, unit_price=None).update(
+            unit_price=Subquery(
+                Service.objects.filter(pk=OuterRef("service_id")).values("price")
+            )
+        )
+        totals = {
+            row.pop("order_id"): row
+            for row in OrderItem.objects.filter(order_id__in=order_ids)
+            .values("order_id")
+            .annotate(
+                total_price=Sum(
+                    F("unit_price") * F("quantity"),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+                item_count=Sum("quantity"),
+            )
+        }
+        Order.objects.bulk_update(
+            [
+                Order(pk=pk, **totals.get(pk, {"total_price": 0, "item_count": 0}))
+                for pk in order_ids
+            ],
+            ["total_price", "item_count"],
+        )
+
+        processed += len(order_ids)
+        last_pk = order_ids[-1]
+
+
+def transition_orders(orders, status):
+    """Move every order in ``orders`` that is allowed to go to ``status``.
+
+    Orders whose current status cannot move there (see
+    Order.STATUS_TRANSITIONS) are left alone. The matching rows are locked
+    and changed by one conditional UPDATE per source status, in one
+    transaction. After commit, cached order listings are invalidated and
+    owners are emailed in batches of ORDER_STATUS_BATCH_SIZE orders.
+    Returns the number of orders changed; raises ValueError for an unknown
+    status.
+    """
+    if status not in Order.STATUS_TRANSITIONS:
+        raise ValueError(f"Unknown status: {status}")
+
+    with transaction.atomic():
+        # Selected by primary key so any queryset (an admin changelist
+        # included) can be locked, in a stable order
+        locked = list(
+            Order.objects.filter(
+                pk__in=orders.values("pk"), status__in=Order.status_sources(status)
+            )
+            .select_for_update()
+            .order_by("pk")
+            .values_list("pk", "user_id", "status")
+        )
+        by_source = defaultdict(list)
+        for pk, _, source in locked:
+            by_source[source].append(pk)
+        changed = sum(
+            Order.objects.filter(pk__in=ids, status=source).update(status=status)
+            for source, ids in by_source.items()
+        )
+
+        batch_size = settings.ORDER_STATUS_BATCH_SIZE
+        for start in range(0, len(locked), batch_size):
+            batch = locked[start : start + batch_size]
+            # QuerySet.update() sends no model signals
+            transaction.on_commit(
+                partial(
+                    invalidate_tags,
+                    "orders",
+                    *{user_tag(user_id, "orders") for _, user_id, _ in batch},
+                )
+            )
+            # A mail queue outage must not fail a change already committed
+            transaction.on_commit(
+                partial(_queue_status_emails, [pk for pk, _, _ in batch]),
+                robust=True,
+            )
+    return changed
+
+
+def _queue_status_emails(order_ids):
+    try:
+        from .tasks import send_order_status_emails_task
+    except ImportError:
+        # Celery is not available (e.g., in Vercel deployment)
+        send_order_status_emails(order_ids)
+    else:
+        send_order_status_emails_task.delay(order_ids)
+
+
+def send_order_status_emails(order_ids):
+    """Tell the owners of ``order_ids`` their orders' current status.
+
+    All messages go out over one mail connection. Owners without an email
+    address are skipped. Returns the number of messages sent.
+    """
+    orders = (
+        Order.objects.filter(pk__in=order_ids)
+        .exclude(user__email="")
+        .select_related("user")
+        .only("status", "user__username", "user__email")
+    )
+    messages = []
+    for order in orders:
+        status = order.get_status_display().lower()
+        messages.append(
+            (
+                f"Your order #{order.pk} is {status}",
+                f"Hi {order.user.username},\n\n"
+                f"Your order #{order.pk} is now {status}.\n",
+                settings.DEFAULT_FROM_EMAIL,
+                [order.user.email],
+            )
+        )
+    return send_mass_mail(messages, fail_silently=False)
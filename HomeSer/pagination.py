@@ -0,0 +1,102 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+from .counts import EstimatedCountPaginator
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """Page numbers with an estimated ``count`` for very large tables.
+
+    ``count_is_estimated`` in the response says whether ``count`` came from
+    the planner's statistics rather than COUNT(*). Filtered listings are
+    always counted, and ``next`` is only given when another row exists.
+    """
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.page.paginator.count,
+                "count_is_estimated": self.page.paginator.estimated,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_is_estimated"] = {
+            "type": "boolean",
+            "example": False,
+        }
+        return response_schema
+
+
+class OptInCursorPagination(CursorPagination):
+    """Keyset pagination for clients that ask for it, page numbers otherwise.
+
+    Requests with ``?pagination=cursor`` (or a ``cursor`` from a previous
+    response) page by position, which skips the COUNT(*) and keeps deep
+    pages as cheap as the first one. All other requests get page
+    numbers, with an estimated count for very large tables.
+    """
+
+    opt_in_query_param = "pagination"
+    page_number_pagination_class = EstimatedCountPagination
+
+    def __init__(self):
+        self.page_number_pagination = self.page_number_pagination_class()
+        self.use_cursor = False
+
+    def wants_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.opt_in_query_param) == "cursor"
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.wants_cursor(request)
+        if not self.use_cursor:
+            return self.page_number_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return self.page_number_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_pagination.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.page_number_pagination.get_schema_operation_parameters(view),
+            *super().get_schema_operation_parameters(view),
+            {
+                "name": self.opt_in_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to 'cursor' to page with cursors instead "
+                "of page numbers.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+        ]
+
+    def get_html_context(self):
+        if not self.use_cursor:
+            return self.page_number_pagination.get_html_context()
+        return super().get_html_context()
+
+
+class NewestFirstCursorPagination(OptInCursorPagination):
+    """Newest first, on the (created_at, id) indexes."""
+
+    ordering = ("-created_at", "-id")
+
+
+class IdCursorPagination(OptInCursorPagination):
+    ordering = ("id",)
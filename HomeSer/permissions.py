@@ -16,3 +16,15 @@ class IsOwnerOrAdmin(permissions.BasePermission):
             or request.user.is_staff
             or request.user.is_superuser
         )
+
+
+class IsAdminRole(permissions.BasePermission):
+    """Allow only users with the "admin" role.
+
+    The role, not ``is_staff``, is what makes a user an administrator of
+    the API: it is what promotion grants and what decides who sees every
+    object.
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user.is_authenticated and request.user.role == "admin")
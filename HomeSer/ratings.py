@@ -0,0 +1,90 @@
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Greatest
+
+from .models import RATING_VALUES, Review, Service, rating_count_field
+
+
+def apply_rating_change(service_id, added=None, removed=None):
+    """Account for a review rating ``added`` to and/or ``removed`` from a service.
+
+    Totals, average and histogram are adjusted in one UPDATE. Every
+    right-hand side reads the row's values from before the update, so
+    concurrent reviews never overwrite each other's contribution. Results
+    are clamped at zero: queryset-level review writes bypass the signals,
+    and totals that drifted because of them must not make a later delete
+    fail the fields' non-negative checks (rebuild_rating_aggregates
+    corrects them).
+    """
+    delta_sum = (added or 0) - (removed or 0)
+    delta_count = (added is not None) - (removed is not None)
+    new_sum = Greatest(F("rating_sum") + delta_sum, 0)
+    new_count = Greatest(F("rating_count") + delta_count, 0)
+    changes = {
+        "rating_sum": new_sum,
+        "rating_count": new_count,
+        "average_rating": Case(
+            When(rating_count__lte=-delta_count, then=Value(0.0)),
+            default=Cast(new_sum, FloatField()) / Cast(new_count, FloatField()),
+            output_field=FloatField(),
+        ),
+    }
+    if added != removed:
+        if added is not None:
+            field = rating_count_field(added)
+            changes[field] = F(field) + 1
+        if removed is not None:
+            field = rating_count_field(removed)
+            changes[field] = Greatest(F(field) - 1, 0)
+    Service.objects.filter(pk=service_id).update(**changes)
+
+
+def rebuild_rating_aggregates(batch_size=1000):
+    """Recompute rating totals and histograms for all services.
+
+    Services are processed in primary-key batches: one grouped query over
+    the batch's reviews and one bulk UPDATE per batch. Returns the number
+    of services processed.
+    """
+    histogram_fields = [rating_count_field(value) for value in RATING_VALUES]
+    processed = 0
+    last_pk = 0
+    while True:
+        services = list(
+            Service.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .only("pk")[:batch_size]
+        )
+        if not services:
+            return processed
+
+        totals = {
+            row.pop("service_id"): row
+            for row in Review.objects.filter(service__in=services)
+            .values("service_id")
+            .annotate(
+                rating_sum=Sum("rating"),
+                rating_count=Count("id"),
+                **{
+                    rating_count_field(value): Count("id", filter=Q(rating=value))
+                    for value in RATING_VALUES
+                },
+            )
+        }
+        for service in services:
+            row = totals.get(service.pk, {})
+            service.rating_sum = row.get("rating_sum", 0)
+            service.rating_count = row.get("rating_count", 0)
+            for field in histogram_fields:
+                setattr(service, field, row.get(field, 0))
+            service.average_rating = (
+                service.rating_sum / service.rating_count
+                if service.rating_count
+                else 0.0
+            )
+        Service.objects.bulk_update(
+            services,
+            ["rating_sum", "rating_count", "average_rating", *histogram_fields],
+        )
+
+        processed += len(services)
+        last_pk = services[-1].pk
@@ -0,0 +1,173 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache_utils import (cache_get_tagged, cache_set_tagged,
+                          release_rebuild_lock, versions_etag,
+                          versions_last_modified)
+
+RESPONSE_CACHE_PREFIX = "resp:"
+BUDGET_WINDOW_KEY = "resp:budget-window"
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries it lets through."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _reserve_budget(size):
+    """Account ``size`` bytes against RESPONSE_CACHE_BUDGET_BYTES.
+
+    Bytes are counted per window of CACHE_TTL seconds. Every entry written
+    in a window has expired by the end of the next one, so capping each
+    window at half the budget keeps the live total under the budget.
+    """
+    window_budget = settings.RESPONSE_CACHE_BUDGET_BYTES // 2
+    if size > window_budget:
+        return False
+
+    cache.add(BUDGET_WINDOW_KEY, 0, settings.CACHE_TTL)
+    try:
+        used = cache.incr(BUDGET_WINDOW_KEY, size)
+    except ValueError:
+        # The window expired between add() and incr(); start a new one
+        cache.set(BUDGET_WINDOW_KEY, size, settings.CACHE_TTL)
+        return True
+    if used > window_budget:
+        cache.decr(BUDGET_WINDOW_KEY, size)
+        return False
+    return True
+
+
+class CachedResponseMixin:
+    """Serve ``list`` and ``retrieve`` from cached, already rendered JSON.
+
+    Entries are keyed by route, query string (which includes the page) and
+    the caller's scope, and are tagged with ``get_cache_tags()`` so model
+    writes invalidate them. Every response carries an ``X-Cache`` header;
+    hits also report the CPU time and SQL queries the original render took.
+    Misses are rebuilt by a single caller at a time (see
+    :func:`HomeSer.cache_utils.read_through`).
+
+    The ETag and Last-Modified validators come from the tag generations read
+    alongside the entry, so a conditional request for unchanged data gets a
+    304 without querying the database or running the serializer.
+    """
+
+    def get_cache_tags(self):
+        raise NotImplementedError("Viewsets must declare their cache tags.")
+
+    def get_cache_scope(self):
+        """Identify whose view of the data this response is."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return "anonymous"
+        return f"user:{user.id}"
+
+    def get_response_cache_key(self, request):
+        query = sorted(request.query_params.lists())
+        raw = f"{request.path}|{query}|{self.get_cache_scope()}"
+        return RESPONSE_CACHE_PREFIX + hashlib.sha1(raw.encode()).hexdigest()
+
+    def read_cached_entry(self, key):
+        """Return ``(entry, versions)`` for the tags the entry depends on."""
+        return cache_get_tagged(key, self.get_cache_tags())
+
+    def write_cached_entry(self, key, entry, versions, delta):
+        cache_set_tagged(key, entry, versions, settings.CACHE_TTL, delta)
+
+    def discard_cached_entry(self, key, versions):
+        """Called instead of a write when a rebuilt response is not stored."""
+        release_rebuild_lock(key)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        # Only JSON output is cached; the browsable API renders per request
+        if request.accepted_renderer.format != "json":
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        entry, versions = self.read_cached_entry(key)
+        etag = versions_etag(key, versions)
+        last_modified = versions_last_modified(versions)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            if entry is None:
+                # Nothing is rebuilt for a 304; let the next reader do it
+                self.discard_cached_entry(key, versions)
+            return self.set_validators(response, etag, last_modified)
+
+        if entry is not None:
+            content, content_type, cpu_ms, query_count = entry
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Cache"] = "HIT"
+            response["X-Cache-Saved-CPU-ms"] = f"{cpu_ms:.2f}"
+            response["X-Cache-Saved-Queries"] = str(query_count)
+            return self.set_validators(response, etag, last_modified)
+
+        try:
+            response, cpu_ms, query_count, delta = self.render_uncached(
+                handler, request, *args, **kwargs
+            )
+        except Exception:
+            self.discard_cached_entry(key, versions)
+            raise
+        if response.status_code != 200:
+            self.discard_cached_entry(key, versions)
+            return response
+
+        response["X-Cache"] = "MISS"
+        if _reserve_budget(len(response.content)):
+            self.write_cached_entry(
+                key,
+                (response.content, response["Content-Type"], cpu_ms, query_count),
+                versions,
+                delta,
+            )
+        else:
+            self.discard_cached_entry(key, versions)
+        return self.set_validators(response, etag, last_modified)
+
+    def render_uncached(self, handler, request, *args, **kwargs):
+        """Run ``handler`` and render its response, measuring the cost.
+
+        Returns the response with the CPU milliseconds and SQL queries spent
+        on it, and the wall-clock seconds used to schedule early refresh.
+        """
+        counter = QueryCounter()
+        started = time.monotonic()
+        cpu_started = time.thread_time()
+        with connection.execute_wrapper(counter):
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = self.get_renderer_context()
+                response.render()
+        cpu_ms = (time.thread_time() - cpu_started) * 1000
+        return response, cpu_ms, counter.count, time.monotonic() - started
+
+    def set_validators(self, response, etag, last_modified):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,167 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, When
+
+# Text search configuration of the queries; the trigger added by migration
+# 0010 stores Service.search_vector with the same one
+SEARCH_CONFIG = "english"
+
+# External-content FTS5 index over Service, kept in sync by triggers so bulk
+# writes and queryset.update() are covered as well
+SQLITE_FTS_TABLE = "HomeSer_service_fts"
+SQLITE_FTS_TRIGGERS = {
+    "HomeSer_service_fts_ai": """
+        CREATE TRIGGER IF NOT EXISTS "HomeSer_service_fts_ai"
+        AFTER INSERT ON "HomeSer_service" BEGIN
+            INSERT INTO "HomeSer_service_fts" (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+    "HomeSer_service_fts_ad": """
+        CREATE TRIGGER IF NOT EXISTS "HomeSer_service_fts_ad"
+        AFTER DELETE ON "HomeSer_service" BEGIN
+            INSERT INTO "HomeSer_service_fts"
+                ("HomeSer_service_fts", rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+    """,
+    "HomeSer_service_fts_au": """
+        CREATE TRIGGER IF NOT EXISTS "HomeSer_service_fts_au"
+        AFTER UPDATE OF name, description ON "HomeSer_service" BEGIN
+            INSERT INTO "HomeSer_service_fts"
+                ("HomeSer_service_fts", rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO "HomeSer_service_fts" (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+}
+
+
+def ensure_sqlite_fts_index(connection):
+    """Create the FTS5 table and its triggers if any part is missing.
+
+    SQLite drops triggers when a migration rebuilds HomeSer_service, so
+    this also runs after every migrate; when something had to be created
+    the index is rebuilt from the table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s)"
+            % ", ".join(["%s"] * (len(SQLITE_FTS_TRIGGERS) + 1)),
+            [SQLITE_FTS_TABLE, *SQLITE_FTS_TRIGGERS],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if len(existing) == len(SQLITE_FTS_TRIGGERS) + 1:
+            return
+
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{SQLITE_FTS_TABLE}" USING fts5('
+            "name, description, content='HomeSer_service', content_rowid='id')"
+        )
+        for statement in SQLITE_FTS_TRIGGERS.values():
+            cursor.execute(statement)
+        cursor.execute(
+            f'INSERT INTO "{SQLITE_FTS_TABLE}" ("{SQLITE_FTS_TABLE}") '
+            "VALUES ('rebuild')"
+        )
+
+
+class PostgresSearchBackend:
+    """Full-text search on the stored, GIN-indexed ``search_vector``.
+
+    A trigger (migration 0010) keeps the vector current on every write.
+    """
+
+    def search(self, queryset, text, order_by_rank):
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=query)
+        if order_by_rank:
+            queryset = queryset.annotate(
+                rank=SearchRank(F("search_vector"), query)
+            ).order_by("-rank", "id")
+        return queryset[: settings.SEARCH_RESULTS_LIMIT]
+
+
+class SQLiteSearchBackend:
+    """FTS5 search with prefix matching on every term and bm25 ranking."""
+
+    # bm25() column weights: a hit in the name counts for more
+    NAME_WEIGHT = 10.0
+    DESCRIPTION_WEIGHT = 1.0
+
+    def match_expression(self, text):
+        """Turn free text into an FTS5 query of prefix terms, all required."""
+        terms = re.findall(r"\w+", text)
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, text, order_by_rank):
+        match = self.match_expression(text)
+        if not match:
+            return queryset.none()
+
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SQLITE_FTS_TABLE} "
+                f"WHERE {SQLITE_FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({SQLITE_FTS_TABLE}, %s, %s) LIMIT %s",
+                [
+                    match,
+                    self.NAME_WEIGHT,
+                    self.DESCRIPTION_WEIGHT,
+                    settings.SEARCH_RESULTS_LIMIT,
+                ],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+        queryset = queryset.filter(pk__in=ids)
+        if order_by_rank and ids:
+            queryset = queryset.order_by(
+                Case(
+                    *(When(pk=pk, then=position) for position, pk in enumerate(ids)),
+                    output_field=IntegerField(),
+                )
+            )
+        return queryset
+
+
+class BasicSearchBackend:
+    """Substring match for databases without a full-text index."""
+
+    def search(self, queryset, text, order_by_rank):
+        queryset = queryset.filter(
+            Q(name__icontains=text) | Q(description__icontains=text)
+        )
+        return queryset[: settings.SEARCH_RESULTS_LIMIT]
+
+
+SEARCH_BACKENDS = {
+    "postgresql": PostgresSearchBackend(),
+    "sqlite": SQLiteSearchBackend(),
+}
+
+
+def get_search_backend(using="default"):
+    return SEARCH_BACKENDS.get(connections[using].vendor, BasicSearchBackend())
+
+
+def normalize_search(text):
+    """Canonical form of a search text.
+
+    Searches that differ only in case or spacing match the same services, so
+    they can share one cache entry.
+    """
+    return " ".join(text.split()).lower()
+
+
+def search_services(queryset, text, order_by_rank=True):
+    """Filter ``queryset`` to services matching ``text``.
+
+    Results are ordered by relevance unless ``order_by_rank`` is false, in
+    which case the queryset's own ordering is kept, and are capped at
+    SEARCH_RESULTS_LIMIT rows.
+    """
+    return get_search_backend(queryset.db).search(queryset, text, order_by_rank)
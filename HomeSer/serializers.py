@@ -5,7 +5,29 @@ from .models import (Cart, CartItem, ClientProfile, Order, OrderItem, Review,
                      Service, User)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """Let callers pick the fields of a serializer and expand relations.
+
+    ``fields`` limits the output to the named fields. ``expand`` replaces
+    each named field listed in ``expandable_fields`` with the nested
+    serializer declared there. Unknown names are ignored.
+    """
+
+    # Field name -> (serializer class, keyword arguments)
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand or ():
+            if name in self.expandable_fields:
+                serializer_class, options = self.expandable_fields[name]
+                self.fields[name] = serializer_class(read_only=True, **options)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """User account information.
 
     This serializer handles user account data including authentication
@@ -27,7 +49,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class ClientProfileSerializer(serializers.ModelSerializer):
+class ClientProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Extended profile information for clients.
 
     Contains additional details about users with the 'client' role.
@@ -65,7 +87,7 @@ class ClientProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ("user",)
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Household service information.
 
     Represents a service that can be ordered through the platform.
@@ -84,11 +106,27 @@ class ServiceSerializer(serializers.ModelSerializer):
     average_rating = serializers.FloatField(
         read_only=True, help_text="Average rating of the service based on reviews."
     )
+    rating_count = serializers.IntegerField(
+        read_only=True, help_text="Number of reviews of the service."
+    )
+    rating_histogram = serializers.DictField(
+        child=serializers.IntegerField(),
+        read_only=True,
+        help_text="Number of reviews per star rating, from 5 down to 1.",
+    )
 
     class Meta:
         model = Service
-        fields = ("id", "name", "description", "price", "average_rating")
-        read_only_fields = ("id", "average_rating")
+        fields = (
+            "id",
+            "name",
+            "description",
+            "price",
+            "average_rating",
+            "rating_count",
+            "rating_histogram",
+        )
+        read_only_fields = ("id", "average_rating", "rating_count")
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -123,7 +161,63 @@ class CartItemSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartOperationSerializer(serializers.Serializer):
+    """One change to the items of a cart."""
+
+    op = serializers.ChoiceField(
+        choices=["set", "increment", "remove"],
+        default="set",
+        help_text="'set' the quantity, 'increment' it by quantity (which may be "
+        "negative) or 'remove' the service.",
+    )
+    service_id = serializers.IntegerField(help_text="ID of the service to change.")
+    quantity = serializers.IntegerField(
+        required=False,
+        help_text="Quantity to set (0 removes the item) or to add (default 1).",
+    )
+
+    def validate(self, attrs):
+        if attrs["op"] == "set":
+            if "quantity" not in attrs:
+                raise serializers.ValidationError(
+                    {"quantity": "This field is required to set a quantity."}
+                )
+            if attrs["quantity"] < 0:
+                raise serializers.ValidationError(
+                    {"quantity": "Ensure this value is greater than or equal to 0."}
+                )
+        elif attrs["op"] == "increment":
+            attrs.setdefault("quantity", 1)
+        else:
+            attrs.pop("quantity", None)
+        return attrs
+
+
+class CartItemsUpdateSerializer(serializers.Serializer):
+    """A batch of cart item changes, applied in order and all together."""
+
+    operations = CartOperationSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=100,
+        help_text="Changes to apply, at most 100.",
+    )
+
+    def validate_operations(self, operations):
+        # One query for the whole batch
+        service_ids = {operation["service_id"] for operation in operations}
+        found = set(
+            Service.objects.filter(id__in=service_ids).values_list("id", flat=True)
+        )
+        missing = sorted(service_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                f"Unknown services: {', '.join(map(str, missing))}."
+            )
+        return operations
+
+
+class CartSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """User's shopping cart.
 
     Contains all services a user has selected but not yet ordered.
@@ -135,11 +229,14 @@ class CartSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
         read_only=True, help_text="ID of the user who owns this cart."
     )
-    services = serializers.PrimaryKeyRelatedField(
-        many=True, read_only=True, help_text="List of service IDs in the cart."
+    services = serializers.SerializerMethodField(
+        help_text="List of service IDs in the cart."
     )
     items = CartItemSerializer(
-        many=True, read_only=True, help_text="List of services in the cart"
+        many=True,
+        read_only=True,
+        source="cartitem_set",
+        help_text="List of services in the cart",
     )
     total_price = serializers.SerializerMethodField(
         help_text="Total cost of all items in the cart"
@@ -153,29 +250,22 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ("id", "user", "services", "items", "total_price", "item_count")
         read_only_fields = ("id", "user")
 
+    # All three read the items prefetched by the viewset, so they add no
+    # queries per cart
+
+    @extend_schema_field(serializers.ListField(child=serializers.IntegerField()))
+    def get_services(self, obj) -> list:
+        return [item.service_id for item in obj.cartitem_set.all()]
+
     @extend_schema_field(serializers.FloatField)
     def get_total_price(self, obj) -> float:
-        # Optimize calculation using annotation if available
-        if (
-            hasattr(obj, "annotated_total_price")
-            and obj.annotated_total_price is not None
-        ):
-            return obj.annotated_total_price
-        # Fallback calculation
         return sum(
             item.service.price * item.quantity for item in obj.cartitem_set.all()
         )
 
     @extend_schema_field(serializers.IntegerField)
     def get_item_count(self, obj) -> int:
-        # Optimize count using annotation if available
-        if (
-            hasattr(obj, "annotated_item_count")
-            and obj.annotated_item_count is not None
-        ):
-            return obj.annotated_item_count
-        # Fallback count
-        return obj.cartitem_set.count()
+        return sum(item.quantity for item in obj.cartitem_set.all())
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -194,7 +284,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         source="service.name", read_only=True, help_text="Name of the service"
     )
     service_price = serializers.DecimalField(
-        source="service.price",
+        source="unit_price",
         max_digits=10,
         decimal_places=2,
         read_only=True,
@@ -210,7 +300,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Service order information.
 
     Represents a confirmed order of services by a user.
@@ -222,8 +312,8 @@ class OrderSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
         read_only=True, help_text="ID of the user who placed the order."
     )
-    services = serializers.PrimaryKeyRelatedField(
-        many=True, read_only=True, help_text="List of service IDs in the order."
+    services = serializers.SerializerMethodField(
+        help_text="List of service IDs in the order."
     )
     created_at = serializers.DateTimeField(
         read_only=True, help_text="Timestamp when the order was created."
@@ -237,13 +327,15 @@ class OrderSerializer(serializers.ModelSerializer):
         source="orderitem_set",
         help_text="List of services included in this order",
     )
-    total_price = serializers.SerializerMethodField(
-        help_text="Total cost of all items in the order"
+    total_price = serializers.FloatField(
+        read_only=True, help_text="Total cost of all items in the order"
     )
-    item_count = serializers.SerializerMethodField(
-        help_text="Total number of items in the order"
+    item_count = serializers.IntegerField(
+        read_only=True, help_text="Total number of items in the order"
     )
 
+    expandable_fields = {"user": (UserSerializer, {})}
+
     class Meta:
         model = Order
         fields = (
@@ -258,32 +350,33 @@ class OrderSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ("id", "user", "created_at")
 
-    @extend_schema_field(serializers.FloatField)
-    def get_total_price(self, obj) -> float:
-        # Optimize calculation using annotation if available
-        if (
-            hasattr(obj, "annotated_total_price")
-            and obj.annotated_total_price is not None
-        ):
-            return obj.annotated_total_price
-        # Fallback calculation
-        return sum(
-            item.service.price * item.quantity for item in obj.orderitem_set.all()
-        )
+    # Reads the items prefetched by the viewset, so it adds no queries per
+    # order
+    @extend_schema_field(serializers.ListField(child=serializers.IntegerField()))
+    def get_services(self, obj) -> list:
+        return [item.service_id for item in obj.orderitem_set.all()]
 
-    @extend_schema_field(serializers.IntegerField)
-    def get_item_count(self, obj) -> int:
-        # Optimize count using annotation if available
-        if (
-            hasattr(obj, "annotated_item_count")
-            and obj.annotated_item_count is not None
-        ):
-            return obj.annotated_item_count
-        # Fallback count
-        return obj.orderitem_set.count()
 
+class OrderStatusTransitionSerializer(serializers.Serializer):
+    """A new status for a batch of orders."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=1000,
+        help_text="IDs of the orders to change, at most 1000.",
+    )
+    status = serializers.ChoiceField(
+        choices=Order.STATUS_CHOICES, help_text="Status to move the orders to."
+    )
+
+    def validate_status(self, status):
+        if not Order.status_sources(status):
+            raise serializers.ValidationError(f"No order can move to {status}.")
+        return status
 
-class ReviewSerializer(serializers.ModelSerializer):
+
+class ReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Service review and rating.
 
     Allows users to provide feedback on completed services.
@@ -314,6 +407,8 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only=True, help_text="Timestamp when the review was created."
     )
 
+    expandable_fields = {"service": (ServiceSerializer, {})}
+
     class Meta:
         model = Review
         fields = (
@@ -101,9 +101,10 @@ DB_NAME = os.getenv("dbname", "").strip()
 DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL:
     db_config = dj_database_url.parse(DATABASE_URL)
-    # Add SSL options for Supabase
+    # Add SSL options for Supabase; DATABASE_SSLMODE=disable for a local
+    # server, e.g. to run the PostgreSQL-only tests
     db_config["OPTIONS"] = {
-        "sslmode": "require",
+        "sslmode": os.getenv("DATABASE_SSLMODE", "require"),
         "connect_timeout": 10,
     }
     DATABASES = {"default": db_config}
@@ -116,6 +117,25 @@ else:
         }
     }
 
+# Maximum number of ranked results returned by a full-text service search
+SEARCH_RESULTS_LIMIT = int(os.getenv("SEARCH_RESULTS_LIMIT", 100))
+
+# Rows fetched per round trip by streaming exports
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 2000))
+
+# Unfiltered listings of tables of at least this many rows (by the planner's
+# estimate) report an approximate count instead of running COUNT(*);
+# PostgreSQL only
+ESTIMATED_COUNT_THRESHOLD = int(os.getenv("ESTIMATED_COUNT_THRESHOLD", 100000))
+
+# Reviews rendered with the service detail page; the rest load on demand
+REVIEW_PREVIEW_LIMIT = int(os.getenv("REVIEW_PREVIEW_LIMIT", 5))
+
+# Service name suggestions: time budget per request, and how often a worker
+# checks whether another worker changed service names
+SUGGEST_TIME_BUDGET_MS = int(os.getenv("SUGGEST_TIME_BUDGET_MS", 10))
+SUGGEST_SYNC_INTERVAL = int(os.getenv("SUGGEST_SYNC_INTERVAL", 5))  # seconds
+
 # Password validation
 # https://docs.djangoproject.com/en/stable/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -156,6 +176,16 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # orjson-backed when installed, stdlib json otherwise
+    "DEFAULT_RENDERER_CLASSES": (
+        "HomeSer.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "HomeSer.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_THROTTLE_CLASSES": [
@@ -226,6 +256,45 @@ else:
 
 CACHE_TTL = int(os.getenv("CACHE_TTL", 900))  # 15 minutes default
 
+# Per-worker in-process tier in front of CACHES for the shared service catalog
+CATALOG_CACHE_L1_TTL = int(os.getenv("CATALOG_CACHE_L1_TTL", 5))  # seconds
+CATALOG_CACHE_L1_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_L1_MAX_ENTRIES", 256))
+
+# Upper bound on the rendered API responses kept in the cache at once
+RESPONSE_CACHE_BUDGET_BYTES = int(
+    os.getenv("RESPONSE_CACHE_BUDGET_BYTES", 64 * 1024 * 1024)
+)  # 64 MB default
+
+# Where carts are kept between requests: "database" writes every change
+# through, "redis" keeps them in the Redis cache (REDIS_URL) and writes them
+# back in batches. Celery beat runs flush_carts_task every
+# CART_FLUSH_INTERVAL; without Celery, run the flush_carts command as often,
+# well within CART_REDIS_TTL so no change expires before it is written.
+CART_BACKEND = os.getenv("CART_BACKEND", "database")
+CART_REDIS_TTL = int(os.getenv("CART_REDIS_TTL", 7 * 24 * 3600))  # 1 week default
+CART_FLUSH_BATCH_SIZE = int(os.getenv("CART_FLUSH_BATCH_SIZE", 500))
+CART_FLUSH_INTERVAL = int(os.getenv("CART_FLUSH_INTERVAL", 300))  # 5 minutes default
+
+CELERY_BEAT_SCHEDULE = {
+    # A no-op with the database cart store
+    "flush-carts": {
+        "task": "HomeSer.tasks.flush_carts_task",
+        "schedule": CART_FLUSH_INTERVAL,
+    },
+}
+# Anonymous visitors' carts are kept in a signed cookie for this long
+GUEST_CART_COOKIE_AGE = int(
+    os.getenv("GUEST_CART_COOKIE_AGE", 30 * 24 * 3600)
+)  # 30 days default
+
+# How long checkout responses are kept for requests repeating an
+# Idempotency-Key header or form token
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 3600))  # 1 day default
+
+# Orders changed by a bulk status transition are emailed about and dropped
+# from the cache in batches of this size
+ORDER_STATUS_BATCH_SIZE = int(os.getenv("ORDER_STATUS_BATCH_SIZE", 500))
+
 # Session configuration
 # https://docs.djangoproject.com/en/stable/topics/http/sessions/
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
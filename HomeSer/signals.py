@@ -0,0 +1,184 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models.signals import (post_delete, post_init, post_migrate,
+                                      post_save)
+from django.dispatch import receiver
+
+from .cache_utils import (CATALOG_TAG, RATINGS_TAG, invalidate_tags,
+                          service_tag, user_tag)
+from .cart_store import get_cart_store
+from .catalog import catalog_cache
+from .ratings import apply_rating_change
+from .search import ensure_sqlite_fts_index
+from .suggest import suggestion_index
+from .models import (Cart, CartItem, ClientProfile, Order, OrderItem, Review,
+                     Service, User)
+
+
+def _invalidate_on_commit(*tags):
+    # Wait for the write to be visible before dropping cached entries,
+    # otherwise a concurrent reader could re-cache the old rows.
+    transaction.on_commit(partial(invalidate_tags, *tags))
+
+
+def _cart_owner_id(cart_item):
+    if CartItem.cart.is_cached(cart_item):
+        return cart_item.cart.user_id
+    return (
+        Cart.objects.filter(pk=cart_item.cart_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+
+
+def _order_owner_id(order_item):
+    if OrderItem.order.is_cached(order_item):
+        return order_item.order.user_id
+    return (
+        Order.objects.filter(pk=order_item.order_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    _invalidate_on_commit("users", user_tag(instance.pk, "account"))
+
+
+@receiver([post_save, post_delete], sender=ClientProfile)
+def invalidate_client_profile(sender, instance, **kwargs):
+    _invalidate_on_commit("profiles", user_tag(instance.user_id, "profile"))
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    # Rebuilding HomeSer_service on SQLite drops the FTS sync triggers
+    connection = connections[using]
+    if (
+        sender.label == "HomeSer"
+        and connection.vendor == "sqlite"
+        and Service._meta.db_table in connection.introspection.table_names()
+    ):
+        ensure_sqlite_fts_index(connection)
+
+
+@receiver(post_init, sender=Service)
+def remember_service_name(sender, instance, **kwargs):
+    # The name the row holds, so saves that keep it leave suggestions alone.
+    # Read from __dict__ so that a deferred name is not loaded.
+    instance._stored_name = (
+        None if instance.pk is None else instance.__dict__.get("name")
+    )
+
+
+@receiver(post_save, sender=Service)
+def index_service_name(sender, instance, created, update_fields=None, **kwargs):
+    if not created:
+        if update_fields is not None and "name" not in update_fields:
+            return
+        if instance._stored_name == instance.name:
+            return
+    instance._stored_name = instance.name
+    transaction.on_commit(partial(suggestion_index.add, instance.pk, instance.name))
+    transaction.on_commit(suggestion_index.publish_change)
+
+
+@receiver(post_delete, sender=Service)
+def unindex_service_name(sender, instance, **kwargs):
+    transaction.on_commit(partial(suggestion_index.remove, instance.pk))
+    transaction.on_commit(suggestion_index.publish_change)
+
+
+@receiver([post_save, post_delete], sender=Service)
+def invalidate_service(sender, instance, **kwargs):
+    _invalidate_on_commit(CATALOG_TAG, service_tag(instance.pk))
+    transaction.on_commit(catalog_cache.clear_local)
+
+
+@receiver([post_save, post_delete], sender=Cart)
+def invalidate_cart(sender, instance, **kwargs):
+    _invalidate_on_commit(user_tag(instance.user_id, "cart"))
+
+
+@receiver(post_delete, sender=Cart)
+def forget_stored_cart(sender, instance, **kwargs):
+    # Otherwise the next write-back would recreate the cart
+    transaction.on_commit(partial(get_cart_store().invalidate, instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def invalidate_cart_item(sender, instance, **kwargs):
+    user_id = _cart_owner_id(instance)
+    if user_id is not None:
+        _invalidate_on_commit(user_tag(user_id, "cart"))
+
+
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_order(sender, instance, **kwargs):
+    _invalidate_on_commit("orders", user_tag(instance.user_id, "orders"))
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def invalidate_order_item(sender, instance, **kwargs):
+    user_id = _order_owner_id(instance)
+    if user_id is not None:
+        _invalidate_on_commit("orders", user_tag(user_id, "orders"))
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    # What the row holds in the database, so a later save can tell which
+    # service's totals to move and by how much. Read from __dict__ so that
+    # deferred fields are not loaded.
+    if instance.pk is None:
+        instance._stored_rating = None
+    else:
+        instance._stored_rating = (
+            instance.__dict__.get("service_id"),
+            instance.__dict__.get("rating"),
+        )
+
+
+@receiver(post_save, sender=Review)
+def add_review_rating(sender, instance, created, **kwargs):
+    stored = None if created else instance._stored_rating
+    current = (instance.service_id, instance.rating)
+    if not created and (stored is None or None in stored):
+        # Saved without having been loaded; rebuild_rating_aggregates
+        # reconciles the totals
+        return
+    if stored == current:
+        return
+
+    if stored is not None and stored[0] == current[0]:
+        apply_rating_change(current[0], added=current[1], removed=stored[1])
+    else:
+        if stored is not None:
+            apply_rating_change(stored[0], removed=stored[1])
+            _invalidate_on_commit(service_tag(stored[0]))
+        apply_rating_change(current[0], added=current[1])
+    instance._stored_rating = current
+    # The F() updates bypass the Service signals
+    _invalidate_on_commit(RATINGS_TAG)
+    transaction.on_commit(catalog_cache.clear_local)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    service_id, rating = instance._stored_rating or (None, None)
+    if service_id is None or rating is None:
+        service_id, rating = instance.service_id, instance.rating
+    apply_rating_change(service_id, removed=rating)
+    _invalidate_on_commit(RATINGS_TAG)
+    transaction.on_commit(catalog_cache.clear_local)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review(sender, instance, **kwargs):
+    _invalidate_on_commit(
+        "reviews",
+        service_tag(instance.service_id),
+        user_tag(instance.user_id, "reviews"),
+    )
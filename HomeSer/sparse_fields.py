@@ -0,0 +1,61 @@
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def _split(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class SparseFieldsMixin:
+    """Honour ``?fields=`` and ``?expand=`` on read requests.
+
+    Both take comma-separated field names: ``fields`` keeps only those in
+    the output and ``expand`` nests the related objects a serializer lists
+    in ``expandable_fields`` (see :class:`HomeSer.serializers.DynamicFieldsMixin`).
+    Viewsets use :meth:`wants_field` and :meth:`trim_queryset` so that
+    fields left out are not loaded either.
+    """
+
+    def get_fieldset(self):
+        """Serializer keyword arguments for the requested fields."""
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return {}
+        params = self.request.query_params
+        fieldset = {}
+        if FIELDS_PARAM in params:
+            fieldset["fields"] = _split(params[FIELDS_PARAM])
+        if EXPAND_PARAM in params:
+            fieldset["expand"] = _split(params[EXPAND_PARAM])
+        return fieldset
+
+    def wants_field(self, name):
+        fields = self.get_fieldset().get("fields")
+        return fields is None or name in fields
+
+    def get_expanded_models(self):
+        """Models of the related objects nested by the requested ``expand``."""
+        expandable = getattr(self.get_serializer_class(), "expandable_fields", {})
+        return [
+            expandable[name][0].Meta.model
+            for name in self.get_fieldset().get("expand", ())
+            if name in expandable
+        ]
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, **{**self.get_fieldset(), **kwargs})
+
+    def trim_queryset(self, queryset):
+        """Defer every column the requested fields do not read.
+
+        Only applies when each remaining field maps to a column of the
+        model itself; anything else is left to the viewset.
+        """
+        if "fields" not in self.get_fieldset():
+            return queryset
+        columns = {field.name for field in queryset.model._meta.concrete_fields}
+        sources = [field.source for field in self.get_serializer().fields.values()]
+        if not set(sources) <= columns:
+            return queryset
+        return queryset.select_related(None).only(*sources)
@@ -0,0 +1,240 @@
+import bisect
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+from .cache_utils import bump_tag, tag_version
+
+# Bumped whenever a service is created, renamed or deleted
+SERVICE_NAMES_TAG = "service-names"
+
+# Minimum trigram similarity for a typo-tolerant match
+MIN_SIMILARITY = 0.3
+
+
+def normalize(text):
+    """Casefold and strip accents so "Café" matches "cafe"."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def words(text):
+    return "".join(ch if ch.isalnum() else " " for ch in normalize(text)).split()
+
+
+def word_trigrams(word):
+    """Trigrams of ``word`` padded like pg_trgm ("  ab", " abc", "bc ")."""
+    padded = f"  {word} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(text):
+    """Trigrams of each word of ``text``."""
+    grams = set()
+    for word in words(text):
+        grams.update(word_trigrams(word))
+    return grams
+
+
+def word_similarity(query_grams, name_grams):
+    """Similarity of a query to a name, both given as per-word trigram sets.
+
+    Each query word scores against the name word it shares most trigrams
+    with, in proportion (like pg_trgm ``word_similarity``), and the scores
+    are averaged. Comparing with the whole name instead would let the other
+    words of a long name sink a one-word typo: "plumbnig" shares 5 of 13
+    trigrams with "plumbing" but only 5 of 17 with "plumbing repair".
+    """
+    total = 0.0
+    for query in query_grams:
+        total += max(len(query & name) / len(query | name) for name in name_grams)
+    return total / len(query_grams)
+
+
+class _IndexState:
+    def __init__(self):
+        self.names = {}
+        self.words = {}
+        self.grams = {}
+        self.word_grams = {}
+        self.tokens = []
+        self.postings = defaultdict(set)
+
+    def add(self, service_id, name):
+        self.names[service_id] = name
+        self.words[service_id] = words(name)
+        self.word_grams[service_id] = [word_trigrams(w) for w in words(name)]
+        self.grams[service_id] = set().union(*self.word_grams[service_id])
+        for gram in self.grams[service_id]:
+            self.postings[gram].add(service_id)
+        for word in set(self.words[service_id]):
+            bisect.insort(self.tokens, (word, service_id))
+
+    def remove(self, service_id):
+        if self.names.pop(service_id, None) is None:
+            return
+        del self.word_grams[service_id]
+        for gram in self.grams.pop(service_id):
+            self.postings[gram].discard(service_id)
+        for word in set(self.words.pop(service_id)):
+            position = bisect.bisect_left(self.tokens, (word, service_id))
+            if position < len(self.tokens) and self.tokens[position] == (
+                word,
+                service_id,
+            ):
+                del self.tokens[position]
+
+
+class SuggestionIndex:
+    """In-process prefix and trigram index over Service.name.
+
+    Built once per worker (see :meth:`warm`) and kept current by the
+    Service save/delete signals of this worker, which then bump the
+    ``service-names`` tag (see :meth:`publish_change`). The index checks the
+    tag at most every SUGGEST_SYNC_INTERVAL seconds and rebuilds in the
+    background after other workers' changes, serving the previous index
+    meanwhile.
+    """
+
+    def __init__(self):
+        self._state = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def _load(self):
+        from .models import Service
+
+        version = tag_version(SERVICE_NAMES_TAG)
+        state = _IndexState()
+        for service_id, name in Service.objects.values_list("id", "name").iterator():
+            state.add(service_id, name)
+        with self._lock:
+            self._state, self._version = state, version
+            self._checked_at = time.monotonic()
+
+    def _rebuild(self):
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            self._load()
+        finally:
+            self._build_lock.release()
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild()
+        finally:
+            # The thread opened its own database connection
+            connections.close_all()
+
+    def warm(self):
+        """Build the index in a background thread."""
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _ensure_current(self):
+        if self._state is None:
+            # First use: wait for a build already in progress or run one
+            with self._build_lock:
+                if self._state is None:
+                    self._load()
+            return
+        now = time.monotonic()
+        if now - self._checked_at < settings.SUGGEST_SYNC_INTERVAL:
+            return
+        self._checked_at = now
+        if tag_version(SERVICE_NAMES_TAG) != self._version:
+            self.warm()
+
+    def add(self, service_id, name):
+        with self._lock:
+            if self._state is not None:
+                self._state.remove(service_id)
+                self._state.add(service_id, name)
+
+    def remove(self, service_id):
+        with self._lock:
+            if self._state is not None:
+                self._state.remove(service_id)
+
+    def publish_change(self):
+        """Tell other workers about a change just applied to this index.
+
+        This worker keeps its index, without a rebuild, if it held the
+        generation the bump replaced, i.e. it had seen every earlier change.
+        """
+        version = bump_tag(SERVICE_NAMES_TAG)
+        with self._lock:
+            if version is not None and self._version == version - 1:
+                self._version = version
+
+    def suggest(self, text, limit):
+        """Return up to ``limit`` ``(id, name)`` pairs matching ``text``.
+
+        Names with words starting with every query word come first. The
+        remaining slots are filled with names whose :func:`word_similarity`
+        to the query reaches MIN_SIMILARITY, which tolerates typos. Fuzzy
+        matching stops when SUGGEST_TIME_BUDGET_MS is used up, so very short
+        prefixes return a partial list rather than a slow one.
+        """
+        self._ensure_current()
+        deadline = time.perf_counter() + settings.SUGGEST_TIME_BUDGET_MS / 1000
+        query_words = words(text)
+        if not query_words:
+            return []
+
+        with self._lock:
+            state = self._state
+            scores = {}
+
+            # Prefix matches on the last (still being typed) word
+            *complete, last = query_words
+            position = bisect.bisect_left(state.tokens, (last,))
+            while position < len(state.tokens):
+                word, service_id = state.tokens[position]
+                if not word.startswith(last) or time.perf_counter() > deadline:
+                    break
+                position += 1
+                if service_id in scores:
+                    continue
+                name_words = state.words[service_id]
+                if all(
+                    any(w.startswith(q) for w in name_words) for q in complete
+                ):
+                    # Names that start with the query rank above the rest
+                    starts = " ".join(name_words).startswith(" ".join(query_words))
+                    scores[service_id] = 3.0 if starts else 2.0
+
+            # Typo-tolerant matches, rarest trigrams first
+            if len(scores) < limit:
+                query_grams = [word_trigrams(w) for w in query_words]
+                candidates = set()
+                for gram in sorted(
+                    set().union(*query_grams),
+                    key=lambda g: len(state.postings.get(g, ())),
+                ):
+                    if time.perf_counter() > deadline:
+                        break
+                    candidates.update(state.postings.get(gram, ()))
+                for service_id in candidates - scores.keys():
+                    if time.perf_counter() > deadline:
+                        break
+                    similarity = word_similarity(
+                        query_grams, state.word_grams[service_id]
+                    )
+                    if similarity >= MIN_SIMILARITY:
+                        scores[service_id] = similarity
+
+            ranked = sorted(
+                scores,
+                key=lambda pk: (-scores[pk], len(state.names[pk]), state.names[pk]),
+            )
+            return [(pk, state.names[pk]) for pk in ranked[:limit]]
+
+
+suggestion_index = SuggestionIndex()
@@ -3,6 +3,9 @@ from celery import shared_task
 from django.conf import settings
 from django.core.mail import send_mail
 
+from .cart_store import get_cart_store
+from .orders import send_order_status_emails
+
 
 @shared_task
 def debug_task():
@@ -24,3 +27,15 @@ def send_email_task(subject, message, recipient_list):
         return f"Email sent successfully to {', '.join(recipient_list)}"
     except Exception as e:
         return f"Failed to send email: {str(e)}"
+
+
+@shared_task
+def flush_carts_task():
+    """Write carts changed in the cart store back to the database."""
+    return get_cart_store().flush()
+
+
+@shared_task
+def send_order_status_emails_task(order_ids):
+    """Email the owners of orders whose status has changed."""
+    return send_order_status_emails(order_ids)
@@ -0,0 +1,2223 @@
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.core import mail
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F, Sum
+from django.http import Http404, HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+
+from .admin import OrderAdmin, ServiceAdmin
+from .cache_utils import (CATALOG_TAG, RATINGS_TAG, cache_get_or_set,
+                          cache_get_tagged, cache_set_tagged, invalidate_tags,
+                          service_tag, tag_versions, user_tag)
+from .cart_store import DatabaseCartStore, RedisCartStore, known_service_id
+from .catalog import CatalogCache, catalog_cache
+from .guest_cart import (GUEST_CART_COOKIE, GUEST_CART_MAX_ITEMS,
+                         read_guest_cart, write_guest_cart)
+from .idempotency import IDEMPOTENCY_KEY_HEADER
+from .models import (Cart, CartItem, ClientProfile, Order, OrderItem, Review,
+                     Service, User)
+from .orders import place_order, send_order_status_emails, transition_orders
+from .pagination import EstimatedCountPagination, NewestFirstCursorPagination
+from .serializers import ServiceSerializer
+from .suggest import SuggestionIndex
+from .tokens import account_activation_token
+from .values_serializers import (OrderValuesSerializer, ReviewValuesSerializer,
+                                 ServiceValuesSerializer)
+
+try:
+    import fakeredis
+except ImportError:  # Only needed by the Redis cart store tests
+    fakeredis = None
+
+# The web pages next to the API, for tests of the web views
+urlpatterns = [
+    path("api/", include("HomeSer.api_urls")),
+    path("", include("HomeSer.web_urls")),
+]
+
+
+def run_concurrently(target, threads):
+    """Call ``target`` from ``threads`` threads released at the same moment.
+
+    Returns what each call returned or raised.
+    """
+    barrier = threading.Barrier(threads)
+    results = []
+
+    def run():
+        try:
+            barrier.wait()
+            results.append(target())
+        except Exception as exc:
+            results.append(exc)
+        finally:
+            # Each thread opened its own database connection
+            connections.close_all()
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+@contextmanager
+def after_first_query(pattern, callback):
+    """Call ``callback`` once, after the first query matching ``pattern``.
+
+    It runs before the next query, once the matching one's results have
+    been read, or on leaving the block. Lets a test run statements between
+    two statements of the code under test, on the same connection.
+    """
+    calls = []
+    matched = []
+
+    def wrapper(execute, sql, params, many, context):
+        if matched and not calls:
+            calls.append(sql)
+            callback()
+        result = execute(sql, params, many, context)
+        if not matched and re.search(pattern, sql):
+            matched.append(sql)
+        return result
+
+    with connection.execute_wrapper(wrapper):
+        yield calls
+    if matched and not calls:
+        calls.append(None)
+        callback()
+
+
+def table_pattern(model):
+    """Regex matching queries that name ``model``'s table."""
+    return re.escape(connection.ops.quote_name(model._meta.db_table))
+
+
+def wait_for_lock_wait(timeout=5):
+    """Wait until another connection is blocked on a lock (PostgreSQL)."""
+    deadline = time.monotonic() + timeout
+    with connection.cursor() as cursor:
+        while time.monotonic() < deadline:
+            cursor.execute(
+                "SELECT 1 FROM pg_stat_activity "
+                "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+            )
+            if cursor.fetchone():
+                return
+            time.sleep(0.01)
+    raise AssertionError("No query waited for a lock.")
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", password="secret")
+        cls.cart = Cart.objects.create(user=cls.user)
+        cls.plumbing = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        cls.cleaning = Service.objects.create(
+            name="House cleaning", description="Clean rooms", price="3.25"
+        )
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def test_moves_items_with_totals(self):
+        CartItem.objects.create(cart=self.cart, service=self.plumbing, quantity=2)
+        CartItem.objects.create(cart=self.cart, service=self.cleaning, quantity=1)
+
+        order = place_order(self.user)
+
+        self.assertEqual(order.total_price, Decimal("24.25"))
+        self.assertEqual(order.item_count, 3)
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("24.25"))
+        self.assertEqual(order.item_count, 3)
+        self.assertEqual(
+            list(
+                order.orderitem_set.order_by("id").values_list(
+                    "service", "quantity", "unit_price"
+                )
+            ),
+            [
+                (self.plumbing.id, 2, Decimal("10.50")),
+                (self.cleaning.id, 1, Decimal("3.25")),
+            ],
+        )
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_query_count(self):
+        for service in (self.plumbing, self.cleaning):
+            CartItem.objects.create(cart=self.cart, service=service, quantity=2)
+        # Lock the cart, insert the order and move the items, inside a
+        # savepoint; the move takes three statements without PostgreSQL
+        with self.assertNumQueries(5 if connection.vendor == "postgresql" else 7):
+            place_order(self.user)
+
+    def test_empty_cart_places_no_order(self):
+        self.assertIsNone(place_order(self.user))
+        self.assertFalse(Order.objects.exists())
+
+    def test_add_between_statements_is_not_lost(self):
+        CartItem.objects.create(cart=self.cart, service=self.plumbing, quantity=2)
+        CartItem.objects.create(cart=self.cart, service=self.cleaning, quantity=1)
+
+        # An add lands right after the first statement reading the items
+        with after_first_query(
+            table_pattern(CartItem),
+            lambda: DatabaseCartStore().add(self.user.id, self.plumbing.id),
+        ) as calls:
+            order = place_order(self.user)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            dict(order.orderitem_set.values_list("service", "quantity")),
+            {self.plumbing.id: 2, self.cleaning.id: 1},
+        )
+        self.assertEqual(order.item_count, 3)
+        # It was not moved, so it must still be in the cart
+        self.assertEqual(
+            dict(CartItem.objects.values_list("service", "quantity")),
+            {self.plumbing.id: 1},
+        )
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="secret")
+        self.cart = Cart.objects.create(user=self.user)
+        self.plumbing = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        self.cleaning = Service.objects.create(
+            name="House cleaning", description="Clean rooms", price="3.25"
+        )
+
+    def test_simultaneous_checkouts_place_one_order(self):
+        for attempt in range(5):
+            with self.subTest(attempt=attempt):
+                CartItem.objects.create(
+                    cart=self.cart, service=self.plumbing, quantity=2
+                )
+                CartItem.objects.create(
+                    cart=self.cart, service=self.cleaning, quantity=1
+                )
+
+                results = run_concurrently(lambda: place_order(self.user), 2)
+
+                placed = [result for result in results if isinstance(result, Order)]
+                self.assertEqual(len(placed), 1, results)
+                self.assertEqual(results.count(None), 1, results)
+                self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+                order = Order.objects.get(pk=placed[0].pk)
+                self.assertEqual(order.item_count, 3)
+                self.assertEqual(order.total_price, Decimal("24.25"))
+                self.assertEqual(
+                    order.orderitem_set.aggregate(
+                        total=Sum(F("unit_price") * F("quantity"))
+                    )["total"],
+                    order.total_price,
+                )
+
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(OrderItem.objects.filter(order__user=self.user).count(), 10)
+
+    def test_add_committed_during_checkout_is_moved(self):
+        CartItem.objects.create(cart=self.cart, service=self.plumbing, quantity=2)
+        added, release = threading.Event(), threading.Event()
+        results = {}
+
+        def add():
+            try:
+                # Holds the item's row lock until released
+                with transaction.atomic():
+                    DatabaseCartStore().add(self.user.id, self.plumbing.id)
+                    added.set()
+                    release.wait(5)
+            finally:
+                connections.close_all()
+
+        def checkout():
+            try:
+                results["order"] = place_order(self.user)
+            finally:
+                connections.close_all()
+
+        adder = threading.Thread(target=add)
+        adder.start()
+        self.assertTrue(added.wait(5))
+        buyer = threading.Thread(target=checkout)
+        buyer.start()
+        try:
+            # The checkout waits for the add's row lock, then moves its result
+            wait_for_lock_wait()
+        finally:
+            release.set()
+            adder.join()
+            buyer.join()
+
+        order = results["order"]
+        self.assertEqual(order.item_count, 3)
+        self.assertEqual(
+            list(order.orderitem_set.values_list("service", "quantity")),
+            [(self.plumbing.id, 3)],
+        )
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+
+class CartAddTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", password="secret")
+        cls.service = Service.objects.create(
+            name="Plumbing repair", description="", price="5.00"
+        )
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.store = DatabaseCartStore()
+
+    def quantities(self):
+        return dict(
+            CartItem.objects.filter(cart__user=self.user).values_list(
+                "service_id", "quantity"
+            )
+        )
+
+    def add_between(self, pattern):
+        """Add the service, with a second add run after ``pattern``'s query."""
+        with after_first_query(
+            pattern, lambda: self.store.add(self.user.id, self.service.id)
+        ) as calls:
+            self.store.add(self.user.id, self.service.id)
+        self.assertTrue(calls)
+
+    def test_add_after_missed_increment_is_kept(self):
+        # The other add creates the cart and item after this one found no item
+        self.add_between(f"^UPDATE {table_pattern(CartItem)}")
+        self.assertEqual(self.quantities(), {self.service.id: 2})
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 1)
+
+    def test_add_after_cart_insert_is_kept(self):
+        # The other add finds the cart this one created and adds the item
+        # SQLite spells the conflict-ignoring insert INSERT OR IGNORE
+        self.add_between(f"^INSERT [^(]*{table_pattern(Cart)}")
+        self.assertEqual(self.quantities(), {self.service.id: 2})
+
+    def test_add_to_existing_item_is_one_update(self):
+        self.store.add(self.user.id, self.service.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.store.add(self.user.id, self.service.id)
+        self.assertEqual(
+            [
+                query["sql"].split()[0]
+                for query in queries
+                if "SAVEPOINT" not in query["sql"]
+            ],
+            ["UPDATE"],
+        )
+        self.assertEqual(self.quantities(), {self.service.id: 2})
+
+
+class CartItemsUpdateTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", password="secret")
+        cls.services = [
+            Service.objects.create(
+                name=f"Service {number}", description="", price="5.00"
+            )
+            for number in range(25)
+        ]
+        cls.a, cls.b, cls.c, cls.d = (service.id for service in cls.services[:4])
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.client.force_authenticate(self.user)
+
+    def patch(self, *operations):
+        return self.client.patch(
+            "/api/cart/items/", {"operations": list(operations)}, format="json"
+        )
+
+    def quantities(self):
+        return dict(
+            CartItem.objects.filter(cart__user=self.user).values_list(
+                "service_id", "quantity"
+            )
+        )
+
+    def fill(self, quantities):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        for service_id, quantity in quantities.items():
+            CartItem.objects.create(
+                cart=cart, service_id=service_id, quantity=quantity
+            )
+
+    def test_mixed_operations_apply_in_order(self):
+        self.fill({self.a: 2, self.b: 1, self.c: 4})
+
+        response = self.patch(
+            {"op": "set", "service_id": self.a, "quantity": 5},
+            {"op": "increment", "service_id": self.a},
+            {"op": "increment", "service_id": self.b, "quantity": 2},
+            {"op": "remove", "service_id": self.c},
+            # Added, then changed again in the same batch
+            {"service_id": self.d, "quantity": 1},
+            {"op": "increment", "service_id": self.d, "quantity": 3},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {self.a: 6, self.b: 3, self.d: 4})
+
+    def test_creates_cart(self):
+        self.assertEqual(
+            self.patch({"op": "increment", "service_id": self.a}).status_code, 200
+        )
+        self.assertEqual(self.quantities(), {self.a: 1})
+
+    def test_zero_quantity_removes_item(self):
+        self.fill({self.a: 2, self.b: 3})
+        response = self.patch(
+            {"op": "set", "service_id": self.a, "quantity": 0},
+            {"op": "increment", "service_id": self.b, "quantity": -5},
+            # Never in the cart: nothing to remove
+            {"op": "set", "service_id": self.c, "quantity": 0},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {})
+
+    def test_unknown_services_reject_the_batch(self):
+        self.fill({self.a: 2})
+        response = self.patch(
+            {"op": "remove", "service_id": self.a},
+            {"op": "increment", "service_id": 998},
+            {"op": "set", "service_id": 999, "quantity": 1},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["operations"], ["Unknown services: 998, 999."])
+        self.assertEqual(self.quantities(), {self.a: 2})
+
+    def test_invalid_operations_are_rejected(self):
+        for operations in [
+            [],
+            [{"op": "set", "service_id": self.a}],
+            [{"op": "set", "service_id": self.a, "quantity": -1}],
+            [{"op": "double", "service_id": self.a}],
+            [{"op": "increment", "service_id": self.a}] * 101,
+        ]:
+            with self.subTest(operations=operations[:2]):
+                self.assertEqual(self.patch(*operations).status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+    def cached_items(self):
+        return self.client.get("/api/cart/").data["results"][0]["items"]
+
+    def test_invalidates_cached_cart(self):
+        self.fill({self.a: 1, self.b: 1})
+        self.assertEqual(len(self.cached_items()), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patch(
+                {"op": "increment", "service_id": self.c},
+                {"op": "remove", "service_id": self.a},
+            )
+        self.assertEqual(
+            sorted(item["service"] for item in self.cached_items()),
+            [self.b, self.c],
+        )
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def operations(services):
+            return [
+                {"op": op, "service_id": service.id, "quantity": 1}
+                for service in services
+                for op in ("set", "increment", "remove")[: 2 + service.id % 2]
+            ]
+
+        self.fill({service.id: 1 for service in self.services})
+        for services in (self.services[:2], self.services[2:]):
+            with self.subTest(batch=len(services)):
+                # Validate the services, lock the cart, read its items,
+                # upsert the kept ones and delete the removed ones, inside
+                # a savepoint
+                with self.assertNumQueries(7):
+                    response = self.patch(*operations(services))
+                self.assertEqual(response.status_code, 200)
+        # Odd service ids are removed
+        self.assertEqual(
+            self.quantities(),
+            {service.id: 2 for service in self.services if service.id % 2 == 0},
+        )
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentCartAddTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="secret")
+        self.services = [
+            Service.objects.create(name=name, description="", price="5.00")
+            for name in ("Plumbing repair", "House cleaning")
+        ]
+        self.addCleanup(cache.clear)
+
+    def test_no_add_is_lost(self):
+        store = DatabaseCartStore()
+        threads, adds = 8, 10
+        # Half the threads add each service, so the first adds race to
+        # create both the cart and its items
+        services = queue.SimpleQueue()
+        for number in range(threads):
+            services.put(self.services[number % 2].id)
+
+        def add_all():
+            service_id = services.get()
+            for _ in range(adds):
+                store.add(self.user.id, service_id)
+
+        results = run_concurrently(add_all, threads)
+
+        self.assertEqual(results, [None] * threads)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(
+            dict(
+                CartItem.objects.filter(cart=cart).values_list(
+                    "service_id", "quantity"
+                )
+            ),
+            {service.id: threads // 2 * adds for service in self.services},
+        )
+
+
+class ValuesSerializerTests(TestCase):
+    """The values() serializers render the same bytes as the model ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user(
+            "client", email="client@example.com", password="secret"
+        )
+        cls.other_user = User.objects.create_user("other", password="secret")
+        cls.plumbing = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        cls.cleaning = Service.objects.create(
+            name="Ménage", description='Clean "all" rooms\n', price="3.05"
+        )
+        Service.objects.create(name="Gardening", description="Mow", price="0.00")
+
+        order = Order.objects.create(
+            user=cls.client_user, total_price="24.05", item_count=3
+        )
+        OrderItem.objects.create(
+            order=order, service=cls.plumbing, quantity=2, unit_price="10.50"
+        )
+        OrderItem.objects.create(
+            order=order, service=cls.cleaning, quantity=1, unit_price="3.05"
+        )
+        # Items placed before prices were recorded
+        legacy = Order.objects.create(user=cls.other_user, status="COMPLETED")
+        OrderItem.objects.create(
+            order=legacy, service=cls.cleaning, quantity=4, unit_price=None
+        )
+        Order.objects.create(user=cls.client_user, status="CANCELLED")
+
+        Review.objects.create(
+            user=cls.client_user, service=cls.plumbing, rating=5, text="Great"
+        )
+        Review.objects.create(
+            user=cls.other_user, service=cls.plumbing, rating=2, text="Late\n"
+        )
+        Review.objects.create(
+            user=cls.client_user, service=cls.cleaning, rating=4, text="Fine"
+        )
+
+    def assertRendersSame(self, values_serializer_class, queryset, **fieldset):
+        serializer_class = values_serializer_class.serializer_class
+        expected = JSONRenderer().render(
+            serializer_class(queryset.order_by("id"), many=True, **fieldset).data
+        )
+        values = values_serializer_class(**fieldset)
+        actual = JSONRenderer().render(
+            values.serialize(values.get_rows(queryset.order_by("id")))
+        )
+        self.assertEqual(actual, expected)
+
+    def test_services(self):
+        self.assertRendersSame(ServiceValuesSerializer, Service.objects.all())
+        self.assertRendersSame(
+            ServiceValuesSerializer,
+            Service.objects.all(),
+            fields=["id", "price", "rating_histogram"],
+        )
+
+    def test_orders(self):
+        orders = Order.objects.prefetch_related("orderitem_set__service")
+        self.assertRendersSame(OrderValuesSerializer, orders)
+        self.assertRendersSame(OrderValuesSerializer, orders, expand=["user"])
+        self.assertRendersSame(
+            OrderValuesSerializer, orders, fields=["id", "services", "total_price"]
+        )
+
+    def test_orders_without_items(self):
+        self.assertRendersSame(
+            OrderValuesSerializer, Order.objects.filter(orderitem__isnull=True)
+        )
+
+    def test_reviews(self):
+        reviews = Review.objects.select_related("user", "service")
+        self.assertRendersSame(ReviewValuesSerializer, reviews)
+        self.assertRendersSame(ReviewValuesSerializer, reviews, expand=["service"])
+        self.assertRendersSame(
+            ReviewValuesSerializer, reviews, fields=["id", "user_username", "text"]
+        )
+
+
+class ListQueryCountTests(APITestCase):
+    """Listing a page costs the same number of queries whatever its size."""
+
+    PAGE_SIZES = (1, 20, 100)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", password="secret")
+        cls.services = [
+            Service.objects.create(
+                name=f"Service {number}", description="", price=f"{number}.25"
+            )
+            for number in range(max(cls.PAGE_SIZES))
+        ]
+        for number in range(max(cls.PAGE_SIZES)):
+            order = Order.objects.create(user=cls.user)
+            OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order,
+                    service=cls.services[(number + offset) % len(cls.services)],
+                    quantity=offset + 1,
+                    unit_price=cls.services[0].price,
+                )
+                for offset in range(number % 4)
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # Responses are cached; every request here should reach the database
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get_page(self, url, page_size, queries):
+        with (
+            mock.patch.object(EstimatedCountPagination, "page_size", page_size),
+            mock.patch.object(NewestFirstCursorPagination, "page_size", page_size),
+            self.assertNumQueries(queries),
+        ):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_orders(self):
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                cache.clear()
+                # A COUNT(*), the page and its items
+                results = self.get_page("/api/orders/", page_size, queries=3)
+                self.assertEqual(len(results), page_size)
+
+    def test_orders_cursor(self):
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                cache.clear()
+                results = self.get_page(
+                    "/api/orders/?pagination=cursor", page_size, queries=2
+                )
+                self.assertEqual(len(results), page_size)
+
+    def test_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        for item_count in self.PAGE_SIZES:
+            with self.subTest(item_count=item_count):
+                CartItem.objects.filter(cart=cart).delete()
+                CartItem.objects.bulk_create(
+                    CartItem(cart=cart, service=service)
+                    for service in self.services[:item_count]
+                )
+                cache.clear()
+                # The cart, a COUNT(*) for its page and its items
+                results = self.get_page("/api/cart/", 20, queries=3)
+                self.assertEqual(len(results[0]["items"]), item_count)
+
+
+@override_settings(ESTIMATED_COUNT_THRESHOLD=10)
+class EstimatedCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            "admin",
+            password="secret",
+            role="admin",
+            is_active=True,
+            is_staff=True,
+            is_superuser=True,
+        )
+        cls.user = User.objects.create_user("buyer", password="secret")
+        Order.objects.bulk_create(Order(user=cls.user) for _ in range(45))
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def estimate(self, rows):
+        """Make the planner estimate ``rows`` rows in every table."""
+        return mock.patch("HomeSer.counts.table_row_estimate", return_value=rows)
+
+    def get_orders(self, user, page=1, status=200):
+        self.client.force_authenticate(user)
+        response = self.client.get("/api/orders/", {"page": page})
+        self.assertEqual(response.status_code, status)
+        return response.data
+
+    def test_overestimate(self):
+        with self.estimate(200000):
+            first = self.get_orders(self.admin)
+            last = self.get_orders(self.admin, page=3)
+            self.get_orders(self.admin, page=4, status=404)
+            self.get_orders(self.admin, page=10000, status=404)
+
+        self.assertEqual(first["count"], 200000)
+        self.assertTrue(first["count_is_estimated"])
+        self.assertIsNotNone(first["next"])
+        self.assertEqual(len(last["results"]), 5)
+        # The last page knows the real count
+        self.assertEqual(last["count"], 45)
+        self.assertFalse(last["count_is_estimated"])
+        self.assertIsNone(last["next"])
+
+    def test_overestimate_with_full_last_page(self):
+        with (
+            self.estimate(200000),
+            mock.patch.object(EstimatedCountPagination, "page_size", 15),
+        ):
+            last = self.get_orders(self.admin, page=3)
+
+        self.assertEqual(len(last["results"]), 15)
+        self.assertEqual(last["count"], 45)
+        self.assertIsNone(last["next"])
+
+    def test_underestimate(self):
+        with self.estimate(10):
+            first = self.get_orders(self.admin)
+            last = self.get_orders(self.admin, page=3)
+
+        self.assertTrue(first["count_is_estimated"])
+        self.assertGreater(first["count"], 20)
+        self.assertIsNotNone(first["next"])
+        self.assertEqual(len(last["results"]), 5)
+        self.assertEqual(last["count"], 45)
+        self.assertIsNone(last["next"])
+
+    def test_filtered_listing_is_counted(self):
+        with self.estimate(200000) as estimate:
+            data = self.get_orders(self.user)
+
+        estimate.assert_not_called()
+        self.assertEqual(data["count"], 45)
+        self.assertFalse(data["count_is_estimated"])
+
+    def test_admin_changelist(self):
+        self.client.force_login(self.admin)
+        with (
+            self.estimate(200000) as estimate,
+            mock.patch.object(OrderAdmin, "list_per_page", 20),
+        ):
+            response = self.client.get("/admin/HomeSer/order/")
+            self.assertContains(response, "Result counts on this page are estimates.")
+            estimate.reset_mock()
+            response = self.client.get(
+                "/admin/HomeSer/order/", {"status__exact": "PENDING_PAYMENT"}
+            )
+
+        estimate.assert_not_called()
+        self.assertNotContains(response, "Result counts on this page are estimates.")
+        self.assertContains(response, "45 orders")
+
+
+@skipUnless(fakeredis, "fakeredis is not installed")
+class RedisCartStoreTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", password="secret")
+        cls.plumbing = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        cls.cleaning = Service.objects.create(
+            name="House cleaning", description="Clean rooms", price="3.25"
+        )
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server)
+        self.store = RedisCartStore(self.redis)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def redis_cart(self, user=None):
+        """The items in the user's cart hash."""
+        fields = self.redis.hgetall(self.store._key((user or self.user).id))
+        return {
+            int(field): int(quantity)
+            for field, quantity in fields.items()
+            if field.isdigit()
+        }
+
+    def database_cart(self, user=None):
+        return dict(
+            CartItem.objects.filter(cart__user=user or self.user).values_list(
+                "service_id", "quantity"
+            )
+        )
+
+    def dirty_users(self):
+        return {int(user_id) for user_id in self.redis.smembers(self.store.dirty_key)}
+
+    def test_add_is_kept_in_redis(self):
+        self.store.add(self.user.id, self.plumbing.id)
+        self.store.add(self.user.id, self.cleaning.id)
+        # Seeded, and both services are known now
+        with self.assertNumQueries(0):
+            self.store.add(self.user.id, self.plumbing.id)
+            self.store.add(self.user.id, str(self.cleaning.id))
+
+        self.assertEqual(
+            self.redis_cart(), {self.plumbing.id: 2, self.cleaning.id: 2}
+        )
+        self.assertEqual(self.database_cart(), {})
+        self.assertEqual(self.dirty_users(), {self.user.id})
+
+    def test_unknown_service(self):
+        for service_id in (0, "abc", None):
+            with self.subTest(service_id=service_id):
+                with self.assertRaises(Http404):
+                    self.store.add(self.user.id, service_id)
+        self.assertEqual(self.redis_cart(), {})
+
+    def test_deleted_service_is_unknown(self):
+        self.assertEqual(known_service_id(self.cleaning.id), self.cleaning.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.filter(pk=self.cleaning.pk).delete()
+        with self.assertRaises(Http404):
+            known_service_id(self.cleaning.id)
+
+    def test_seeds_once_under_concurrent_add(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, service=self.plumbing, quantity=2)
+        # Another worker, with its own connection to the same server
+        other = RedisCartStore(fakeredis.FakeRedis(server=self.server))
+        pipeline = self.redis.pipeline
+        interleaved = []
+
+        def interleaving_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            multi = pipe.multi
+
+            def interleaved_multi():
+                # The other add runs, and seeds the hash, after this seed
+                # found it unseeded and before its transaction runs
+                if not interleaved:
+                    interleaved.append(True)
+                    other.add(self.user.id, self.cleaning.id)
+                return multi()
+
+            pipe.multi = interleaved_multi
+            return pipe
+
+        with mock.patch.object(self.redis, "pipeline", interleaving_pipeline):
+            self.store.add(self.user.id, self.plumbing.id)
+
+        self.assertEqual(interleaved, [True])
+        # The database copy was merged in exactly once
+        self.assertEqual(
+            self.redis_cart(), {self.plumbing.id: 3, self.cleaning.id: 1}
+        )
+
+    def test_flush_writes_dirty_carts_in_batches(self):
+        users = [self.user] + [
+            User.objects.create_user(f"buyer{number}", password="secret")
+            for number in range(2)
+        ]
+        for user in users:
+            self.store.add(user.id, self.plumbing.id)
+        self.store.add(users[0].id, self.cleaning.id)
+        tags = [user_tag(user.id, "cart") for user in users]
+        before = tag_versions(tags)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.store.flush(batch_size=2), 3)
+
+        self.assertEqual(
+            self.database_cart(users[0]), {self.plumbing.id: 1, self.cleaning.id: 1}
+        )
+        for user in users[1:]:
+            self.assertEqual(self.database_cart(user), {self.plumbing.id: 1})
+        self.assertEqual(self.dirty_users(), set())
+        after = tag_versions(tags)
+        self.assertTrue(all(after[tag] != before[tag] for tag in tags))
+        self.assertEqual(self.store.flush(), 0)
+
+    def test_failed_flush_keeps_carts_dirty(self):
+        self.store.add(self.user.id, self.plumbing.id)
+        with mock.patch(
+            "HomeSer.cart_store.write_carts", side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            self.store.flush()
+
+        self.assertEqual(self.dirty_users(), {self.user.id})
+        self.assertEqual(self.store.flush(), 1)
+        self.assertEqual(self.database_cart(), {self.plumbing.id: 1})
+
+    def test_reconcile_after_lost_key(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, service=self.plumbing, quantity=2)
+        self.store.add(self.user.id, self.cleaning.id)
+        # The hash expired before it was written back
+        self.redis.delete(self.store._key(self.user.id))
+
+        self.store.reconcile(self.user.id)
+
+        # The pending add is gone, but the database copy is intact
+        self.assertEqual(self.database_cart(), {self.plumbing.id: 2})
+        self.assertEqual(self.dirty_users(), set())
+
+        self.store.add(self.user.id, self.cleaning.id)
+        self.assertEqual(
+            self.redis_cart(), {self.plumbing.id: 2, self.cleaning.id: 1}
+        )
+        self.store.reconcile(self.user.id)
+        self.assertEqual(
+            self.database_cart(), {self.plumbing.id: 2, self.cleaning.id: 1}
+        )
+
+    @override_settings(CART_BACKEND="redis")
+    def test_checkout_invalidates_cart(self):
+        self.client.force_authenticate(self.user)
+        with mock.patch("django_redis.get_redis_connection", return_value=self.redis):
+            for _ in range(2):
+                self.client.post(
+                    "/api/cart/add_service/", {"service_id": self.plumbing.id}
+                )
+            self.assertEqual(self.database_cart(), {})
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/api/cart/checkout/")
+
+            self.assertEqual(response.status_code, 200)
+            order = Order.objects.get(pk=response.data["order_id"])
+            self.assertEqual(
+                dict(order.orderitem_set.values_list("service", "quantity")),
+                {self.plumbing.id: 2},
+            )
+            self.assertFalse(self.redis.exists(self.store._key(self.user.id)))
+            self.assertEqual(self.dirty_users(), set())
+
+            # The next add starts from the emptied database cart
+            self.client.post("/api/cart/add_service/", {"service_id": self.cleaning.id})
+            self.assertEqual(self.redis_cart(), {self.cleaning.id: 1})
+
+
+class RatingAggregateTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            "admin",
+            password="secret",
+            role="admin",
+            is_active=True,
+            is_staff=True,
+            is_superuser=True,
+        )
+        cls.user = User.objects.create_user("reviewer", password="secret")
+        cls.plumbing = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        cls.cleaning = Service.objects.create(
+            name="House cleaning", description="Clean rooms", price="3.25"
+        )
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def assertRatings(self, service, *ratings):
+        """Assert ``service``'s stored aggregates are those of ``ratings``."""
+        service = Service.objects.get(pk=service.pk)
+        self.assertEqual(service.rating_count, len(ratings))
+        self.assertEqual(service.rating_sum, sum(ratings))
+        self.assertEqual(
+            service.average_rating, sum(ratings) / len(ratings) if ratings else 0.0
+        )
+        self.assertEqual(
+            service.rating_histogram,
+            {value: ratings.count(value) for value in range(5, 0, -1)},
+        )
+
+    def review(self, rating, service=None, user=None):
+        return Review.objects.create(
+            user=user or self.user,
+            service=service or self.plumbing,
+            rating=rating,
+            text="Review",
+        )
+
+    def test_create(self):
+        self.review(5)
+        self.review(2, user=self.admin)
+        self.assertRatings(self.plumbing, 5, 2)
+
+    def test_update(self):
+        review = self.review(5)
+        self.review(4, user=self.admin)
+        review.rating = 1
+        review.save()
+        self.assertRatings(self.plumbing, 1, 4)
+
+    def test_move_to_another_service(self):
+        review = self.review(5)
+        review.service = self.cleaning
+        review.rating = 3
+        review.save()
+        self.assertRatings(self.plumbing)
+        self.assertRatings(self.cleaning, 3)
+
+    def test_delete(self):
+        review = self.review(5)
+        self.review(3, user=self.admin)
+        review.delete()
+        self.assertRatings(self.plumbing, 3)
+
+    def test_stale_service_save_keeps_ratings(self):
+        service = Service.objects.get(pk=self.plumbing.pk)
+        # Written after the service was loaded
+        self.review(5)
+        service.name = "Emergency plumbing"
+        service.save()
+
+        self.assertEqual(Service.objects.get(pk=service.pk).name, "Emergency plumbing")
+        self.assertRatings(self.plumbing, 5)
+
+    def test_update_fields_can_name_ratings(self):
+        self.review(5)
+        service = Service.objects.get(pk=self.plumbing.pk)
+        service.rating_count = 7
+        service.save(update_fields=["rating_count"])
+        self.assertEqual(Service.objects.get(pk=service.pk).rating_count, 7)
+
+    def test_api_edit_during_review_keeps_ratings(self):
+        update = ServiceSerializer.update
+
+        def update_after_review(serializer, instance, validated_data):
+            # A review lands between loading the service and saving it
+            self.review(4)
+            return update(serializer, instance, validated_data)
+
+        self.client.force_authenticate(self.admin)
+        with mock.patch.object(ServiceSerializer, "update", update_after_review):
+            response = self.client.patch(
+                f"/api/services/{self.plumbing.pk}/", {"price": "12.00"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Service.objects.get(pk=self.plumbing.pk).price, Decimal("12.00")
+        )
+        self.assertRatings(self.plumbing, 4)
+
+    def test_admin_edit_during_review_keeps_ratings(self):
+        save_model = ServiceAdmin.save_model
+
+        def save_after_review(modeladmin, request, obj, form, change):
+            self.review(2)
+            return save_model(modeladmin, request, obj, form, change)
+
+        self.client.force_login(self.admin)
+        with mock.patch.object(ServiceAdmin, "save_model", save_after_review):
+            response = self.client.post(
+                f"/admin/HomeSer/service/{self.plumbing.pk}/change/",
+                {"name": "Plumbing", "description": "Fix pipes", "price": "10.50"},
+            )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Service.objects.get(pk=self.plumbing.pk).name, "Plumbing")
+        self.assertRatings(self.plumbing, 2)
+
+
+class SuggestTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            "admin",
+            password="secret",
+            role="admin",
+            is_active=True,
+            is_staff=True,
+            is_superuser=True,
+        )
+        for name in [
+            "Plumbing repair",
+            "Emergency plumbing",
+            "Pipe replacement",
+            "Plumbing",
+            "House cleaning",
+        ]:
+            Service.objects.create(name=name, description="Service", price="10.00")
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        # A fresh index, so that none built by another test leaks in
+        self.index = SuggestionIndex()
+        for target in ["HomeSer.views", "HomeSer.signals"]:
+            patcher = mock.patch(f"{target}.suggestion_index", self.index)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def suggest(self, text, limit=10):
+        response = self.client.get(
+            "/api/services/suggest/", {"q": text, "limit": limit}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [result["name"] for result in response.data["results"]]
+
+    def test_prefix_ranking(self):
+        # Names starting with the query first, shortest first, then names
+        # with a later word starting with it
+        self.assertEqual(
+            self.suggest("plu"),
+            ["Plumbing", "Plumbing repair", "Emergency plumbing"],
+        )
+        # Every query word must match for a prefix match; names matching
+        # some of them follow as fuzzy matches
+        self.assertEqual(
+            self.suggest("plumbing re"),
+            ["Plumbing repair", "Plumbing", "Emergency plumbing"],
+        )
+        self.assertEqual(self.suggest("re plu", limit=1), ["Plumbing repair"])
+
+    def test_prefix_is_accent_and_case_insensitive(self):
+        self.assertEqual(self.suggest("HOUSE"), ["House cleaning"])
+        self.assertEqual(self.suggest("Hôuse c"), ["House cleaning"])
+
+    def test_typo_matches_a_word_of_longer_names(self):
+        self.assertEqual(
+            self.suggest("plumbnig"),
+            ["Plumbing", "Plumbing repair", "Emergency plumbing"],
+        )
+        self.assertEqual(self.suggest("replacment"), ["Pipe replacement"])
+
+    def test_prefix_matches_rank_above_typos(self):
+        Service.objects.create(name="Plumber", description="Service", price="1.00")
+        self.assertEqual(self.suggest("plumbe", limit=2), ["Plumber", "Plumbing"])
+
+    def test_unrelated_text_matches_nothing(self):
+        self.assertEqual(self.suggest("gardening"), [])
+        self.assertEqual(self.suggest("  ?! "), [])
+
+    def test_limit(self):
+        self.assertEqual(self.suggest("plu", limit=1), ["Plumbing"])
+
+    def test_rename_updates_index(self):
+        self.assertEqual(self.suggest("pipe"), ["Pipe replacement"])
+        service = Service.objects.get(name="Pipe replacement")
+
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/services/{service.pk}/", {"name": "Drain unblocking"}
+            )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.suggest("pipe"), [])
+        self.assertEqual(self.suggest("drain"), ["Drain unblocking"])
+        self.assertEqual(self.suggest("unblokcing"), ["Drain unblocking"])
+
+    def test_save_keeping_name_leaves_index_alone(self):
+        self.suggest("plu")
+        service = Service.objects.get(name="Plumbing")
+        service.price = "12.00"
+        with mock.patch.object(self.index, "add") as add:
+            with self.captureOnCommitCallbacks(execute=True):
+                service.save()
+        add.assert_not_called()
+
+    def test_delete_updates_index(self):
+        self.assertIn("Plumbing repair", self.suggest("plumbnig"))
+        service = Service.objects.get(name="Plumbing repair")
+
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/services/{service.pk}/")
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.suggest("plu"), ["Plumbing", "Emergency plumbing"])
+        self.assertEqual(self.suggest("plumbnig"), ["Plumbing", "Emergency plumbing"])
+
+
+class IdempotencyTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", password="secret")
+        cls.other = User.objects.create_user("other", password="secret")
+        cls.service = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.client.force_authenticate(self.user)
+        for user in (self.user, self.other):
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, service=self.service, quantity=2)
+
+    def checkout(self, key="key-1", data=None):
+        return self.client.post(
+            "/api/cart/checkout/",
+            data,
+            format="json",
+            headers={IDEMPOTENCY_KEY_HEADER: key},
+        )
+
+    def test_replay_returns_stored_response(self):
+        first = self.checkout()
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", first)
+        # Something to check out again, were the request to run
+        CartItem.objects.create(
+            cart=Cart.objects.get(user=self.user), service=self.service, quantity=1
+        )
+
+        with mock.patch("HomeSer.views.place_order") as place:
+            replay = self.checkout()
+
+        place.assert_not_called()
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_error_responses_are_replayed(self):
+        self.checkout("key-1")
+        empty = self.checkout("key-2")
+        self.assertEqual(empty.status_code, 400)
+        CartItem.objects.create(
+            cart=Cart.objects.get(user=self.user), service=self.service, quantity=1
+        )
+        replay = self.checkout("key-2")
+        self.assertEqual(replay.status_code, 400)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+
+    def test_new_key_runs_again(self):
+        self.checkout("key-1")
+        CartItem.objects.create(
+            cart=Cart.objects.get(user=self.user), service=self.service, quantity=1
+        )
+        self.assertEqual(self.checkout("key-2").status_code, 200)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 2)
+
+    def test_keys_are_scoped_per_user(self):
+        self.checkout()
+        self.client.force_authenticate(self.other)
+        response = self.checkout()
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Order.objects.filter(user=self.other).count(), 1)
+
+    def test_same_key_with_different_body_is_rejected(self):
+        first = self.checkout(data={"note": "ring twice"})
+        self.assertEqual(first.status_code, 200)
+
+        with mock.patch("HomeSer.views.place_order") as place:
+            response = self.checkout(data={"note": "leave at the door"})
+            replay = self.checkout(data={"note": "ring twice"})
+
+        place.assert_not_called()
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.data, first.data)
+
+    def test_request_during_first_gets_conflict(self):
+        place_order_ = place_order
+        responses = []
+
+        def place_order_with_retry(user):
+            # The client retries while the first request is still running
+            responses.append(self.checkout())
+            return place_order_(user)
+
+        with mock.patch(
+            "HomeSer.views.place_order", side_effect=place_order_with_retry
+        ) as place, mock.patch("HomeSer.cache_utils.REBUILD_WAIT", 0.1):
+            first = self.checkout()
+
+        self.assertEqual(place.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(responses[0].status_code, 409)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        # The first request's response is kept
+        self.assertEqual(self.checkout().data, first.data)
+
+    def test_server_error_releases_key(self):
+        with mock.patch(
+            "HomeSer.views.place_order", side_effect=DatabaseError("gone")
+        ):
+            with self.assertRaises(DatabaseError):
+                self.checkout()
+        response = self.checkout()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+    def test_key_expires(self):
+        now = time.time()
+        with override_settings(IDEMPOTENCY_KEY_TTL=60):
+            first = self.checkout()
+        CartItem.objects.create(
+            cart=Cart.objects.get(user=self.user), service=self.service, quantity=1
+        )
+
+        with mock.patch("time.time", return_value=now + 59):
+            self.assertEqual(self.checkout()["Idempotent-Replayed"], "true")
+        with mock.patch("time.time", return_value=now + 61):
+            response = self.checkout()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertNotEqual(response.data["order_id"], first.data["order_id"])
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 2)
+
+    def test_overlong_key_is_rejected(self):
+        response = self.checkout("k" * 256)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="secret")
+        self.service = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, service=self.service, quantity=2)
+        self.addCleanup(cache.clear)
+
+    def test_simultaneous_requests_check_out_once(self):
+        def checkout():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            return client.post(
+                "/api/cart/checkout/", headers={IDEMPOTENCY_KEY_HEADER: "key-1"}
+            )
+
+        responses = run_concurrently(checkout, 4)
+
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+        self.assertEqual(
+            sorted(response.get("Idempotent-Replayed", "") for response in responses),
+            ["", "true", "true", "true"],
+        )
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(
+            {response.data["order_id"] for response in responses}, {order.pk}
+        )
+
+
+@override_settings(ROOT_URLCONF="HomeSer.web_urls")
+class GuestCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            "buyer", password="secret", is_active=True
+        )
+        cls.services = [
+            Service.objects.create(
+                name=f"Service {number}", description="", price="5.00"
+            )
+            for number in range(GUEST_CART_MAX_ITEMS + 1)
+        ]
+        cls.a, cls.b, cls.c = (service.id for service in cls.services[:3])
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def set_guest_cart(self, items):
+        response = write_guest_cart(HttpResponse(), items)
+        self.client.cookies[GUEST_CART_COOKIE] = response.cookies[
+            GUEST_CART_COOKIE
+        ].value
+
+    def guest_cart(self):
+        request = RequestFactory().get("/")
+        request.COOKIES[GUEST_CART_COOKIE] = self.client.cookies[
+            GUEST_CART_COOKIE
+        ].value
+        return read_guest_cart(request)
+
+    def add(self, service_id):
+        return self.client.post("/cart/add/", {"service_id": service_id})
+
+    def quantities(self):
+        return dict(
+            CartItem.objects.filter(cart__user=self.user).values_list(
+                "service_id", "quantity"
+            )
+        )
+
+    def test_adds_are_kept_in_the_cookie(self):
+        for service_id in (self.a, self.b, self.a):
+            response = self.add(service_id)
+            self.assertRedirects(
+                response, f"/services/{service_id}/", fetch_redirect_response=False
+            )
+        self.assertEqual(self.guest_cart(), {self.a: 2, self.b: 1})
+        self.assertFalse(Cart.objects.exists())
+
+    def test_remove(self):
+        self.set_guest_cart({self.a: 2, self.b: 1})
+        self.client.post("/cart/remove/", {"service_id": self.a})
+        self.assertEqual(self.guest_cart(), {self.b: 1})
+        # Removing the last item drops the cookie
+        self.client.post("/cart/remove/", {"service_id": self.b})
+        self.assertEqual(self.client.cookies[GUEST_CART_COOKIE].value, "")
+
+    def test_tampered_cookie_reads_as_empty(self):
+        self.set_guest_cart({self.a: 1})
+        value = self.client.cookies[GUEST_CART_COOKIE].value
+        self.client.cookies[GUEST_CART_COOKIE] = value.replace(
+            f"{self.a}:1", f"{self.a}:99"
+        )
+        self.assertEqual(self.guest_cart(), {})
+
+        # Adding starts a fresh cart rather than trusting the cookie
+        self.add(self.b)
+        self.assertEqual(self.guest_cart(), {self.b: 1})
+
+    def test_malformed_cookie_reads_as_empty(self):
+        response = HttpResponse()
+        response.set_signed_cookie(
+            GUEST_CART_COOKIE, f"{self.a}:1|oops", salt="HomeSer.guest_cart"
+        )
+        self.client.cookies[GUEST_CART_COOKIE] = response.cookies[
+            GUEST_CART_COOKIE
+        ].value
+        self.assertEqual(self.guest_cart(), {})
+
+    def test_browsing_writes_nothing(self):
+        with mock.patch(
+            "HomeSer.views.render", return_value=HttpResponse("page")
+        ), CaptureQueriesContext(connection) as queries:
+            for service_id in (self.a, self.b, self.a):
+                self.add(service_id)
+                self.client.get("/cart/")
+            self.client.post("/cart/remove/", {"service_id": self.b})
+
+        writes = [
+            query["sql"]
+            for query in queries
+            if re.match(r"(INSERT|UPDATE|DELETE)\b", query["sql"])
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(self.guest_cart(), {self.a: 2})
+
+    def test_unknown_service_is_rejected(self):
+        self.set_guest_cart({self.a: 1})
+        self.assertEqual(self.add(9999).status_code, 404)
+        self.assertEqual(self.guest_cart(), {self.a: 1})
+
+    def test_size_limit(self):
+        full = {service.id: 1 for service in self.services[:GUEST_CART_MAX_ITEMS]}
+        self.set_guest_cart(full)
+
+        self.add(self.services[-1].id)
+        self.assertEqual(self.guest_cart(), full)
+
+        # More units of a service already in the cart still fit
+        self.add(self.a)
+        self.assertEqual(self.guest_cart(), {**full, self.a: 2})
+        self.assertLess(len(self.client.cookies[GUEST_CART_COOKIE].value), 4096)
+
+    def assertMerged(self, response):
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, "/")
+        self.assertEqual(self.client.cookies[GUEST_CART_COOKIE].value, "")
+        # Added to what the cart held; the deleted service is dropped
+        self.assertEqual(self.quantities(), {self.a: 3, self.b: 1, self.c: 4})
+
+    def prepare_merge(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, service_id=self.a, quantity=2)
+        CartItem.objects.create(cart=cart, service_id=self.c, quantity=4)
+        deleted = Service.objects.create(name="Gone", description="", price="1.00")
+        self.set_guest_cart({self.a: 1, self.b: 1, deleted.pk: 1})
+        deleted.delete()
+
+    def test_login_merges_into_existing_cart(self):
+        self.prepare_merge()
+        response = self.client.post(
+            "/accounts/login/", {"username": "buyer", "password": "secret"}
+        )
+        self.assertMerged(response)
+
+    def test_activation_merges_into_existing_cart(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        user = User.objects.get(pk=self.user.pk)
+        self.prepare_merge()
+        response = self.client.get(
+            f"/activate/{urlsafe_base64_encode(force_bytes(user.pk))}/"
+            f"{account_activation_token.make_token(user)}/"
+        )
+        self.assertMerged(response)
+
+    def test_login_without_guest_cart_writes_nothing(self):
+        self.client.post(
+            "/accounts/login/", {"username": "buyer", "password": "secret"}
+        )
+        self.assertNotIn(GUEST_CART_COOKIE, self.client.cookies)
+        self.assertFalse(Cart.objects.exists())
+
+
+class OrderTransitionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            "admin",
+            password="secret",
+            role="admin",
+            is_active=True,
+            is_staff=True,
+            is_superuser=True,
+        )
+        cls.owners = [
+            User.objects.create_user(f"owner{number}", email=f"owner{number}@x.test")
+            for number in range(3)
+        ]
+        cls.no_email = User.objects.create_user("quiet")
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def orders(self, *statuses, user=None):
+        return [
+            Order.objects.create(user=user or self.owners[0], status=status)
+            for status in statuses
+        ]
+
+    def statuses(self, orders):
+        return [Order.objects.get(pk=order.pk).status for order in orders]
+
+    def test_only_allowed_sources_move(self):
+        orders = self.orders("PENDING_PAYMENT", "PROCESSING", "COMPLETED", "CANCELLED")
+        with self.captureOnCommitCallbacks(execute=True):
+            changed = transition_orders(Order.objects.all(), "CANCELLED")
+        self.assertEqual(changed, 2)
+        self.assertEqual(
+            self.statuses(orders),
+            ["CANCELLED", "CANCELLED", "COMPLETED", "CANCELLED"],
+        )
+
+        orders = self.orders("PENDING_PAYMENT", "PROCESSING", "COMPLETED")
+        with self.captureOnCommitCallbacks(execute=True):
+            changed = transition_orders(
+                Order.objects.filter(pk__in=[o.pk for o in orders]), "COMPLETED"
+            )
+        self.assertEqual(changed, 1)
+        self.assertEqual(
+            self.statuses(orders), ["PENDING_PAYMENT", "COMPLETED", "COMPLETED"]
+        )
+
+    def test_unknown_status(self):
+        with self.assertRaises(ValueError):
+            transition_orders(Order.objects.all(), "SHIPPED")
+
+    def test_invalidates_cached_listings_after_commit(self):
+        owner, other = self.owners[:2]
+        (order,) = self.orders("PENDING_PAYMENT", user=owner)
+        tags = ["orders", user_tag(owner.id, "orders"), user_tag(other.id, "orders")]
+        before = tag_versions(tags)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            transition_orders(Order.objects.filter(pk=order.pk), "PROCESSING")
+        self.assertEqual(tag_versions(tags), before)
+        for callback in callbacks:
+            callback()
+
+        after = tag_versions(tags)
+        for tag in tags[:2]:
+            self.assertNotEqual(after[tag], before[tag])
+        # Other users' listings are untouched
+        self.assertEqual(after[tags[2]], before[tags[2]])
+
+    def test_cached_api_listing_shows_new_status(self):
+        (order,) = self.orders("PENDING_PAYMENT")
+        self.client.force_authenticate(self.owners[0])
+        self.assertEqual(
+            self.client.get("/api/orders/").data["results"][0]["status"],
+            "PENDING_PAYMENT",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders(Order.objects.filter(pk=order.pk), "PROCESSING")
+        self.assertEqual(
+            self.client.get("/api/orders/").data["results"][0]["status"],
+            "PROCESSING",
+        )
+
+    @override_settings(ORDER_STATUS_BATCH_SIZE=2)
+    def test_emails_are_batched_after_commit(self):
+        orders = [
+            *self.orders("PENDING_PAYMENT", "PENDING_PAYMENT", user=self.owners[0]),
+            *self.orders("PROCESSING", user=self.owners[1]),
+            *self.orders("PENDING_PAYMENT", user=self.no_email),
+            *self.orders("PENDING_PAYMENT", user=self.owners[2]),
+        ]
+        skipped = self.orders("COMPLETED")
+
+        with mock.patch(
+            "HomeSer.orders.send_order_status_emails",
+            wraps=send_order_status_emails,
+        ) as send:
+            with self.captureOnCommitCallbacks() as callbacks:
+                transition_orders(Order.objects.all(), "CANCELLED")
+            # Nothing is sent before the change commits
+            send.assert_not_called()
+            self.assertEqual(mail.outbox, [])
+            for callback in callbacks:
+                callback()
+
+        pks = [order.pk for order in orders]
+        # The order that could not move is not emailed about
+        self.assertEqual(
+            [call.args[0] for call in send.call_args_list],
+            [pks[0:2], pks[2:4], pks[4:5]],
+        )
+        self.assertEqual(Order.objects.get(pk=skipped[0].pk).status, "COMPLETED")
+        # One message per order with an owner email
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["owner0@x.test", "owner0@x.test", "owner1@x.test", "owner2@x.test"],
+        )
+        self.assertIn("cancelled", mail.outbox[0].subject)
+
+    def test_rolled_back_transition_sends_nothing(self):
+        self.orders("PENDING_PAYMENT")
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                transition_orders(Order.objects.all(), "PROCESSING")
+                transaction.set_rollback(True)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Order.objects.get().status, "PENDING_PAYMENT")
+
+    def test_api_counts_updated_and_skipped(self):
+        orders = self.orders("PENDING_PAYMENT", "COMPLETED", "PROCESSING")
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/orders/transition/",
+                {"ids": [order.pk for order in orders] + [999], "status": "CANCELLED"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(response.data["skipped"], 2)
+        self.assertEqual(
+            self.statuses(orders), ["CANCELLED", "COMPLETED", "CANCELLED"]
+        )
+
+    def test_api_rejects_unreachable_status(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            "/api/orders/transition/",
+            {"ids": [1], "status": "PENDING_PAYMENT"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_role_decides_access(self):
+        (order,) = self.orders("PENDING_PAYMENT")
+        promoted = User.objects.create_user("promoted", role="admin")
+        staff = User.objects.create_user("staff", is_staff=True)
+        for user, allowed in [
+            (promoted, True),
+            (staff, False),
+            (self.owners[0], False),
+        ]:
+            self.client.force_authenticate(user)
+            with self.subTest(user=user.username):
+                response = self.client.post(
+                    "/api/orders/transition/",
+                    {"ids": [order.pk], "status": "CANCELLED"},
+                    format="json",
+                )
+                self.assertEqual(response.status_code, 200 if allowed else 403)
+                response = self.client.get("/api/orders/export/")
+                self.assertEqual(response.status_code, 200 if allowed else 403)
+
+        self.client.force_authenticate(None)
+        response = self.client.get("/api/orders/export/")
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_admin_action(self):
+        orders = self.orders("PENDING_PAYMENT", "COMPLETED")
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/admin/HomeSer/order/",
+                {
+                    "action": "mark_processing",
+                    "_selected_action": [order.pk for order in orders],
+                },
+                follow=True,
+            )
+        self.assertEqual(self.statuses(orders), ["PROCESSING", "COMPLETED"])
+        self.assertEqual(
+            [str(message) for message in response.context["messages"]],
+            [
+                "1 order(s) marked as processing.",
+                "1 order(s) could not move to processing and were left unchanged.",
+            ],
+        )
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class TagInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", password="secret")
+        cls.other = User.objects.create_user("other", password="secret")
+        cls.service = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        cls.other_service = Service.objects.create(
+            name="House cleaning", description="Clean rooms", price="3.25"
+        )
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def invalidated(self, write):
+        """Return the tags invalidated once ``write()`` commits."""
+        with mock.patch("HomeSer.signals.invalidate_tags") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+        return {tag for call in invalidate.call_args_list for tag in call.args}
+
+    def test_service(self):
+        tags = self.invalidated(
+            lambda: Service.objects.create(name="New", description="", price="1.00")
+        )
+        created = Service.objects.get(name="New")
+        service_tags = {CATALOG_TAG, service_tag(created.pk)}
+        self.assertEqual(tags, service_tags)
+
+        created.price = "2.00"
+        self.assertEqual(self.invalidated(created.save), service_tags)
+        self.assertEqual(self.invalidated(created.delete), service_tags)
+
+    def test_cart_and_items(self):
+        cart_tag = user_tag(self.user.pk, "cart")
+        self.assertEqual(
+            self.invalidated(lambda: Cart.objects.create(user=self.user)), {cart_tag}
+        )
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(
+            self.invalidated(
+                lambda: CartItem.objects.create(cart=cart, service=self.service)
+            ),
+            {cart_tag},
+        )
+        # Loaded without its cart, as the signal's owner lookup must handle
+        item = CartItem.objects.get()
+        item.quantity = 3
+        self.assertEqual(self.invalidated(item.save), {cart_tag})
+        self.assertEqual(self.invalidated(item.delete), {cart_tag})
+
+    def test_order_and_items(self):
+        orders_tags = {"orders", user_tag(self.user.pk, "orders")}
+        self.assertEqual(
+            self.invalidated(lambda: Order.objects.create(user=self.user)),
+            orders_tags,
+        )
+        order = Order.objects.get()
+        self.assertEqual(
+            self.invalidated(
+                lambda: OrderItem.objects.create(order=order, service=self.service)
+            ),
+            orders_tags,
+        )
+        item = OrderItem.objects.get()
+        self.assertEqual(self.invalidated(item.delete), orders_tags)
+        # Deleting the order also deletes its items
+        OrderItem.objects.create(order=order, service=self.service)
+        self.assertEqual(self.invalidated(order.delete), orders_tags)
+
+    def test_review(self):
+        review_tags = {
+            "reviews",
+            RATINGS_TAG,
+            service_tag(self.service.pk),
+            user_tag(self.user.pk, "reviews"),
+        }
+        self.assertEqual(
+            self.invalidated(
+                lambda: Review.objects.create(
+                    user=self.user, service=self.service, rating=4, text="Good"
+                )
+            ),
+            review_tags,
+        )
+        review = Review.objects.get()
+        review.text = "Still good"
+        # The rating is unchanged, so the rating totals stay cached
+        self.assertEqual(self.invalidated(review.save), review_tags - {RATINGS_TAG})
+
+        review.service = self.other_service
+        self.assertEqual(
+            self.invalidated(review.save),
+            review_tags | {service_tag(self.other_service.pk)},
+        )
+        self.assertEqual(
+            self.invalidated(review.delete),
+            review_tags - {service_tag(self.service.pk)}
+            | {service_tag(self.other_service.pk)},
+        )
+
+    def test_user_and_profile(self):
+        self.user.first_name = "Ann"
+        self.assertEqual(
+            self.invalidated(self.user.save),
+            {"users", user_tag(self.user.pk, "account")},
+        )
+        self.assertEqual(
+            self.invalidated(lambda: ClientProfile.objects.create(user=self.user)),
+            {"profiles", user_tag(self.user.pk, "profile")},
+        )
+
+    def test_nothing_is_invalidated_before_commit(self):
+        with mock.patch("HomeSer.signals.invalidate_tags") as invalidate:
+            with self.captureOnCommitCallbacks() as callbacks:
+                Order.objects.create(user=self.user)
+            invalidate.assert_not_called()
+        self.assertTrue(callbacks)
+
+    def test_invalidation_drops_only_entries_with_the_tag(self):
+        compute = mock.Mock(side_effect=["cart", "orders", "cart again"])
+        cart_tags = [user_tag(self.user.pk, "cart"), CATALOG_TAG]
+        orders_tags = [user_tag(self.user.pk, "orders"), CATALOG_TAG]
+
+        self.assertEqual(cache_get_or_set("cart", cart_tags, compute, 60), "cart")
+        self.assertEqual(cache_get_or_set("orders", orders_tags, compute, 60), "orders")
+        invalidate_tags(user_tag(self.user.pk, "cart"), user_tag(self.other.pk, "cart"))
+
+        self.assertEqual(cache_get_or_set("orders", orders_tags, compute, 60), "orders")
+        self.assertEqual(
+            cache_get_or_set("cart", cart_tags, compute, 60), "cart again"
+        )
+        self.assertEqual(compute.call_count, 3)
+
+    def test_api_and_web_caches_share_invalidation(self):
+        # Checkout used to delete a key the web orders page never read
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, service=self.service)
+        compute = mock.Mock(side_effect=[[], ["order"]])
+        tags = [user_tag(self.user.pk, "orders"), CATALOG_TAG]
+        self.assertEqual(cache_get_or_set("web_orders", tags, compute, 60), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user)
+        self.assertEqual(cache_get_or_set("web_orders", tags, compute, 60), ["order"])
+
+
+class ResponseCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            "admin",
+            password="secret",
+            role="admin",
+            is_active=True,
+            is_staff=True,
+            is_superuser=True,
+        )
+        cls.alice = User.objects.create_user("alice", password="secret")
+        cls.bob = User.objects.create_user("bob", password="secret")
+        cls.service = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        for user in (cls.alice, cls.bob):
+            order = Order.objects.create(user=user)
+            OrderItem.objects.create(order=order, service=cls.service)
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        # The catalog is also kept in this process, past cache.clear()
+        catalog_cache.clear_local()
+        self.addCleanup(catalog_cache.clear_local)
+
+    def get(self, url, user, **params):
+        self.client.force_authenticate(user)
+        return self.client.get(url, params)
+
+    def order_owners(self, response):
+        return {order["user"] for order in response.json()["results"]}
+
+    def test_hit_serves_stored_bytes_without_queries(self):
+        miss = self.get("/api/orders/", self.alice)
+        self.assertEqual(miss["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            hit = self.get("/api/orders/", self.alice)
+
+        self.assertEqual(hit["X-Cache"], "HIT")
+        self.assertEqual(hit.content, miss.content)
+        self.assertEqual(hit["Content-Type"], miss["Content-Type"])
+        self.assertGreater(int(hit["X-Cache-Saved-Queries"]), 0)
+        self.assertGreaterEqual(float(hit["X-Cache-Saved-CPU-ms"]), 0)
+
+    def test_user_scopes_do_not_leak(self):
+        self.assertEqual(
+            self.order_owners(self.get("/api/orders/", self.alice)), {self.alice.pk}
+        )
+
+        response = self.get("/api/orders/", self.bob)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(self.order_owners(response), {self.bob.pk})
+
+        response = self.get("/api/orders/", self.admin)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(self.order_owners(response), {self.alice.pk, self.bob.pk})
+
+        # Each keeps getting their own entry
+        response = self.get("/api/orders/", self.alice)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(self.order_owners(response), {self.alice.pk})
+
+    def test_anonymous_scope(self):
+        self.get("/api/orders/", self.alice)
+        self.client.force_authenticate(None)
+        response = self.client.get("/api/orders/")
+        self.assertIn(response.status_code, (401, 403))
+        self.assertNotIn("X-Cache", response)
+
+    def test_catalog_is_shared_across_users(self):
+        self.assertEqual(self.get("/api/services/", self.alice)["X-Cache"], "MISS")
+        self.assertEqual(self.get("/api/services/", self.bob)["X-Cache"], "HIT")
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get("/api/services/")["X-Cache"], "HIT")
+
+    def test_query_parameters_are_part_of_the_key(self):
+        self.get("/api/services/", self.alice, ordering="price")
+        self.assertEqual(
+            self.get("/api/services/", self.alice, ordering="-price")["X-Cache"],
+            "MISS",
+        )
+        # Parameter order does not matter
+        self.get("/api/services/", self.alice, ordering="price", page=1)
+        self.client.force_authenticate(self.alice)
+        response = self.client.get("/api/services/?page=1&ordering=price")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_write_invalidates_entry(self):
+        self.get("/api/orders/", self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(user=self.alice)
+        response = self.get("/api/orders/", self.alice)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.json()["results"]), 2)
+        # Bob's entry did not depend on Alice's orders
+        self.get("/api/orders/", self.bob)
+        self.assertEqual(self.get("/api/orders/", self.bob)["X-Cache"], "HIT")
+
+    def test_errors_are_not_cached(self):
+        for _ in range(2):
+            response = self.get("/api/services/999/", self.alice)
+            self.assertEqual(response.status_code, 404)
+            self.assertNotEqual(response.get("X-Cache"), "HIT")
+
+    def test_browsable_api_is_not_cached(self):
+        self.get("/api/services/", self.alice)
+        response = self.get("/api/services/", self.alice, format="api")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Cache", response)
+
+    @override_settings(RESPONSE_CACHE_BUDGET_BYTES=100)
+    def test_responses_over_the_budget_are_not_stored(self):
+        for _ in range(2):
+            response = self.get("/api/orders/", self.alice)
+            self.assertGreater(len(response.content), 50)
+            self.assertEqual(response["X-Cache"], "MISS")
+
+
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="secret")
+        cls.bob = User.objects.create_user("bob", password="secret")
+        cls.service = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+        cls.order = Order.objects.create(user=cls.alice)
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        catalog_cache.clear_local()
+        self.addCleanup(catalog_cache.clear_local)
+        self.client.force_authenticate(self.alice)
+
+    def assertNotModified(self, url, **headers):
+        with self.assertNumQueries(0):
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        return response
+
+    def assertNotModifiedUntil(self, url, write):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        for _ in range(2):
+            self.assertEqual(
+                self.assertNotModified(url, if_none_match=etag)["ETag"], etag
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertNotModified(url, if_none_match=response["ETag"])
+
+    def test_service_list(self):
+        self.assertNotModifiedUntil(
+            "/api/services/",
+            lambda: Service.objects.create(name="New", description="", price="1.00"),
+        )
+
+    def test_service_detail(self):
+        def reprice():
+            self.service.price = "11.00"
+            self.service.save()
+
+        self.assertNotModifiedUntil(f"/api/services/{self.service.pk}/", reprice)
+
+    def test_order_list(self):
+        self.assertNotModifiedUntil(
+            "/api/orders/", lambda: Order.objects.create(user=self.alice)
+        )
+
+    def test_review_list(self):
+        self.assertNotModifiedUntil(
+            "/api/reviews/",
+            lambda: Review.objects.create(
+                user=self.alice, service=self.service, rating=5, text="Great"
+            ),
+        )
+
+    def test_other_users_writes_keep_validators(self):
+        etag = self.client.get("/api/orders/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(user=self.bob)
+        self.assertNotModified("/api/orders/", if_none_match=etag)
+
+    def test_etags_are_per_user(self):
+        etag = self.client.get("/api/orders/")["ETag"]
+        self.client.force_authenticate(self.bob)
+        response = self.client.get("/api/orders/", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get("/api/services/")["Last-Modified"]
+        self.assertNotModified("/api/services/", if_modified_since=last_modified)
+
+    @override_settings(ROOT_URLCONF="HomeSer.tests")
+    def test_web_service_detail(self):
+        url = f"/services/{self.service.pk}/"
+        with mock.patch(
+            "HomeSer.views.render", return_value=HttpResponse("page")
+        ) as render:
+            response = self.client.get(url)
+            etag = response["ETag"]
+            self.assertNotModified(url, if_none_match=etag)
+            render.assert_called_once()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Review.objects.create(
+                    user=self.alice, service=self.service, rating=5, text="Great"
+                )
+            response = self.client.get(url, headers={"if-none-match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(render.call_count, 2)
+
+
+class RebuildLockTests(SimpleTestCase):
+    key = "rebuild-test"
+    tags = ["rebuild-test-tag"]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.calls = 0
+
+    def slow_compute(self):
+        self.calls += 1
+        # Long enough for every other thread to miss and start waiting
+        time.sleep(0.3)
+        return f"value {self.calls}"
+
+    def test_one_caller_rebuilds_a_missing_entry(self):
+        results = run_concurrently(
+            lambda: cache_get_or_set(self.key, self.tags, self.slow_compute, 60),
+            threads=8,
+        )
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ["value 1"] * 8)
+
+    def test_one_caller_rebuilds_a_missing_catalog_entry(self):
+        catalog = CatalogCache()
+
+        results = run_concurrently(
+            lambda: catalog.get_or_set(self.key, self.slow_compute), threads=8
+        )
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ["value 1"] * 8)
+
+    def test_failed_rebuild_releases_the_lock(self):
+        def fail():
+            raise RuntimeError("database is down")
+
+        with self.assertRaises(RuntimeError):
+            cache_get_or_set(self.key, self.tags, fail, 60)
+
+        # The next caller rebuilds at once instead of waiting for a value
+        with mock.patch("HomeSer.cache_utils.poll_for") as poll_for:
+            value = cache_get_or_set(self.key, self.tags, lambda: "value", 60)
+        self.assertEqual(value, "value")
+        poll_for.assert_not_called()
+
+    def test_waiters_rebuild_themselves_after_the_wait(self):
+        value, _ = cache_get_tagged(self.key, self.tags)
+        self.assertIsNone(value)
+
+        # The lock holder never stores anything
+        with mock.patch("HomeSer.cache_utils.REBUILD_WAIT", 0.1):
+            started = time.monotonic()
+            value, _ = cache_get_tagged(self.key, self.tags)
+        self.assertIsNone(value)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_early_refresh_serves_the_old_value_meanwhile(self):
+        _, versions = cache_get_tagged(self.key, self.tags)
+        cache_set_tagged(self.key, "old", versions, 60)
+
+        with mock.patch("HomeSer.cache_utils._refresh_due", return_value=True):
+            # The first caller refreshes, everybody else keeps the old value
+            self.assertEqual(cache_get_tagged(self.key, self.tags)[0], None)
+            self.assertEqual(cache_get_tagged(self.key, self.tags)[0], "old")
+            self.assertEqual(cache_get_tagged(self.key, self.tags)[0], "old")
+
+        cache_set_tagged(self.key, "new", versions, 60)
+        self.assertEqual(cache_get_tagged(self.key, self.tags)[0], "new")
+
+
+class NotModifiedMissTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    @override_settings(ROOT_URLCONF="HomeSer.tests")
+    def test_not_modified_miss_releases_the_lock(self):
+        url = f"/services/{self.service.pk}/"
+        cache_key = f"service_detail_{self.service.pk}"
+        with mock.patch("HomeSer.views.render", return_value=HttpResponse("page")):
+            etag = self.client.get(url)["ETag"]
+            # Evicted, but the client's copy is still current
+            cache.delete(cache_key)
+
+            response = self.client.get(url, headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 304)
+
+            # Nobody is left waiting for a rebuild that never comes
+            with mock.patch("HomeSer.cache_utils.poll_for") as poll_for:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        poll_for.assert_not_called()
+
+
+@override_settings(ROOT_URLCONF="HomeSer.tests")
+class WebServicesCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Plumbing repair", description="Fix pipes", price="10.50"
+        )
+
+    def setUp(self):
+        catalog_cache.clear_local()
+        self.addCleanup(catalog_cache.clear_local)
+        self.addCleanup(cache.clear)
+        patcher = mock.patch(
+            "HomeSer.views.render", return_value=HttpResponse("page")
+        )
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def listed(self, query):
+        """The services the page for ``query`` shows, and its query count."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f"/services/{query}")
+        context = self.render.call_args.args[2]
+        return list(context["services"]), len(queries)
+
+    def test_unknown_sorts_share_the_default_entry(self):
+        self.assertEqual(self.listed(""), ([self.service], 1))
+
+        self.assertEqual(self.listed("?sort=bogus"), ([self.service], 0))
+        self.assertEqual(self.listed("?sort=" + "x" * 1000), ([self.service], 0))
+        self.assertEqual(self.listed("?sort=rating"), ([self.service], 1))
+
+    def test_searches_differing_in_case_and_spacing_share_an_entry(self):
+        services, queries = self.listed("?search=plumbing+repair")
+        self.assertEqual(services, [self.service])
+        self.assertGreater(queries, 0)
+
+        self.assertEqual(
+            self.listed("?search=++Plumbing+++REPAIR+"), ([self.service], 0)
+        )
+        self.assertEqual(
+            self.listed("?search=plumbing+repair&sort=bogus"), ([self.service], 0)
+        )
+
+    def test_blank_search_lists_everything(self):
+        self.assertEqual(self.listed("?search=+++"), ([self.service], 1))
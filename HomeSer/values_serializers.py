@@ -0,0 +1,231 @@
+from collections import defaultdict
+
+from rest_framework.generics import get_object_or_404
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from .models import RATING_VALUES, OrderItem, rating_count_field
+from .serializers import (OrderItemSerializer, OrderSerializer,
+                          ReviewSerializer, ServiceSerializer, UserSerializer)
+from .sparse_fields import SparseFieldsMixin
+
+
+class ValuesSerializer:
+    """Read-only counterpart of a ModelSerializer working on values() rows.
+
+    ``columns`` maps output fields to the values() lookups they are read
+    from; every other field needs a ``get_<field>(row)`` method, reading
+    the lookups listed for it in ``extra_columns``. Values are formatted by
+    the same fields of ``serializer_class``, so the output is identical to
+    it without building model instances or walking sources.
+
+    ``fields`` and ``expand`` work as in DynamicFieldsMixin: only the
+    columns of the requested fields are selected, and each expanded field
+    in ``expandable`` is rendered by the values serializer named there from
+    one query per page.
+    """
+
+    serializer_class = None
+    columns = {}
+    # Method field -> lookups its get_<field>() reads
+    extra_columns = {}
+    # Expandable field -> (values serializer, lookup holding the related pk)
+    expandable = {}
+
+    def __init__(self, context=None, fields=None, expand=None):
+        self.context = context
+        expand = [name for name in expand or () if name in self.expandable]
+        fieldset = {"fields": fields, "expand": expand} if fields or expand else {}
+        self.fields = self.serializer_class(context=context, **fieldset).fields
+        self.expand = [name for name in expand if name in self.fields]
+        self.expanded = {}
+
+    def get_lookups(self):
+        lookups = ["id"]
+        for name in self.fields:
+            if name in self.expand:
+                lookups.append(self.expandable[name][1])
+            elif name in self.columns:
+                lookups.append(self.columns[name])
+            else:
+                lookups.extend(self.extra_columns.get(name, ()))
+        return lookups
+
+    def get_rows(self, queryset, include=()):
+        # Related rows are loaded by attach() instead
+        lookups = dict.fromkeys([*self.get_lookups(), *include])
+        return queryset.prefetch_related(None).values(*lookups)
+
+    def attach(self, rows):
+        """Load related data for a page of ``rows`` before rendering."""
+        for name in self.expand:
+            serializer_class, lookup = self.expandable[name]
+            nested = serializer_class(self.context)
+            model = nested.serializer_class.Meta.model
+            related = list(
+                nested.get_rows(
+                    model.objects.filter(pk__in={row[lookup] for row in rows})
+                )
+            )
+            self.expanded[name] = {
+                row["id"]: data
+                for row, data in zip(related, nested.serialize(related))
+            }
+
+    def to_representation(self, row):
+        data = {}
+        for name, field in self.fields.items():
+            if name in self.expanded:
+                value = row[self.expandable[name][1]]
+                data[name] = None if value is None else self.expanded[name][value]
+                continue
+            if name not in self.columns:
+                data[name] = getattr(self, f"get_{name}")(row)
+                continue
+            value = row[self.columns[name]]
+            if value is None or isinstance(field, PrimaryKeyRelatedField):
+                data[name] = value
+            else:
+                data[name] = field.to_representation(value)
+        return data
+
+    def serialize(self, rows):
+        rows = list(rows)
+        self.attach(rows)
+        return [self.to_representation(row) for row in rows]
+
+
+class UserValuesSerializer(ValuesSerializer):
+    serializer_class = UserSerializer
+    columns = {
+        "id": "id",
+        "username": "username",
+        "email": "email",
+        "role": "role",
+    }
+
+
+class ServiceValuesSerializer(ValuesSerializer):
+    serializer_class = ServiceSerializer
+    columns = {
+        "id": "id",
+        "name": "name",
+        "description": "description",
+        "price": "price",
+        "average_rating": "average_rating",
+        "rating_count": "rating_count",
+    }
+    extra_columns = {
+        "rating_histogram": [rating_count_field(rating) for rating in RATING_VALUES],
+    }
+
+    def get_rating_histogram(self, row):
+        return self.fields["rating_histogram"].to_representation(
+            {
+                rating: row[rating_count_field(rating)]
+                for rating in reversed(RATING_VALUES)
+            }
+        )
+
+
+class OrderItemValuesSerializer(ValuesSerializer):
+    serializer_class = OrderItemSerializer
+    columns = {
+        "id": "id",
+        "service": "service_id",
+        "service_name": "service__name",
+        "service_price": "unit_price",
+        "quantity": "quantity",
+    }
+
+
+class OrderValuesSerializer(ValuesSerializer):
+    serializer_class = OrderSerializer
+    columns = {
+        "id": "id",
+        "user": "user_id",
+        "created_at": "created_at",
+        "status": "status",
+        "total_price": "total_price",
+        "item_count": "item_count",
+    }
+    expandable = {"user": (UserValuesSerializer, "user_id")}
+
+    # Fields read from the order's items
+    ITEM_FIELDS = {"services", "items"}
+
+    def __init__(self, context=None, fields=None, expand=None):
+        super().__init__(context, fields, expand)
+        self.items = OrderItemValuesSerializer(context)
+
+    def attach(self, rows):
+        super().attach(rows)
+        if not self.ITEM_FIELDS & set(self.fields):
+            return
+        items = defaultdict(list)
+        for item in (
+            OrderItem.objects.filter(order_id__in=[row["id"] for row in rows])
+            .order_by("id")
+            .values("order_id", *self.items.columns.values())
+        ):
+            items[item["order_id"]].append(item)
+        for row in rows:
+            row["items"] = items[row["id"]]
+
+    def get_services(self, row):
+        return [item["service_id"] for item in row["items"]]
+
+    def get_items(self, row):
+        return [self.items.to_representation(item) for item in row["items"]]
+
+
+class ReviewValuesSerializer(ValuesSerializer):
+    serializer_class = ReviewSerializer
+    columns = {
+        "id": "id",
+        "user": "user_id",
+        "user_username": "user__username",
+        "service": "service_id",
+        "service_name": "service__name",
+        "rating": "rating",
+        "text": "text",
+        "created_at": "created_at",
+    }
+    expandable = {"service": (ServiceValuesSerializer, "service_id")}
+
+
+class ValuesReadMixin(SparseFieldsMixin):
+    """Serve ``list`` and ``retrieve`` through ``values_serializer_class``.
+
+    Writes and the browsable API forms keep using ``serializer_class``.
+    """
+
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(
+            context=self.get_serializer_context(), **self.get_fieldset()
+        )
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        # Cursor pages are positioned on their ordering columns
+        ordering = getattr(self.paginator, "ordering", None) or ()
+        rows = serializer.get_rows(
+            self.filter_queryset(self.get_queryset()),
+            include=[field.lstrip("-") for field in ordering],
+        )
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            serializer.get_rows(self.filter_queryset(self.get_queryset())),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        self.check_object_permissions(request, row)
+        return Response(serializer.serialize([row])[0])
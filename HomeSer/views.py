@@ -1,18 +1,21 @@
+import hashlib
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
-from django.contrib.postgres.search import SearchQuery, SearchVector
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 from django.core.mail import send_mail
-from django.db import transaction
-from django.db.models import F, Prefetch, Sum
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
 from django.utils.encoding import force_bytes, force_str
-from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.http import (http_date, urlsafe_base64_decode,
+                               urlsafe_base64_encode)
 from drf_spectacular.utils import (OpenApiParameter, OpenApiTypes,
                                    extend_schema, extend_schema_view)
 from rest_framework import permissions, serializers, status, viewsets
@@ -21,15 +24,58 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.token_blacklist.models import (BlacklistedToken,
                                                              OutstandingToken)
 
+from .cache_utils import (CATALOG_TAG, RATINGS_TAG, cache_get_or_set,
+                          cache_get_tagged, cache_rebuild_tagged,
+                          release_rebuild_lock, service_tag, user_tag,
+                          versions_etag, versions_last_modified)
+from .cart_store import get_cart_store
+from .catalog import catalog_cache
 from .decorators import jwt_login_required
+from .exports import EXPORT_FORMATS, export_orders, parse_export_bound
 from .forms import ClientProfileForm
+from .guest_cart import (GuestCart, add_to_guest_cart, merge_guest_cart,
+                         read_guest_cart, remove_from_guest_cart,
+                         write_guest_cart)
+from .idempotency import (IDEMPOTENCY_KEY_HEADER, idempotent_action,
+                          idempotent_form_view, new_idempotency_key)
 from .models import (Cart, CartItem, ClientProfile, Order, OrderItem, Review,
                      Service, User)
-from .permissions import IsOwnerOrAdmin
-from .serializers import (CartSerializer, ClientProfileSerializer,
-                          OrderSerializer, ReviewSerializer, ServiceSerializer,
-                          UserSerializer)
+from .orders import place_order, transition_orders
+from .pagination import IdCursorPagination, NewestFirstCursorPagination
+from .permissions import IsAdminRole, IsOwnerOrAdmin
+from .response_cache import CachedResponseMixin
+from .search import normalize_search, search_services
+from .sparse_fields import SparseFieldsMixin
+from .serializers import (CartItemsUpdateSerializer, CartSerializer,
+                          ClientProfileSerializer, OrderSerializer,
+                          OrderStatusTransitionSerializer, ReviewSerializer,
+                          ServiceSerializer, UserSerializer)
+from .suggest import suggestion_index
 from .tokens import account_activation_token
+from .values_serializers import (OrderValuesSerializer, ReviewValuesSerializer,
+                                 ServiceValuesSerializer, ValuesReadMixin)
+
+
+def expansion_cache_tags(viewset):
+    """Cache tags for the related objects a request nests with ``expand``.
+
+    Every model a serializer can expand needs tags here, so cached responses
+    embedding it are invalidated when it changes. Non-admins only list
+    their own objects, so the users nested there are themselves.
+    """
+    user = viewset.request.user
+    tags = []
+    for model in viewset.get_expanded_models():
+        if model is User:
+            is_admin = user.role == "admin"
+            tags.append("users" if is_admin else user_tag(user.id, "account"))
+        elif model is Service:
+            tags.extend([CATALOG_TAG, RATINGS_TAG])
+        else:
+            raise ImproperlyConfigured(
+                f"No cache tags for expanded {model.__name__} objects."
+            )
+    return tags
 
 
 @extend_schema_view(
@@ -58,28 +104,25 @@ from .tokens import account_activation_token
         description="Remove a user account from the system. Only administrators can delete user accounts.",
     ),
 )
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(CachedResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().select_related("clientprofile")
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
-        cache_key = f"user_queryset_{self.request.user.id}"
-        cached_queryset = cache.get(cache_key)
-
-        if cached_queryset is not None:
-            return cached_queryset
-
         if self.request.user.role == "admin":
             queryset = User.objects.select_related("clientprofile").all()
         else:
             queryset = User.objects.select_related("clientprofile").filter(
                 id=self.request.user.id
             )
+        return self.trim_queryset(queryset)
 
-        # Cache for 15 minutes
-        cache.set(cache_key, queryset, settings.CACHE_TTL)
-        return queryset
+    def get_cache_tags(self):
+        if self.request.user.role == "admin":
+            return ["users"]
+        return [user_tag(self.request.user.id, "account")]
 
     @extend_schema(
         summary="Promote a user to administrator role",
@@ -110,9 +153,6 @@ class UserViewSet(viewsets.ModelViewSet):
         user.role = "admin"
         user.save()
 
-        # Invalidate user cache
-        cache.delete(f"user_queryset_{request.user.id}")
-
         return Response({"status": "user promoted"})
 
 
@@ -174,27 +214,27 @@ class UserViewSet(viewsets.ModelViewSet):
         ],
     ),
 )
-class ClientProfileViewSet(viewsets.ModelViewSet):
+class ClientProfileViewSet(
+    CachedResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
     serializer_class = ClientProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        cache_key = f"client_profiles_{self.request.user.id}"
-        cached_queryset = cache.get(cache_key)
-
-        if cached_queryset is not None:
-            return cached_queryset
-
         if self.request.user.role == "admin":
             queryset = ClientProfile.objects.select_related("user").all()
         else:
             queryset = ClientProfile.objects.select_related("user").filter(
                 user=self.request.user
             )
+        return self.trim_queryset(queryset)
 
-        # Cache for 15 minutes
-        cache.set(cache_key, queryset, settings.CACHE_TTL)
-        return queryset
+    def get_cache_tags(self):
+        # Profiles embed the username and email of their account
+        user_id = self.request.user.id
+        if self.request.user.role == "admin":
+            return ["profiles", "users"]
+        return [user_tag(user_id, "profile"), user_tag(user_id, "account")]
 
 
 @extend_schema_view(
@@ -255,39 +295,110 @@ class ClientProfileViewSet(viewsets.ModelViewSet):
         ],
     ),
 )
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(CachedResponseMixin, ValuesReadMixin, viewsets.ModelViewSet):
     serializer_class = ServiceSerializer
+    values_serializer_class = ServiceValuesSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
         search = self.request.query_params.get("search", None)
         sort = self.request.query_params.get("sort", None)
 
-        # Create cache key
-        cache_key = f"services_{search}_{sort}_{self.request.user.id if self.request.user.is_authenticated else 'anonymous'}"
-        cached_queryset = cache.get(cache_key)
-
-        if cached_queryset is not None:
-            return cached_queryset
-
         queryset = Service.objects.all()
 
-        if search:
-            if "postgres" in settings.DATABASES["default"]["ENGINE"]:
-                query = SearchQuery(search)
-                queryset = queryset.annotate(
-                    search=SearchVector("name", "description")
-                ).filter(search=query)
-            else:
-                queryset = queryset.filter(name__icontains=search)
-
         if sort == "rating":
             queryset = queryset.order_by("-average_rating")
 
-        # Cache for 15 minutes
-        cache.set(cache_key, queryset, settings.CACHE_TTL)
+        # Ranked and capped, so only applied when listing
+        if search and self.action == "list":
+            queryset = search_services(
+                queryset, search, order_by_rank=sort != "rating"
+            )
+
         return queryset
 
+    def get_cache_scope(self):
+        # The catalog looks the same to every user
+        return "public"
+
+    @extend_schema(
+        summary="Suggest services while typing",
+        description=(
+            "Return service names matching the text typed so far, answered from "
+            "an in-memory index. Words starting with the query rank first; "
+            "close misspellings are matched as well."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Text typed so far.",
+            ),
+            OpenApiParameter(
+                name="limit",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description="Maximum number of suggestions (default 10, at most 20).",
+            ),
+        ],
+        responses={200: {"results": [{"id": "integer", "name": "string"}]}},
+    )
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 20)
+        except ValueError:
+            limit = 10
+        suggestions = suggestion_index.suggest(
+            request.query_params.get("q", ""), max(limit, 1)
+        )
+        return Response(
+            {"results": [{"id": pk, "name": name} for pk, name in suggestions]}
+        )
+
+    @extend_schema(
+        summary="List a service's reviews",
+        description=(
+            "Page through the reviews of a service, newest first. The rating "
+            "breakdown is part of the service itself (rating_histogram)."
+        ),
+        responses={200: ReviewSerializer(many=True)},
+    )
+    @action(detail=True, methods=["get"])
+    def reviews(self, request, pk=None):
+        reviews = (
+            Review.objects.filter(service_id=self.get_object().pk)
+            .select_related("user", "service")
+            .order_by("-created_at", "-id")
+        )
+        page = self.paginate_queryset(reviews)
+        serializer = ReviewSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def read_cached_entry(self, key):
+        # Searches vary too much to be worth keeping in every worker
+        if self.request.query_params.get("search"):
+            return super().read_cached_entry(key)
+        return catalog_cache.get(key)
+
+    def write_cached_entry(self, key, entry, versions, delta):
+        if self.request.query_params.get("search"):
+            super().write_cached_entry(key, entry, versions, delta)
+        else:
+            catalog_cache.set(key, entry, versions, delta)
+
+    def discard_cached_entry(self, key, versions):
+        if self.request.query_params.get("search"):
+            super().discard_cached_entry(key, versions)
+        else:
+            catalog_cache.release(key, versions)
+
+    def get_cache_tags(self):
+        if self.action == "retrieve":
+            return [service_tag(self.kwargs["pk"])]
+        return [CATALOG_TAG, RATINGS_TAG]
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -347,35 +458,35 @@ class ServiceViewSet(viewsets.ModelViewSet):
         ],
     ),
 )
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(CachedResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        cache_key = f"cart_{self.request.user.id}"
-        cached_queryset = cache.get(cache_key)
-
-        if cached_queryset is not None:
-            return cached_queryset
-
-        # Optimize by prefetching related cart items and services
-        queryset = Cart.objects.filter(user=self.request.user).prefetch_related(
-            Prefetch(
-                "cartitem_set", queryset=CartItem.objects.select_related("service")
+        queryset = Cart.objects.filter(user=self.request.user)
+        # Service ids and totals are computed from the prefetched items
+        if any(
+            self.wants_field(name)
+            for name in ("services", "items", "total_price", "item_count")
+        ):
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "cartitem_set",
+                    queryset=CartItem.objects.select_related("service").order_by(
+                        "id"
+                    ),
+                )
             )
-        )
+        return queryset
 
-        # Annotate with total price for efficiency
-        queryset = queryset.annotate(
-            annotated_total_price=Sum(
-                F("cartitem_set__service__price") * F("cartitem_set__quantity")
-            ),
-            annotated_item_count=Sum("cartitem_set__quantity"),
-        )
+    def get_cache_tags(self):
+        # Item names and prices come from services
+        return [user_tag(self.request.user.id, "cart"), CATALOG_TAG]
 
-        # Cache for 5 minutes (shorter cache time for cart)
-        cache.set(cache_key, queryset, settings.CACHE_TTL // 3)
-        return queryset
+    def cached_response(self, handler, request, *args, **kwargs):
+        # Write back pending changes first; that invalidates stale entries
+        get_cart_store().reconcile(request.user.id)
+        return super().cached_response(handler, request, *args, **kwargs)
 
     @extend_schema(
         summary="Add service to cart",
@@ -412,24 +523,7 @@ class CartViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=["post"])
     def add_service(self, request):
-        # Use select_related to reduce database queries
-        cart, created = Cart.objects.select_related("user").get_or_create(
-            user=request.user
-        )
-        service_id = request.data.get("service_id")
-        service = get_object_or_404(Service, id=service_id)
-
-        with transaction.atomic():
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart, service=service
-            )
-            if not created:
-                cart_item.quantity += 1
-                cart_item.save()
-
-        # Invalidate cache for this user's cart
-        cache.delete(f"cart_{request.user.id}")
-
+        get_cart_store().add(request.user.id, request.data.get("service_id"))
         return Response({"status": "service added to cart"})
 
     @extend_schema(
@@ -479,68 +573,70 @@ class CartViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=["post"])
     def remove_service(self, request):
-        # Use select_related to reduce database queries
-        cart = get_object_or_404(Cart.objects.select_related("user"), user=request.user)
-        service_id = request.data.get("service_id")
-        service = get_object_or_404(Service, id=service_id)
-
-        try:
-            cart_item = CartItem.objects.get(cart=cart, service=service)
-            cart_item.delete()
-
-            # Invalidate cache for this user's cart
-            cache.delete(f"cart_{request.user.id}")
-
+        if get_cart_store().remove(request.user.id, request.data.get("service_id")):
             return Response({"status": "service removed from cart"})
-        except CartItem.DoesNotExist:
-            return Response(
-                {"status": "service not in cart"}, status=status.HTTP_400_BAD_REQUEST
-            )
+        return Response(
+            {"status": "service not in cart"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @extend_schema(
+        summary="Update several cart items",
+        description=(
+            "Apply a batch of changes to the current user's cart in one request. "
+            "Each operation sets a service's quantity, increments it, or removes "
+            "the service; they are applied in order and either all succeed or "
+            "none does. Quantities that reach 0 remove the item. "
+            'Expected request body: `{"operations": [{"op": "set", '
+            '"service_id": <integer>, "quantity": <integer>}, ...]}`'
+        ),
+        request=CartItemsUpdateSerializer,
+        responses={
+            200: {"status": "cart updated"},
+            400: {"operations": ["Unknown services: 123."]},
+        },
+    )
+    @action(detail=False, methods=["patch"], url_path="items")
+    def update_items(self, request):
+        serializer = CartItemsUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        get_cart_store().apply(
+            request.user.id, serializer.validated_data["operations"]
+        )
+        return Response({"status": "cart updated"})
 
     @extend_schema(
         summary="Checkout cart",
-        description="Convert all items in the current user's cart to a new order. This action clears the cart.",
+        description=(
+            "Convert all items in the current user's cart to a new order. This action clears the cart. "
+            "Send an `Idempotency-Key` header to make retries safe: a repeated key returns the "
+            "first response, marked with `Idempotent-Replayed: true`, without placing another order. "
+            "Reusing a key with a different request body is rejected."
+        ),
         request=None,
+        parameters=[
+            OpenApiParameter(
+                name=IDEMPOTENCY_KEY_HEADER,
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                description="Unique key for this checkout attempt (at most 255 characters).",
+            )
+        ],
         responses={
             200: {"status": "order created", "order_id": "integer"},
             400: {"status": "cart is empty"},
+            409: {"status": "request with this key is in progress"},
+            422: {"status": "key was already used for a different request"},
         },
     )
     @action(detail=False, methods=["post"])
+    @idempotent_action("checkout")
     def checkout(self, request):
-        # Optimize with select_related and prefetch_related
-        cart = get_object_or_404(
-            Cart.objects.prefetch_related(
-                Prefetch(
-                    "cartitem_set", queryset=CartItem.objects.select_related("service")
-                )
-            ),
-            user=request.user,
-        )
-
-        if not cart.cartitem_set.exists():
+        get_cart_store().reconcile(request.user.id)
+        order = place_order(request.user)
+        if order is None:
             return Response(
                 {"status": "cart is empty"}, status=status.HTTP_400_BAD_REQUEST
             )
-
-        # Create order with all items in a single transaction
-        with transaction.atomic():
-            order = Order.objects.create(user=request.user)
-
-            # Use bulk_create for order items to reduce database queries
-            order_items = [
-                OrderItem(order=order, service=item.service, quantity=item.quantity)
-                for item in cart.cartitem_set.all()
-            ]
-            OrderItem.objects.bulk_create(order_items)
-
-            # Clear cart items
-            cart.cartitem_set.all().delete()
-
-        # Invalidate cache for this user's cart and orders
-        cache.delete(f"cart_{request.user.id}")
-        cache.delete(f"orders_{request.user.id}")
-
         return Response({"status": "order created", "order_id": order.id})
 
 
@@ -562,43 +658,147 @@ class CartViewSet(viewsets.ModelViewSet):
         ],
     ),
 )
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+class OrderViewSet(
+    CachedResponseMixin, ValuesReadMixin, viewsets.ReadOnlyModelViewSet
+):
     serializer_class = OrderSerializer
+    values_serializer_class = OrderValuesSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NewestFirstCursorPagination
 
     def get_queryset(self):
-        # Check cache first
-        cache_key = f"orders_{self.request.user.id}"
-        cached_queryset = cache.get(cache_key)
-
-        if cached_queryset is not None:
-            return cached_queryset
-
-        # Optimize with prefetch_related for order items and services
-        queryset = (
-            Order.objects.prefetch_related(
-                Prefetch(
-                    "orderitem_set",
-                    queryset=OrderItem.objects.select_related("service"),
-                )
-            )
-            .select_related("user")
-            .annotate(
-                annotated_total_price=Sum(
-                    F("orderitem_set__service__price") * F("orderitem_set__quantity")
-                ),
-                annotated_item_count=Sum("orderitem_set__quantity"),
+        # Service ids are read from the prefetched items, so a page costs
+        # the same two queries whatever its size
+        queryset = Order.objects.prefetch_related(
+            Prefetch(
+                "orderitem_set",
+                queryset=OrderItem.objects.select_related("service").order_by("id"),
             )
         )
 
         if self.request.user.role == "admin":
-            result = queryset
+            return queryset
+        return queryset.filter(user=self.request.user)
+
+    def get_cache_tags(self):
+        if self.request.user.role == "admin":
+            tags = ["orders", CATALOG_TAG]
         else:
-            result = queryset.filter(user=self.request.user)
+            tags = [user_tag(self.request.user.id, "orders"), CATALOG_TAG]
+        return tags + expansion_cache_tags(self)
+
+    @extend_schema(
+        summary="Export orders and their items",
+        description=(
+            "Stream every matching order item, one row each, as NDJSON or CSV. "
+            "Orders without items appear as a single row with empty item columns. "
+            "Only administrators can access this endpoint."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="export_format",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                enum=list(EXPORT_FORMATS),
+                description="Output format (default ndjson).",
+            ),
+            OpenApiParameter(
+                name="created_after",
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description="Only orders created at or after this date or time.",
+            ),
+            OpenApiParameter(
+                name="created_before",
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description="Only orders created before this date or time.",
+            ),
+            OpenApiParameter(
+                name="status",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Comma-separated order statuses to include.",
+            ),
+        ],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminRole])
+    def export(self, request):
+        params = request.query_params
+        export_format = params.get("export_format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            raise serializers.ValidationError(
+                {"export_format": f"Choose one of: {', '.join(EXPORT_FORMATS)}."}
+            )
+
+        orders = Order.objects.all()
+        for param, lookup in (
+            ("created_after", "created_at__gte"),
+            ("created_before", "created_at__lt"),
+        ):
+            if param in params:
+                try:
+                    bound = parse_export_bound(params[param])
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {param: "Enter a date or an ISO 8601 date and time."}
+                    )
+                orders = orders.filter(**{lookup: bound})
+        if "status" in params:
+            statuses = [s for s in params["status"].split(",") if s]
+            valid = dict(Order.STATUS_CHOICES)
+            unknown = [s for s in statuses if s not in valid]
+            if unknown:
+                raise serializers.ValidationError(
+                    {"status": f"Unknown status: {', '.join(unknown)}."}
+                )
+            orders = orders.filter(status__in=statuses)
+
+        response = StreamingHttpResponse(
+            export_orders(orders, export_format, settings.EXPORT_CHUNK_SIZE),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="orders.{export_format}"'
+        )
+        return response
 
-        # Cache the result for 15 minutes
-        cache.set(cache_key, result, settings.CACHE_TTL)
-        return result
+    @extend_schema(
+        summary="Change the status of several orders",
+        description=(
+            "Move the listed orders to a new status. Orders may go from PENDING_PAYMENT "
+            "to PROCESSING or CANCELLED, and from PROCESSING to COMPLETED or CANCELLED; "
+            "listed orders that cannot make the move are left unchanged and counted as "
+            "skipped. Owners of changed orders are emailed. "
+            "Only administrators can access this endpoint. "
+            'Expected request body: `{"ids": [<integer>, ...], "status": "<status>"}`'
+        ),
+        request=OrderStatusTransitionSerializer,
+        responses={
+            200: {
+                "status": "orders updated",
+                "updated": "integer",
+                "skipped": "integer",
+            },
+            400: {"status": ["No order can move to PENDING_PAYMENT."]},
+        },
+    )
+    @action(detail=False, methods=["post"], permission_classes=[IsAdminRole])
+    def transition(self, request):
+        serializer = OrderStatusTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data["ids"])
+        updated = transition_orders(
+            Order.objects.filter(pk__in=ids), serializer.validated_data["status"]
+        )
+        return Response(
+            {
+                "status": "orders updated",
+                "updated": updated,
+                "skipped": len(ids) - updated,
+            }
+        )
 
 
 @extend_schema_view(
@@ -659,28 +859,28 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         ],
     ),
 )
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(CachedResponseMixin, ValuesReadMixin, viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
+    values_serializer_class = ReviewValuesSerializer
     permission_classes = [IsOwnerOrAdmin]
+    pagination_class = NewestFirstCursorPagination
 
     def get_queryset(self):
-        cache_key = f"reviews_{self.request.user.id}"
-        cached_queryset = cache.get(cache_key)
-
-        if cached_queryset is not None:
-            return cached_queryset
-
         # Optimize with select_related for user and service
         queryset = Review.objects.select_related("user", "service")
 
         if self.request.user.role == "admin":
-            result = queryset
-        else:
-            result = queryset.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
 
-        # Cache for 15 minutes
-        cache.set(cache_key, result, settings.CACHE_TTL)
-        return result
+    def get_cache_tags(self):
+        # Reviews show their author's username
+        user_id = self.request.user.id
+        if self.request.user.role == "admin":
+            tags = ["reviews", "users"]
+        else:
+            tags = [user_tag(user_id, "reviews"), user_tag(user_id, "account")]
+        return tags + [CATALOG_TAG] + expansion_cache_tags(self)
 
     def perform_create(self, serializer):
         # Check if the user has a completed order for the service
@@ -697,196 +897,172 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
         serializer.save(user=user)
 
-        # Invalidate cache for this service's reviews and service detail
-        cache.delete(f"reviews_{service.id}")
-        cache.delete(
-            f"service_detail_{service.id}_{user.id if user.is_authenticated else 'anonymous'}"
-        )
-        cache.delete(
-            f"web_services__{user.id if user.is_authenticated else 'anonymous'}"
-        )
-
 
 def home(request):
     return render(request, "home.html")
 
 
 def services(request):
-    # Check cache first
-    cache_key = f"web_services_{request.GET.get('search', '')}_{request.GET.get('sort', '')}_{request.user.id if request.user.is_authenticated else 'anonymous'}"
-    cached_services = cache.get(cache_key)
+    search = normalize_search(request.GET.get("search", ""))
+    # Anything else sorts by the default ordering, and is cached with it
+    sort = "rating" if request.GET.get("sort") == "rating" else None
 
-    if cached_services is not None:
-        return render(request, "services.html", {"services": cached_services})
-
-    # Optimize the query with select_related if needed
-    services = Service.objects.all()
-    search = request.GET.get("search")
-    sort = request.GET.get("sort")
+    def build():
+        services = Service.objects.all()
+        if sort == "rating":
+            services = services.order_by("-average_rating")
+        if search:
+            # Some backends query right away, so only search on a miss
+            services = search_services(
+                services, search, order_by_rank=sort != "rating"
+            )
+        return list(services)
 
     if search:
-        services = services.filter(name__icontains=search)
-
-    if sort == "rating":
-        services = services.order_by("-average_rating")
-
-    # Cache the result for 15 minutes
-    cache.set(cache_key, services, settings.CACHE_TTL)
+        # Hashed to keep keys short whatever the length of the search
+        digest = hashlib.sha1(search.encode()).hexdigest()
+        services = cache_get_or_set(
+            f"web_services_{sort}_{digest}",
+            [CATALOG_TAG, RATINGS_TAG],
+            build,
+            settings.CACHE_TTL,
+        )
+    else:
+        # Plain browsing shares one snapshot per ordering across all users
+        services = catalog_cache.get_or_set(f"web_services_{sort}", build)
 
     return render(request, "services.html", {"services": services})
 
 
 def service_detail(request, service_id):
-    # Check cache first
-    cache_key = f"service_detail_{service_id}_{request.user.id if request.user.is_authenticated else 'anonymous'}"
-    cached_data = cache.get(cache_key)
-
-    if cached_data is not None:
-        return render(request, "service_detail.html", cached_data)
-
-    # Optimize with select_related
-    service = get_object_or_404(Service, id=service_id)
-
-    # Check cache for reviews
-    reviews_cache_key = f"reviews_{service_id}_{request.user.id if request.user.is_authenticated else 'anonymous'}"
-    reviews = cache.get(reviews_cache_key)
+    cache_key = f"service_detail_{service_id}"
+    context, versions = cache_get_tagged(cache_key, [service_tag(service_id)])
+
+    # The page also shows who is logged in, so validators are per user
+    etag = versions_etag(f"{cache_key}_{request.user.id}", versions)
+    last_modified = versions_last_modified(versions)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        if context is None:
+            release_rebuild_lock(cache_key)
+        return response
 
-    if reviews is None:
+    def build_context():
+        service = get_object_or_404(Service, id=service_id)
+        # Only the newest reviews are rendered; the page loads the rest
+        # from reviews_url on demand
         reviews = (
             Review.objects.filter(service=service)
             .select_related("user")
-            .order_by("-created_at")
+            .order_by("-created_at", "-id")[: settings.REVIEW_PREVIEW_LIMIT]
+        )
+        return {
+            "service": service,
+            "rating_histogram": service.rating_histogram,
+            "reviews": list(reviews),
+            "reviews_url": reverse("service-reviews", args=[service.pk]),
+        }
+
+    if context is None:
+        # Cache the service detail page for 15 minutes
+        context = cache_rebuild_tagged(
+            cache_key, versions, build_context, settings.CACHE_TTL
         )
-        # Cache reviews for 15 minutes
-        cache.set(reviews_cache_key, reviews, settings.CACHE_TTL)
-
-    context = {"service": service, "reviews": reviews}
-
-    # Cache the service detail page for 15 minutes
-    cache.set(cache_key, context, settings.CACHE_TTL)
 
-    return render(request, "service_detail.html", context)
+    response = render(request, "service_detail.html", context)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
 
 
 def cart(request):
-    # Check cache first
-    cache_key = f"cart_{request.user.id}_web"
-    cached_cart = cache.get(cache_key)
+    if not request.user.is_authenticated:
+        # Guest carts live in a signed cookie; nothing is written
+        return render(
+            request, "cart.html", {"cart": GuestCart(read_guest_cart(request))}
+        )
 
-    if cached_cart is not None:
-        return render(request, "cart.html", {"cart": cached_cart})
+    get_cart_store().reconcile(request.user.id)
 
-    # Optimize with prefetch_related to reduce database queries
-    cart, created = Cart.objects.prefetch_related(
-        Prefetch("cartitem_set", queryset=CartItem.objects.select_related("service"))
-    ).get_or_create(user=request.user)
+    def load_cart():
+        # Optimize with prefetch_related to reduce database queries
+        cart, created = Cart.objects.prefetch_related(
+            Prefetch(
+                "cartitem_set", queryset=CartItem.objects.select_related("service")
+            )
+        ).get_or_create(user=request.user)
+        return cart
 
     # Cache the cart for 5 minutes (shorter cache time for cart)
-    cache.set(cache_key, cart, settings.CACHE_TTL // 3)
+    cart = cache_get_or_set(
+        f"cart_{request.user.id}_web",
+        [user_tag(request.user.id, "cart"), CATALOG_TAG],
+        load_cart,
+        settings.CACHE_TTL // 3,
+    )
 
-    return render(request, "cart.html", {"cart": cart})
+    return render(
+        request,
+        "cart.html",
+        # The checkout form posts the key back as a hidden field
+        {"cart": cart, "idempotency_key": new_idempotency_key()},
+    )
 
 
-@jwt_login_required
-@login_required
 def add_to_cart(request):
     if request.method == "POST":
         service_id = request.POST.get("service_id")
-        service = get_object_or_404(Service, id=service_id)
-
-        # Optimize with select_related
-        with transaction.atomic():
-            cart, created = Cart.objects.select_related("user").get_or_create(
-                user=request.user
+        if not request.user.is_authenticated:
+            items = read_guest_cart(request)
+            if not add_to_guest_cart(items, service_id):
+                messages.error(request, "Your cart is full. Log in to add more.")
+                return redirect("service_detail", service_id=service_id)
+            messages.success(request, "Service added to cart!")
+            return write_guest_cart(
+                redirect("service_detail", service_id=service_id), items
             )
-
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart, service=service
-            )
-            if not created:
-                cart_item.quantity += 1
-                cart_item.save()
-
+        get_cart_store().add(request.user.id, service_id)
         messages.success(request, "Service added to cart!")
 
-        # Invalidate cache for this user's cart
-        cache.delete(f"cart_{request.user.id}_web")
-
     return redirect("service_detail", service_id=service_id)
 
 
-@jwt_login_required
-@login_required
 def remove_from_cart(request):
     if request.method == "POST":
         service_id = request.POST.get("service_id")
-        service = get_object_or_404(Service, id=service_id)
-
-        # Optimize with select_related
-        cart = get_object_or_404(Cart.objects.select_related("user"), user=request.user)
-
-        try:
-            cart_item = CartItem.objects.get(cart=cart, service=service)
-            cart_item.delete()
+        if not request.user.is_authenticated:
+            items = read_guest_cart(request)
+            if not remove_from_guest_cart(items, service_id):
+                messages.error(request, "Service not in cart.")
+                return redirect("cart")
             messages.success(request, "Service removed from cart!")
-
-            # Invalidate cache for this user's cart
-            cache.delete(f"cart_{request.user.id}_web")
-        except CartItem.DoesNotExist:
+            return write_guest_cart(redirect("cart"), items)
+        if get_cart_store().remove(request.user.id, service_id):
+            messages.success(request, "Service removed from cart!")
+        else:
             messages.error(request, "Service not in cart.")
     return redirect("cart")
 
 
 @jwt_login_required
 @login_required
+@idempotent_form_view("checkout", "orders")
 def checkout(request):
-    # Optimize with prefetch_related
-    cart = get_object_or_404(
-        Cart.objects.prefetch_related(
-            Prefetch(
-                "cartitem_set", queryset=CartItem.objects.select_related("service")
-            )
-        ),
-        user=request.user,
-    )
-
-    if not cart.cartitem_set.exists():
+    get_cart_store().reconcile(request.user.id)
+    if place_order(request.user) is None:
         messages.error(request, "Your cart is empty.")
         return redirect("cart")
 
-    # Create order with all items in a single transaction
-    with transaction.atomic():
-        order = Order.objects.create(user=request.user)
-
-        # Use bulk_create for order items to reduce database queries
-        order_items = [
-            OrderItem(order=order, service=item.service, quantity=item.quantity)
-            for item in cart.cartitem_set.all()
-        ]
-        OrderItem.objects.bulk_create(order_items)
-
-        # Clear cart items
-        cart.cartitem_set.all().delete()
-
     messages.success(request, "Order created successfully!")
 
-    # Invalidate cache for this user's cart and orders
-    cache.delete(f"cart_{request.user.id}_web")
-    cache.delete(f"orders_{request.user.id}_web")
-
     return redirect("orders")
 
 
 @jwt_login_required
 @login_required
 def orders(request):
-    # Check cache first
-    cache_key = f"web_orders_{request.user.id}"
-    cached_orders = cache.get(cache_key)
-
-    if cached_orders is not None:
-        return render(request, "orders.html", {"orders": cached_orders})
-
     # Optimize with prefetch_related for order items and services
     orders = (
         Order.objects.filter(user=request.user)
@@ -899,7 +1075,12 @@ def orders(request):
     )
 
     # Cache the orders for 15 minutes
-    cache.set(cache_key, orders, settings.CACHE_TTL)
+    orders = cache_get_or_set(
+        f"web_orders_{request.user.id}",
+        [user_tag(request.user.id, "orders"), CATALOG_TAG],
+        lambda: orders,
+        settings.CACHE_TTL,
+    )
 
     return render(request, "orders.html", {"orders": orders})
 
@@ -1007,7 +1188,7 @@ def activate(request, uidb64, token):
         # Redirect to home and set JWT cookies
         response = redirect("home")
         response = set_jwt_cookies(response, tokens["access"], tokens["refresh"])
-        return response
+        return merge_guest_cart(request, response, user)
     else:
         messages.error(request, "Activation link is invalid!")
         return redirect("home")
@@ -1035,7 +1216,7 @@ def login_view(request):
                 response = set_jwt_cookies(
                     response, tokens["access"], tokens["refresh"]
                 )
-                return response
+                return merge_guest_cart(request, response, user)
     else:
         form = AuthenticationForm()
     return render(request, "registration/login.html", {"form": form})
@@ -1050,12 +1231,6 @@ def logout_view(request):
 
         logout(request)
 
-        # Clear all user-related cache
-        cache.delete(f"cart_{user.id}_web")
-        cache.delete(f"cart_{user.id}")
-        cache.delete(f"orders_{user.id}_web")
-        cache.delete(f"orders_{user.id}")
-
     # Remove JWT cookies
     from .jwt_utils import unset_jwt_cookies
 
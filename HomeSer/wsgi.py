@@ -13,3 +13,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HomeSer.settings')
 
 app = get_wsgi_application()
+
+# Build the service name suggestion index in the background at worker start
+from HomeSer.suggest import suggestion_index  # noqa: E402
+
+suggestion_index.warm()